@@ -14,11 +14,16 @@ def create_app(config_class=None):
     db.init_app(app)
     login_manager.init_app(app)
 
-    from app.models.user import User
+    from app.services.order_stats import register_rollup_listener
+    from app.services.user_cache import load_cached_user
+
+    # 新增订单、修改订单状态时同步维护统计汇总表
+    register_rollup_listener()
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        # 进程内缓存的用户快照（含店铺权限），修改用户时由 invalidate_users() 失效
+        return load_cached_user(int(user_id))
 
     from app.routes.auth import auth_bp
     from app.routes.shop import shop_bp
@@ -27,6 +32,7 @@ def create_app(config_class=None):
     from app.routes.notification import notification_bp
     from app.routes.statistics import statistics_bp
     from app.routes.api import api_bp
+    from app.routes.system import system_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(shop_bp, url_prefix='/shop')
@@ -35,5 +41,6 @@ def create_app(config_class=None):
     app.register_blueprint(notification_bp, url_prefix='/notification')
     app.register_blueprint(statistics_bp, url_prefix='/statistics')
     app.register_blueprint(api_bp, url_prefix='/api')
+    app.register_blueprint(system_bp, url_prefix='/system')
 
     return app
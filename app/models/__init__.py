@@ -1,6 +1,13 @@
 from app.models.shop import Shop
 from app.models.order import Order
+from app.models.order_search_token import OrderSearchToken
+from app.models.order_stats_rollup import OrderStatsRollup
 from app.models.user import User, UserShopPermission
 from app.models.notification_log import NotificationLog
+from app.models.notification_log_archive import NotificationLogArchive
+from app.models.notification_job import NotificationJob
+from app.models.cache_version import CacheVersion
+from app.models.callback_outbox import CallbackOutbox
 
-__all__ = ['Shop', 'Order', 'User', 'UserShopPermission', 'NotificationLog']
+__all__ = ['Shop', 'Order', 'OrderSearchToken', 'OrderStatsRollup', 'User', 'UserShopPermission',
+           'NotificationLog', 'NotificationLogArchive', 'NotificationJob', 'CacheVersion', 'CallbackOutbox']
@@ -0,0 +1,11 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True, comment='缓存名称')
+    version = db.Column(db.Integer, nullable=False, default=0, comment='版本号，数据变更时递增')
+
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,52 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class CallbackOutbox(db.Model):
+    __tablename__ = 'callback_outbox'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, comment='订单ID')
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.id', ondelete='CASCADE'), nullable=False, comment='店铺ID')
+
+    action = db.Column(db.String(20), nullable=False, comment='回调动作：success=充值成功 refund=退款')
+    host = db.Column(db.String(255), comment='回调目标主机，用于按主机限制并发')
+    outbox_status = db.Column(db.SmallInteger, default=0, comment='状态：0=待发送 1=发送中 2=成功 3=死信')
+    attempts = db.Column(db.SmallInteger, default=0, comment='已尝试次数')
+    next_run_time = db.Column(db.DateTime, default=datetime.utcnow, comment='下次执行时间')
+    last_error = db.Column(db.Text, comment='最近一次错误信息')
+
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_outbox_status_next_run', 'outbox_status', 'next_run_time'),
+        db.Index('idx_outbox_order', 'order_id'),
+    )
+
+    STATUS_MAP = {0: '待发送', 1: '发送中', 2: '成功', 3: '死信'}
+    ACTION_MAP = {'success': '充值成功', 'refund': '退款'}
+
+    @property
+    def status_label(self):
+        return self.STATUS_MAP.get(self.outbox_status, '未知')
+
+    @property
+    def action_label(self):
+        return self.ACTION_MAP.get(self.action, self.action)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'shop_id': self.shop_id,
+            'action': self.action,
+            'action_label': self.action_label,
+            'host': self.host,
+            'outbox_status': self.outbox_status,
+            'status_label': self.status_label,
+            'attempts': self.attempts,
+            'next_run_time': self.next_run_time.strftime('%Y-%m-%d %H:%M:%S') if self.next_run_time else None,
+            'last_error': self.last_error,
+            'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S') if self.create_time else None,
+        }
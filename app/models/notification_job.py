@@ -0,0 +1,43 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class NotificationJob(db.Model):
+    __tablename__ = 'notification_jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, comment='订单ID')
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.id', ondelete='CASCADE'), nullable=False, comment='店铺ID')
+
+    notify_type = db.Column(db.String(20), nullable=False, comment='通知类型：dingtalk/wecom')
+    job_status = db.Column(db.SmallInteger, default=0, comment='任务状态：0=待发送 1=发送中 2=已完成 3=失败')
+    digest = db.Column(db.SmallInteger, default=0, comment='是否合并发送：0=逐单 1=合并')
+    attempts = db.Column(db.SmallInteger, default=0, comment='已尝试次数')
+    next_run_time = db.Column(db.DateTime, default=datetime.utcnow, comment='下次执行时间')
+    last_error = db.Column(db.Text, comment='最近一次错误信息')
+
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_status_next_run', 'job_status', 'next_run_time'),
+    )
+
+    STATUS_MAP = {0: '待发送', 1: '发送中', 2: '已完成', 3: '失败'}
+
+    @property
+    def status_label(self):
+        return self.STATUS_MAP.get(self.job_status, '未知')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'shop_id': self.shop_id,
+            'notify_type': self.notify_type,
+            'job_status': self.job_status,
+            'status_label': self.status_label,
+            'attempts': self.attempts,
+            'next_run_time': self.next_run_time.strftime('%Y-%m-%d %H:%M:%S') if self.next_run_time else None,
+            'last_error': self.last_error,
+        }
@@ -15,9 +15,21 @@ class NotificationLog(db.Model):
     request_data = db.Column(db.Text, comment='请求数据')
     response_data = db.Column(db.Text, comment='响应数据')
     error_message = db.Column(db.Text, comment='错误信息')
+    digest_id = db.Column(db.String(32), comment='合并发送批次号，同一条合并消息中的订单相同')
 
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # 日志列表按 店铺/类型/状态 筛选并按 id 倒序，复合索引末尾带 id 避免排序；
+    # idx_log_create_time 用于归档时查找过期日志的范围
+    __table_args__ = (
+        db.Index('idx_digest_id', 'digest_id'),
+        db.Index('idx_log_create_time', 'create_time'),
+        db.Index('idx_log_shop_type_status', 'shop_id', 'notify_type', 'notify_status', 'id'),
+        db.Index('idx_log_shop_status', 'shop_id', 'notify_status', 'id'),
+        db.Index('idx_log_type_status', 'notify_type', 'notify_status', 'id'),
+        db.Index('idx_log_status', 'notify_status', 'id'),
+    )
+
     @property
     def notify_type_label(self):
         return '钉钉' if self.notify_type == 'dingtalk' else '企业微信'
@@ -36,5 +48,6 @@ class NotificationLog(db.Model):
             'notify_status': self.notify_status,
             'status_label': self.status_label,
             'error_message': self.error_message,
+            'digest_id': self.digest_id,
             'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S') if self.create_time else None,
         }
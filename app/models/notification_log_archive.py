@@ -0,0 +1,53 @@
+import json
+import zlib
+from datetime import datetime
+
+from app.extensions import db
+
+
+class NotificationLogArchive(db.Model):
+    """超过保留天数的通知日志，请求/响应内容压缩存放，不关联订单外键。"""
+    __tablename__ = 'notification_logs_archive'
+
+    id = db.Column(db.Integer, primary_key=True, comment='原通知日志ID')
+    order_id = db.Column(db.Integer, nullable=False, comment='订单ID')
+    shop_id = db.Column(db.Integer, nullable=False, comment='店铺ID')
+
+    notify_type = db.Column(db.String(20), nullable=False, comment='通知类型：dingtalk/wecom')
+    notify_status = db.Column(db.SmallInteger, default=0, comment='通知状态：0=失败 1=成功')
+    digest_id = db.Column(db.String(32), comment='合并发送批次号')
+    payload = db.Column(db.LargeBinary, comment='zlib 压缩的 JSON：request_data/response_data/error_message')
+
+    create_time = db.Column(db.DateTime, comment='原日志创建时间')
+    archive_time = db.Column(db.DateTime, default=datetime.utcnow, comment='归档时间')
+
+    __table_args__ = (
+        db.Index('idx_archive_order', 'order_id'),
+        db.Index('idx_archive_create_time', 'create_time'),
+    )
+
+    @staticmethod
+    def pack(request_data, response_data, error_message):
+        return zlib.compress(json.dumps({
+            'request_data': request_data,
+            'response_data': response_data,
+            'error_message': error_message,
+        }, ensure_ascii=False).encode('utf-8'))
+
+    def unpack(self):
+        if not self.payload:
+            return {'request_data': None, 'response_data': None, 'error_message': None}
+        return json.loads(zlib.decompress(self.payload).decode('utf-8'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'shop_id': self.shop_id,
+            'notify_type': self.notify_type,
+            'notify_status': self.notify_status,
+            'digest_id': self.digest_id,
+            'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S') if self.create_time else None,
+            'archive_time': self.archive_time.strftime('%Y-%m-%d %H:%M:%S') if self.archive_time else None,
+            **self.unpack(),
+        }
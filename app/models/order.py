@@ -1,8 +1,38 @@
 import json
 from datetime import datetime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import query_expression
+from sqlalchemy.sql.functions import FunctionElement
+
 from app.extensions import db
 
 
+class utc_now(FunctionElement):
+    """数据库时钟的当前 UTC 时间。
+
+    订单的 update_time 由数据库生成，多台应用服务器时钟不一致时，增量同步的游标顺序仍然可靠
+    （见 app/services/order_feed.py）。
+    """
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utc_now)
+def _utc_now_default(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utc_now, 'mysql')
+def _utc_now_mysql(element, compiler, **kw):
+    return 'UTC_TIMESTAMP()'
+
+
+@compiles(utc_now, 'sqlite')
+def _utc_now_sqlite(element, compiler, **kw):
+    # 与 SQLAlchemy 在 SQLite 中保存 DateTime 的格式（微秒 6 位）一致，保证字符串比较的顺序正确
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
 class Order(db.Model):
     __tablename__ = 'orders'
 
@@ -37,10 +67,26 @@ class Order(db.Model):
 
     remark = db.Column(db.String(500), comment='备注')
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
-    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=utc_now(), onupdate=utc_now())
+
+    # 订单列表只读取商品信息的前若干字符（见 order_query.order_list_columns），其他查询中为 None
+    product_summary = query_expression()
 
     notification_logs = db.relationship('NotificationLog', backref='order', lazy='dynamic')
 
+    # 订单列表的筛选组合见 app/services/order_query.py，索引检查：python migrations/check_indexes.py
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'jd_order_no', name='uk_shop_jd_order'),
+        db.Index('idx_jd_order', 'jd_order_no', 'shop_type'),
+        db.Index('idx_produce_account', 'produce_account'),
+        db.Index('idx_shop', 'shop_id', 'order_status'),
+        db.Index('idx_shop_create_time', 'shop_id', 'create_time'),
+        db.Index('idx_status_id', 'order_status', 'id'),
+        db.Index('idx_create_time', 'create_time'),
+        db.Index('idx_notified', 'notified', 'create_time'),
+        db.Index('idx_update_time_id', 'update_time', 'id'),
+    )
+
     STATUS_MAP = {0: '待支付', 1: '处理中', 2: '已完成', 3: '已取消'}
     TYPE_MAP = {1: '直充', 2: '卡密'}
     SHOP_TYPE_MAP = {1: '游戏点卡', 2: '通用交易'}
@@ -0,0 +1,18 @@
+from sqlalchemy.dialects import mysql
+
+from app.extensions import db
+
+
+class OrderSearchToken(db.Model):
+    """订单号、京东订单号、充值账号的三元组（3-gram）倒排索引，用于子串搜索。"""
+    __tablename__ = 'order_search_tokens'
+
+    # MySQL 默认排序规则不区分重音，不同三元组会被视为同一主键
+    token = db.Column(db.String(3).with_variant(mysql.VARCHAR(3, collation='utf8mb4_bin'), 'mysql'),
+                      primary_key=True, comment='小写三元组')
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True,
+                         comment='订单ID')
+
+    __table_args__ = (
+        db.Index('idx_search_order', 'order_id'),
+    )
@@ -0,0 +1,22 @@
+from app.extensions import db
+
+
+class OrderStatsRollup(db.Model):
+    """按 (店铺, 小时, 订单状态, 订单类型) 汇总的订单数和金额，统计页只读此表。
+
+    小时为 UTC 整点（与 orders.create_time 一致），按天统计时按小时汇总。
+    """
+    __tablename__ = 'order_stats_rollup'
+
+    shop_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='店铺ID')
+    stat_hour = db.Column(db.DateTime, primary_key=True, comment='订单创建时间所在整点（UTC）')
+    order_status = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, comment='订单状态')
+    order_type = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, comment='订单类型')
+
+    order_count = db.Column(db.Integer, nullable=False, default=0, comment='订单数')
+    amount = db.Column(db.BigInteger, nullable=False, default=0, comment='金额（分）')
+
+    __table_args__ = (
+        # 按时间范围汇总全部店铺时只读这个覆盖索引
+        db.Index('idx_rollup_hour', 'stat_hour', 'shop_id', 'order_count', 'amount'),
+    )
@@ -37,6 +37,9 @@ class Shop(db.Model):
     dingtalk_webhook = db.Column(db.String(500), comment='钉钉机器人Webhook地址')
     dingtalk_secret = db.Column(db.String(500), comment='钉钉机器人加签密钥')
     wecom_webhook = db.Column(db.String(500), comment='企业微信机器人Webhook地址')
+    notify_digest_enabled = db.Column(db.SmallInteger, default=0, comment='是否合并通知：0=逐单发送 1=合并发送')
+    notify_digest_window = db.Column(db.Integer, default=60, comment='合并通知等待时间（秒）')
+    notify_digest_max = db.Column(db.Integer, default=20, comment='合并通知每条消息最多订单数')
 
     # 店铺状态
     is_enabled = db.Column(db.SmallInteger, default=1, comment='是否启用：0=禁用 1=启用')
@@ -3,16 +3,18 @@
 支持京东游戏点卡平台和京东通用交易平台的订单接收，
 包含MD5签名验证功能。
 """
+import hmac
 import json
 import logging
-import uuid
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 
 from app.extensions import db
-from app.models.order import Order
 from app.models.shop import Shop
-from app.services.notification import send_order_notification, send_test_notification
+from app.services.notification import send_test_notification
+from app.services.order_feed import decode_cursor, iter_change_records
+from app.services.order_ingest import ingest_order, ingest_orders_bulk, parse_int_fields
+from app.services.shop_cache import get_shop_by_code
 from app.services.jd_game import verify_game_sign
 from app.services.jd_general import verify_general_sign
 
@@ -32,50 +34,90 @@ def create_order():
     if not data:
         return jsonify(success=False, message='无效请求数据'), 400
 
+    if not data.get('jd_order_no'):
+        return jsonify(success=False, message='缺少京东订单号'), 400
+
     shop_code = data.get('shop_code')
-    shop = Shop.query.filter_by(shop_code=shop_code, is_enabled=1).first()
-    if not shop:
+    shop = get_shop_by_code(shop_code)
+    if not shop or shop.is_enabled != 1:
         return jsonify(success=False, message='店铺不存在或已禁用'), 400
 
-    # 根据店铺类型验证签名
+    if not _verify_order_sign(shop, data):
+        return jsonify(success=False, message='签名验证失败'), 403
+
+    try:
+        parse_int_fields(data)
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+
+    # 同一店铺的京东订单号重复推送时返回原订单号，不重复入库和通知
+    order_no, created = ingest_order(shop, data)
+    if not created:
+        return jsonify(success=True, message='订单已存在', order_no=order_no, duplicate=True)
+
+    return jsonify(success=True, message='订单创建成功', order_no=order_no)
+
+
+@api_bp.route('/order/batch-create', methods=['POST'])
+def batch_create_orders():
+    """批量接收京东平台订单。
+
+    请求体：{"orders": [订单1, 订单2, ...]}，每个订单与 /order/create 的
+    请求格式相同（包含 shop_code 和签名），可以来自不同店铺。
+    逐条验证签名和字段格式，有效订单一次多行 INSERT 入库，返回每条订单的处理结果。
+    """
+    data = request.get_json()
+    items = data.get('orders') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify(success=False, message='无效请求数据'), 400
+
+    max_size = current_app.config['ORDER_BATCH_MAX_SIZE']
+    if len(items) > max_size:
+        return jsonify(success=False, message=f'单次最多提交{max_size}个订单'), 400
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('jd_order_no'):
+            results[index] = dict(index=index, success=False, message='缺少京东订单号')
+            continue
+        shop = get_shop_by_code(item.get('shop_code'))
+        if not shop or shop.is_enabled != 1:
+            results[index] = dict(index=index, success=False, message='店铺不存在或已禁用')
+            continue
+        if not _verify_order_sign(shop, item):
+            results[index] = dict(index=index, success=False, message='签名验证失败')
+            continue
+        try:
+            parse_int_fields(item)
+        except ValueError as e:
+            # 格式错误的订单单独返回失败，不影响同批其他订单入库
+            results[index] = dict(index=index, success=False, message=str(e))
+            continue
+        valid.append((index, shop, item))
+
+    for index, (order_no, created) in ingest_orders_bulk(valid).items():
+        results[index] = dict(index=index, success=True, order_no=order_no, duplicate=not created,
+                              message='订单创建成功' if created else '订单已存在')
+
+    succeeded = sum(1 for r in results if r['success'])
+    return jsonify(success=True, message=f'成功{succeeded}个，失败{len(results) - succeeded}个',
+                   results=results)
+
+
+def _verify_order_sign(shop, data):
+    """根据店铺类型验证京东推送订单的MD5签名，未配置密钥时不验签。"""
     if shop.shop_type == 1 and shop.game_md5_secret:
         # 京东游戏点卡平台 - MD5签名验证
         if not verify_game_sign(data, shop.game_md5_secret):
             logger.warning("游戏点卡订单签名验证失败: shop=%s", shop.shop_code)
-            return jsonify(success=False, message='签名验证失败'), 403
+            return False
     elif shop.shop_type == 2 and shop.general_md5_secret:
         # 京东通用交易平台 - MD5签名验证
         if not verify_general_sign(data, shop.general_md5_secret):
             logger.warning("通用交易订单签名验证失败: shop=%s", shop.shop_code)
-            return jsonify(success=False, message='签名验证失败'), 403
-
-    order_no = f"ORD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:8].upper()}"
-
-    order = Order(
-        order_no=order_no,
-        jd_order_no=data.get('jd_order_no', ''),
-        shop_id=shop.id,
-        shop_type=shop.shop_type,
-        order_type=int(data.get('order_type', 1)),
-        order_status=int(data.get('order_status', 0)),
-        sku_id=data.get('sku_id'),
-        product_info=data.get('product_info'),
-        amount=int(data.get('amount', 0)),
-        quantity=int(data.get('quantity', 1)),
-        produce_account=data.get('produce_account'),
-        notify_url=data.get('notify_url'),
-    )
-
-    db.session.add(order)
-    db.session.commit()
-
-    # 如果店铺启用了通知，发送订单通知
-    try:
-        send_order_notification(order, shop)
-    except Exception:
-        pass  # 通知失败不影响订单创建
-
-    return jsonify(success=True, message='订单创建成功', order_no=order_no)
+            return False
+    return True
 
 
 @api_bp.route('/shop/test-notification', methods=['POST'])
@@ -108,3 +150,55 @@ def api_resend_notification():
 
     ok, msg = resend_notification(log_id)
     return jsonify(success=ok, message=msg)
+
+
+def _verify_changes_token():
+    """校验增量同步接口的令牌（Authorization: Bearer <令牌>）。"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), allowed.encode())
+               for allowed in current_app.config['ORDER_CHANGES_API_TOKENS'])
+
+
+@api_bp.route('/orders/changes', methods=['GET'])
+def order_changes_feed():
+    """订单增量同步（NDJSON），供财务、BI 等下游系统按游标拉取新增和修改过的订单。
+
+    认证：Authorization: Bearer <ORDER_CHANGES_API_TOKENS 中的任一令牌>
+    参数：
+        cursor: 上一页返回的 next_cursor，不传表示从头开始
+        limit: 每页条数，默认 ORDER_CHANGES_PAGE_SIZE，最多 ORDER_CHANGES_MAX_PAGE_SIZE
+    响应：每行一个 JSON。前面每行一个订单（带该行的 cursor），
+    最后一行为 {"next_cursor": ..., "has_more": ..., "count": ...}；
+    没有最后一行说明响应中断，可从收到的最后一个订单的 cursor 继续。
+    """
+    config = current_app.config
+    if not config['ORDER_CHANGES_API_TOKENS']:
+        return jsonify(success=False, message='未配置同步令牌'), 403
+    if not _verify_changes_token():
+        return jsonify(success=False, message='令牌无效'), 401
+
+    try:
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else (datetime.min, 0)
+    except ValueError:
+        return jsonify(success=False, message='cursor 无效'), 400
+    limit = min(max(request.args.get('limit', config['ORDER_CHANGES_PAGE_SIZE'], type=int), 1),
+                config['ORDER_CHANGES_MAX_PAGE_SIZE'])
+    settle = config['ORDER_CHANGES_SETTLE']
+
+    def generate():
+        count = 0
+        next_cursor = request.args.get('cursor') or None
+        has_more = False
+        # 多读一条判断是否还有下一页
+        for record in iter_change_records(cursor, limit + 1, settle=settle):
+            if count == limit:
+                has_more = True
+                break
+            count += 1
+            next_cursor = record['cursor']
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        yield json.dumps({'next_cursor': next_cursor, 'has_more': has_more, 'count': count}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -1,10 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify
+import json
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy.orm import defer
 
 from app.extensions import db
 from app.models.notification_log import NotificationLog
-from app.models.shop import Shop
+from app.models.notification_log_archive import NotificationLogArchive
 from app.services.notification import resend_notification
+from app.services.notification_resend import bulk_resend_notifications, select_failed_logs
+from app.services.shop_cache import list_shops
 
 notification_bp = Blueprint('notification', __name__)
 
@@ -24,10 +32,17 @@ def admin_required(f):
 @login_required
 @admin_required
 def log_list():
-    page = request.args.get('page', 1, type=int)
+    """通知日志列表。
+
+    按 id 游标翻页（before_id 下一页、after_id 上一页），不统计总数，
+    配合 (筛选字段..., id) 复合索引，日志表很大时也只读取一页数据。
+    """
     per_page = 20
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
 
-    query = NotificationLog.query
+    query = NotificationLog.query.options(
+        defer(NotificationLog.request_data), defer(NotificationLog.response_data))
 
     shop_id = request.args.get('shop_id', type=int)
     notify_type = request.args.get('notify_type', '').strip()
@@ -40,11 +55,24 @@ def log_list():
     if notify_status is not None and notify_status != -1:
         query = query.filter(NotificationLog.notify_status == notify_status)
 
-    pagination = query.order_by(NotificationLog.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    logs = pagination.items
-
-    shops = Shop.query.order_by(Shop.shop_name).all()
-    return render_template('notification/list.html', logs=logs, pagination=pagination, shops=shops)
+    if after_id:
+        logs = query.filter(NotificationLog.id > after_id).order_by(NotificationLog.id.asc()).limit(per_page + 1).all()
+        has_prev = len(logs) > per_page
+        logs = list(reversed(logs[:per_page]))
+        has_next = True
+    else:
+        if before_id:
+            query = query.filter(NotificationLog.id < before_id)
+        logs = query.order_by(NotificationLog.id.desc()).limit(per_page + 1).all()
+        has_next = len(logs) > per_page
+        logs = logs[:per_page]
+        has_prev = bool(before_id)
+
+    shops = list_shops()
+    shop_names = {s.id: s.shop_name for s in shops}
+    filters = {k: v for k, v in request.args.items() if k not in ('before_id', 'after_id')}
+    return render_template('notification/list.html', logs=logs, shops=shops, shop_names=shop_names,
+                           filters=filters, has_prev=has_prev, has_next=has_next)
 
 
 @notification_bp.route('/resend', methods=['POST'])
@@ -60,11 +88,60 @@ def resend():
     return jsonify(success=ok, message=msg)
 
 
+@notification_bp.route('/bulk-resend', methods=['POST'])
+@login_required
+@admin_required
+def bulk_resend():
+    """按店铺和日期范围批量重发失败的通知。
+
+    请求 JSON：{shop_id, start_date, end_date}（日期格式 YYYY-MM-DD，均可省略）。
+    响应为 NDJSON 流：发送过程中逐行输出 {done, total, succeeded}，
+    最后一行为 {finished: true, total, succeeded, failed, skipped}。
+    """
+    data = request.get_json(silent=True) or {}
+    shop_id = data.get('shop_id')
+    try:
+        shop_ids = [int(shop_id)] if shop_id else None
+        start_time = datetime.strptime(data['start_date'], '%Y-%m-%d') if data.get('start_date') else None
+        end_time = datetime.strptime(data['end_date'], '%Y-%m-%d') + timedelta(days=1) \
+            if data.get('end_date') else None
+    except ValueError:
+        return jsonify(success=False, message='参数格式错误')
+
+    app = current_app._get_current_object()
+    events = queue.Queue()
+
+    def work():
+        with app.app_context():
+            try:
+                logs = select_failed_logs(shop_ids=shop_ids, start_time=start_time, end_time=end_time,
+                                          limit=app.config['NOTIFY_RESEND_MAX_SIZE'])
+                events.put({'done': 0, 'total': len(logs), 'succeeded': 0})
+                summary = bulk_resend_notifications(
+                    logs, on_progress=lambda done, total, succeeded: events.put(
+                        {'done': done, 'total': total, 'succeeded': succeeded}))
+                events.put({'finished': True, **summary})
+            except Exception as e:
+                app.logger.exception("批量重发通知失败")
+                events.put({'finished': True, 'error': str(e)})
+
+    threading.Thread(target=work, daemon=True).start()
+
+    def generate():
+        while True:
+            event = events.get()
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+            if event.get('finished'):
+                break
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @notification_bp.route('/detail/<int:log_id>')
 @login_required
 @admin_required
 def log_detail(log_id):
-    log = db.session.get(NotificationLog, log_id)
+    log = db.session.get(NotificationLog, log_id) or db.session.get(NotificationLogArchive, log_id)
     if not log:
         return jsonify(success=False, message='记录不存在'), 404
     return jsonify(log.to_dict())
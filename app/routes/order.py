@@ -1,24 +1,39 @@
 import json
+import queue
+import time
 import uuid
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 
 from app.extensions import db
 from app.models.order import Order
-from app.models.shop import Shop
 from app.services.notification import send_order_notification
-from app.services.jd_game import (
-    callback_game_direct_success,
-    callback_game_card_deliver,
-    callback_game_refund,
-)
-from app.services.jd_general import (
-    callback_general_success,
-    callback_general_card_deliver,
-    callback_general_refund,
+from app.services.callback_outbox import (
+    ACTION_SUCCESS,
+    ACTION_REFUND,
+    NOTIFY_STATUS_SUCCESS,
+    enqueue_callback,
+    has_pending_callback,
 )
 from app.services.agiso import agiso_auto_deliver
+from app.services.order_bulk import BULK_ACTIONS, bulk_order_action
+from app.services.order_feed import (
+    change_horizon,
+    decode_cursor,
+    encode_cursor,
+    get_order_feed_hub,
+    order_changes,
+    render_events,
+)
+from app.services.order_query import (
+    approximate_order_count,
+    build_order_list_query,
+    keyset_page,
+    order_list_columns,
+    parse_order_filters,
+)
+from app.services.shop_cache import list_shops
 import logging
 
 
@@ -26,66 +41,103 @@ logger = logging.getLogger(__name__)
 
 order_bp = Blueprint('order', __name__)
 
-# 回调状态常量：0=未回调 1=成功 2=失败
-NOTIFY_STATUS_SUCCESS = 1
-NOTIFY_STATUS_FAILED = 2
-
 
 @order_bp.route('/')
 @login_required
 def order_list():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
+    # 页码只用于显示，随游标链接递增/递减；没有游标时总是第一页
+    page = max(request.args.get('page', 1, type=int), 1) if before_id or after_id else 1
 
-    query = Order.query
-
-    # Permission filtering
-    if not current_user.is_admin:
-        permitted_ids = current_user.get_permitted_shop_ids()
-        if permitted_ids is not None:
-            query = query.filter(Order.shop_id.in_(permitted_ids)) if permitted_ids else query.filter(db.false())
-
-    # Filters
-    shop_id = request.args.get('shop_id', type=int)
-    shop_type = request.args.get('shop_type', type=int)
-    order_type = request.args.get('order_type', type=int)
-    order_status = request.args.get('order_status', type=int)
-    jd_order_no = request.args.get('jd_order_no', '').strip()
-    start_date = request.args.get('start_date', '').strip()
-    end_date = request.args.get('end_date', '').strip()
-
-    if shop_id:
-        query = query.filter(Order.shop_id == shop_id)
-    if shop_type:
-        query = query.filter(Order.shop_type == shop_type)
-    if order_type:
-        query = query.filter(Order.order_type == order_type)
-    if order_status is not None and order_status != -1:
-        query = query.filter(Order.order_status == order_status)
-    if jd_order_no:
-        query = query.filter(Order.jd_order_no.like(f'%{jd_order_no}%'))
-    if start_date:
-        try:
-            query = query.filter(Order.create_time >= datetime.strptime(start_date, '%Y-%m-%d'))
-        except ValueError:
-            pass
-    if end_date:
+    permitted_ids = None if current_user.is_admin else current_user.get_permitted_shop_ids()
+    filters = parse_order_filters(request.args)
+    query = order_list_columns(build_order_list_query(filters, permitted_ids))
+    order_page = keyset_page(query, before_id=before_id, after_id=after_id, per_page=per_page)
+    if after_id and not order_page.has_prev:
+        page = 1
+    total, total_capped = approximate_order_count(filters, permitted_ids)
+
+    # 筛选下拉框和每行的店铺名称都取自店铺缓存；列表中的订单只会属于这些店铺
+    shops = list_shops() if permitted_ids is None else list_shops(permitted_ids)
+    shop_map = {s.id: s for s in shops}
+
+    link_args = {k: v for k, v in request.args.items() if k not in ('before_id', 'after_id', 'page')}
+    return render_template('order/list.html', orders=order_page.items, order_page=order_page, page=page,
+                           total=total, total_capped=total_capped, total_pages=max(1, -(-total // per_page)),
+                           link_args=link_args, shops=shops, shop_map=shop_map,
+                           live_feed=page == 1 and not filters)
+
+
+def _sse_event(event):
+    data = json.dumps({'id': event.order_id, 'html': event.html}, ensure_ascii=False)
+    return f"id: {encode_cursor(event.cursor)}\nevent: order\ndata: {data}\n\n"
+
+
+@order_bp.route('/stream')
+@login_required
+def order_stream():
+    """订单实时推送（SSE）：有权限店铺的新增和变更订单，每条为订单列表的一行 HTML。
+
+    浏览器断线重连时带 Last-Event-ID，先补发断线期间的变更；
+    连接最长 ORDER_FEED_MAX_SECONDS 秒，到时关闭由浏览器自动重连。
+    """
+    hub = get_order_feed_hub()
+    shop_ids = current_user.get_permitted_shop_ids()
+    # 先订阅再补发，补发与推送重叠的部分按游标去重
+    subscription = hub.subscribe(shop_ids)
+    if subscription is None:
+        return Response('连接数已满，请稍后重试', status=503, headers={'Retry-After': '30'})
+
+    backlog = []
+    reload_page = False
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id:
         try:
-            query = query.filter(Order.create_time <= datetime.strptime(end_date + ' 23:59:59', '%Y-%m-%d %H:%M:%S'))
+            orders, _ = order_changes(decode_cursor(last_event_id), shop_ids=shop_ids,
+                                      limit=hub.queue_size, until=change_horizon(hub.settle),
+                                      query=order_list_columns(Order.query))
         except ValueError:
-            pass
-
-    pagination = query.order_by(Order.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    orders = pagination.items
+            orders = []
+        # 断线期间变更太多时让页面整页刷新
+        reload_page = len(orders) >= hub.queue_size
+        backlog = [] if reload_page else render_events(orders)
+    # 推送期间不再访问数据库，先归还连接
+    db.session.remove()
 
-    # Get shops for filter dropdown
-    if current_user.is_admin:
-        shops = Shop.query.order_by(Shop.shop_name).all()
-    else:
-        permitted_ids = current_user.get_permitted_shop_ids()
-        shops = Shop.query.filter(Shop.id.in_(permitted_ids)).order_by(Shop.shop_name).all() if permitted_ids else []
+    heartbeat = current_app.config['ORDER_FEED_HEARTBEAT']
+    max_seconds = current_app.config['ORDER_FEED_MAX_SECONDS']
 
-    return render_template('order/list.html', orders=orders, pagination=pagination, shops=shops)
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            if reload_page:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            last_sent = None
+            for event in backlog:
+                last_sent = event.cursor
+                yield _sse_event(event)
+            deadline = time.monotonic() + max_seconds
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = subscription.queue.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if last_sent is not None and event.cursor <= last_sent:
+                    continue
+                last_sent = event.cursor
+                yield _sse_event(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @order_bp.route('/detail/<int:order_id>')
@@ -132,7 +184,7 @@ def save_cards(order_id):
 @order_bp.route('/<int:order_id>/notify-success', methods=['POST'])
 @login_required
 def notify_success(order_id):
-    """通知京东订单成功"""
+    """通知京东订单成功（写入回调发件箱，由后台进程发送）"""
     order = db.session.get(Order, order_id)
     if not order:
         return jsonify(success=False, message='订单不存在')
@@ -146,50 +198,22 @@ def notify_success(order_id):
         if not order.card_info_parsed:
             return jsonify(success=False, message='请先填写卡密信息')
     
-    # 根据店铺类型和订单类型调用不同的回调接口
-    try:
-        if shop.shop_type == 1:
-            # 游戏点卡平台
-            if order.order_type == 1:
-                # 直充订单
-                success, message = callback_game_direct_success(shop, order)
-            else:
-                # 卡密订单
-                success, message = callback_game_card_deliver(shop, order, order.card_info_parsed)
-        else:
-            # 通用交易平台
-            if order.order_type == 1:
-                # 直充订单
-                success, message = callback_general_success(shop, order)
-            else:
-                # 卡密订单
-                success, message = callback_general_card_deliver(shop, order, order.card_info_parsed)
-        
-        if success:
-            # 更新订单状态
-            order.order_status = 2
-            order.notify_status = NOTIFY_STATUS_SUCCESS
-            order.notify_time = datetime.now()
-            db.session.commit()
-            
-            logger.info(f"订单 {order.order_no} 通知成功")
-            return jsonify(success=True, message='通知成功')
-        else:
-            order.notify_status = NOTIFY_STATUS_FAILED
-            db.session.commit()
-            return jsonify(success=False, message=message)
+    if has_pending_callback(order.id, ACTION_SUCCESS):
+        return jsonify(success=False, message='回调已在处理中')
     
-    except Exception as e:
-        logger.error(f"订单 {order.order_no} 通知失败：{e}")
-        order.notify_status = NOTIFY_STATUS_FAILED
-        db.session.commit()
-        return jsonify(success=False, message=f'通知失败：{str(e)}')
+    # 订单状态与回调任务同一事务提交，回调结果体现在回调状态上
+    order.order_status = 2
+    enqueue_callback(order, shop, ACTION_SUCCESS)
+    db.session.commit()
+    
+    logger.info(f"订单 {order.order_no} 成功回调已加入发件箱")
+    return jsonify(success=True, message='已提交通知，正在回调京东')
 
 
 @order_bp.route('/<int:order_id>/notify-refund', methods=['POST'])
 @login_required
 def notify_refund(order_id):
-    """通知京东订单退款"""
+    """通知京东订单退款（写入回调发件箱，由后台进程发送）"""
     order = db.session.get(Order, order_id)
     if not order:
         return jsonify(success=False, message='订单不存在')
@@ -202,34 +226,16 @@ def notify_refund(order_id):
     if order.order_status == 4:
         return jsonify(success=False, message='订单已退款')
     
-    # 根据店铺类型调用对应的退款回调
-    try:
-        if shop.shop_type == 1:
-            # 游戏点卡平台
-            success, message = callback_game_refund(shop, order)
-        else:
-            # 通用交易平台
-            success, message = callback_general_refund(shop, order)
-        
-        if success:
-            # 更新订单状态为已退款
-            order.order_status = 4
-            order.notify_status = NOTIFY_STATUS_SUCCESS
-            order.notify_time = datetime.now()
-            db.session.commit()
-            
-            logger.info(f"订单 {order.order_no} 退款通知成功")
-            return jsonify(success=True, message='退款通知已发送')
-        else:
-            order.notify_status = NOTIFY_STATUS_FAILED
-            db.session.commit()
-            return jsonify(success=False, message=message)
+    if has_pending_callback(order.id, ACTION_REFUND):
+        return jsonify(success=False, message='回调已在处理中')
     
-    except Exception as e:
-        logger.error(f"订单 {order.order_no} 退款通知失败：{e}")
-        order.notify_status = NOTIFY_STATUS_FAILED
-        db.session.commit()
-        return jsonify(success=False, message=f'退款通知失败：{str(e)}')
+    # 更新订单状态为已退款，退款回调由后台进程发送
+    order.order_status = 4
+    enqueue_callback(order, shop, ACTION_REFUND)
+    db.session.commit()
+    
+    logger.info(f"订单 {order.order_no} 退款回调已加入发件箱")
+    return jsonify(success=True, message='退款通知已提交，正在回调京东')
 
 
 @order_bp.route('/<int:order_id>/agiso-deliver', methods=['POST'])
@@ -260,6 +266,33 @@ def agiso_deliver(order_id):
         return jsonify(success=False, message=message)
 
 
+@order_bp.route('/bulk-action', methods=['POST'])
+@login_required
+def bulk_action():
+    """批量通知成功 / 通知退款 / 阿奇索发货"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    order_ids = data.get('order_ids')
+    if action not in BULK_ACTIONS:
+        return jsonify(success=False, message='不支持的操作')
+    if not isinstance(order_ids, list) or not order_ids:
+        return jsonify(success=False, message='请选择订单')
+    max_size = current_app.config['ORDER_BULK_MAX_SIZE']
+    if len(order_ids) > max_size:
+        return jsonify(success=False, message=f'单次最多操作{max_size}个订单')
+    try:
+        order_ids = [int(order_id) for order_id in order_ids]
+    except (TypeError, ValueError):
+        return jsonify(success=False, message='订单ID格式错误')
+
+    permitted_ids = None if current_user.is_admin else (current_user.get_permitted_shop_ids() or [])
+    results = bulk_order_action(order_ids, action, permitted_ids)
+    succeeded = sum(1 for r in results if r['success'])
+    logger.info(f"批量操作 {action}: {len(results)} 个订单，成功 {succeeded} 个")
+    return jsonify(success=True, message=f'成功{succeeded}个，失败{len(results) - succeeded}个',
+                   results=results)
+
+
 @order_bp.route('/<int:order_id>/debug-success', methods=['POST'])
 @login_required
 def debug_success(order_id):
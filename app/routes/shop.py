@@ -5,6 +5,8 @@ from flask_login import login_required, current_user
 from app.extensions import db
 from app.models.shop import Shop
 from app.services.notification import send_test_notification
+from app.services.order_stats import remove_shop_from_rollup
+from app.services.shop_cache import invalidate_shops
 
 shop_bp = Blueprint('shop', __name__)
 
@@ -43,6 +45,7 @@ def shop_create():
         db.session.add(shop)
         try:
             db.session.commit()
+            invalidate_shops()
             flash('店铺创建成功', 'success')
             return redirect(url_for('shop.shop_list'))
         except Exception as e:
@@ -67,6 +70,7 @@ def shop_edit(shop_id):
         _fill_shop_fields(shop, request.form)
         try:
             db.session.commit()
+            invalidate_shops()
             flash('店铺更新成功', 'success')
             return redirect(url_for('shop.shop_list'))
         except Exception as e:
@@ -82,8 +86,10 @@ def shop_edit(shop_id):
 def shop_delete(shop_id):
     shop = db.session.get(Shop, shop_id)
     if shop:
+        remove_shop_from_rollup(shop.id)
         db.session.delete(shop)
         db.session.commit()
+        invalidate_shops()
         flash('店铺已删除', 'success')
     return redirect(url_for('shop.shop_list'))
 
@@ -133,6 +139,9 @@ def _fill_shop_fields(shop, form):
     shop.dingtalk_webhook = form.get('dingtalk_webhook', '').strip() or None
     shop.dingtalk_secret = form.get('dingtalk_secret', '').strip() or None
     shop.wecom_webhook = form.get('wecom_webhook', '').strip() or None
+    shop.notify_digest_enabled = int(form.get('notify_digest_enabled', 0))
+    shop.notify_digest_window = max(int(form.get('notify_digest_window') or 60), 1)
+    shop.notify_digest_max = min(max(int(form.get('notify_digest_max') or 20), 1), 50)
 
     # Status
     shop.is_enabled = int(form.get('is_enabled', 1))
@@ -1,67 +1,84 @@
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import Blueprint, current_app, jsonify, render_template, request
 from flask_login import login_required, current_user
-from sqlalchemy import func
 
-from app.extensions import db
-from app.models.order import Order
-from app.models.shop import Shop
+from app.services.order_stats import order_time_series
+from app.services.shop_cache import list_shops
+from app.services.stats_cache import get_dashboard
 
 statistics_bp = Blueprint('statistics', __name__)
 
 
-def admin_required(f):
-    from functools import wraps
-
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if not current_user.is_admin:
-            from flask import redirect, url_for, flash
-            flash('无权限访问', 'danger')
-            return redirect(url_for('order.order_list'))
-        return f(*args, **kwargs)
-    return decorated
-
-
 @statistics_bp.route('/')
 @login_required
-@admin_required
 def index():
-    # Overall stats
-    total_orders = Order.query.count()
-    total_amount = db.session.query(func.sum(Order.amount)).scalar() or 0
-    completed_orders = Order.query.filter_by(order_status=2).count()
-    pending_orders = Order.query.filter(Order.order_status.in_([0, 1])).count()
-
-    # Per-shop stats
-    shop_stats = db.session.query(
-        Shop.id,
-        Shop.shop_name,
-        func.count(Order.id).label('order_count'),
-        func.coalesce(func.sum(Order.amount), 0).label('total_amount'),
-    ).outerjoin(Order, Shop.id == Order.shop_id).group_by(Shop.id).all()
+    # 操作员只统计有权限的店铺；结果按店铺集合缓存，店铺相同的操作员共用同一份缓存（见 stats_cache）
+    days = min(max(request.args.get('days', 7, type=int), 1), 31)
+    stats, age = get_dashboard(days=days, shop_ids=current_user.get_permitted_shop_ids())
 
-    # Recent 7 days stats
-    today = datetime.utcnow().date()
-    daily_stats = []
-    for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        day_start = datetime.combine(day, datetime.min.time())
-        day_end = datetime.combine(day, datetime.max.time())
-        count = Order.query.filter(Order.create_time.between(day_start, day_end)).count()
-        amount = db.session.query(func.sum(Order.amount)).filter(
-            Order.create_time.between(day_start, day_end)
-        ).scalar() or 0
-        daily_stats.append({
-            'date': day.strftime('%m-%d'),
-            'count': count,
-            'amount': amount / 100,
-        })
+    shop_stats = [
+        {'shop_name': shop_name, 'order_count': count, 'total_amount': amount}
+        for _, shop_name, count, amount in stats['shops']
+    ]
+    daily_stats = [
+        {'date': day[5:], 'count': count, 'amount': amount / 100}
+        for day, count, amount in stats['daily']
+    ]
 
     return render_template('statistics/index.html',
-                           total_orders=total_orders,
-                           total_amount=total_amount / 100,
-                           completed_orders=completed_orders,
-                           pending_orders=pending_orders,
+                           total_orders=stats['total_orders'],
+                           total_amount=stats['total_amount'] / 100,
+                           completed_orders=stats['completed_orders'],
+                           pending_orders=stats['pending_orders'],
                            shop_stats=shop_stats,
-                           daily_stats=daily_stats)
+                           daily_stats=daily_stats,
+                           days=days,
+                           data_age=int(age))
+
+
+@statistics_bp.route('/api/series')
+@login_required
+def series():
+    """订单数/金额时间序列（JSON）。
+
+    参数：
+        shop_ids: 逗号分隔的店铺ID，不传表示全部店铺；操作员只统计其中有权限的店铺
+        start / end: 本地日期 YYYY-MM-DD（含），默认最近 7 天
+        granularity: hour / day / month，默认 day
+        tz: 时区名称，默认 STATS_TIMEZONE
+    """
+    try:
+        tz = ZoneInfo(request.args.get('tz') or current_app.config['STATS_TIMEZONE'])
+    except (ZoneInfoNotFoundError, ValueError):
+        return jsonify(success=False, message='时区无效'), 400
+    today = datetime.now(tz).date()
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') \
+            else end - timedelta(days=6)
+        requested = {int(v) for v in request.args.get('shop_ids', '').split(',') if v.strip()}
+    except ValueError:
+        return jsonify(success=False, message='参数格式错误'), 400
+
+    granularity = request.args.get('granularity', 'day')
+    days = (end - start).days + 1
+    buckets = days * 24 if granularity == 'hour' else days
+    if buckets > current_app.config['STATS_SERIES_MAX_BUCKETS']:
+        return jsonify(success=False, message='时间范围过大，请缩小范围或使用更粗的粒度'), 400
+
+    permitted = current_user.get_permitted_shop_ids()
+    if permitted is not None:
+        requested = requested & set(permitted) if requested else set(permitted)
+        if not requested:
+            return jsonify(success=False, message='没有可统计的店铺'), 403
+    # 管理员不指定店铺时不按店铺过滤，已删除店铺的汇总行在删除店铺时一并删除
+    shops = list_shops(requested) if requested else list_shops()
+    try:
+        result = order_time_series([s.id for s in shops] if requested else None, start, end, granularity, tz)
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+    return jsonify(success=True, granularity=granularity, timezone=tz.key, start=start.isoformat(),
+                   end=end.isoformat(), shop_ids=[s.id for s in shops],
+                   total_count=sum(result['count']), total_amount=sum(result['amount']), **result)
@@ -0,0 +1,80 @@
+from flask import Blueprint, jsonify, request
+from flask_login import login_required, current_user
+
+from app.models.callback_outbox import CallbackOutbox
+from app.services.callback_outbox import OUTBOX_STATUS_DEAD, requeue_dead_callback
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.http_client import get_http_stats
+from app.services.notification_queue import webhook_queue_stats
+
+system_bp = Blueprint('system', __name__)
+
+
+def admin_required(f):
+    from functools import wraps
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_admin:
+            return jsonify(success=False, message='无权限'), 403
+        return f(*args, **kwargs)
+    return decorated
+
+
+@system_bp.route('/http-stats')
+@login_required
+@admin_required
+def http_stats():
+    """当前 worker 进程的对外 HTTP 调用统计（按主机）。"""
+    return jsonify(success=True, hosts=get_http_stats())
+
+
+@system_bp.route('/circuit-breakers')
+@login_required
+@admin_required
+def circuit_breakers():
+    """各目标主机的熔断状态、窗口内请求/失败/慢调用数和累计跳过次数（本机所有进程共享）。"""
+    breaker = get_circuit_breaker()
+    if not breaker:
+        return jsonify(success=True, enabled=False, hosts=[])
+    return jsonify(success=True, enabled=True, hosts=breaker.states())
+
+
+@system_bp.route('/circuit-breakers/<path:host>/reset', methods=['POST'])
+@login_required
+@admin_required
+def circuit_breaker_reset(host):
+    """手动恢复某个主机的熔断器。"""
+    breaker = get_circuit_breaker()
+    if not breaker or not breaker.reset(host):
+        return jsonify(success=False, message='没有该主机的熔断记录')
+    return jsonify(success=True, message='已恢复')
+
+
+@system_bp.route('/webhook-limits')
+@login_required
+@admin_required
+def webhook_limits():
+    """各钉钉/企业微信 Webhook 的排队任务数、最早任务等待秒数和令牌桶状态。"""
+    return jsonify(success=True, webhooks=webhook_queue_stats())
+
+
+@system_bp.route('/callback-outbox')
+@login_required
+@admin_required
+def callback_outbox():
+    """回调发件箱记录，默认只看死信。"""
+    status = request.args.get('status', OUTBOX_STATUS_DEAD, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    entries = CallbackOutbox.query.filter_by(outbox_status=status) \
+        .order_by(CallbackOutbox.id.desc()).limit(limit).all()
+    return jsonify(success=True, items=[e.to_dict() for e in entries])
+
+
+@system_bp.route('/callback-outbox/<int:entry_id>/retry', methods=['POST'])
+@login_required
+@admin_required
+def callback_outbox_retry(entry_id):
+    """把死信记录重新放回发件箱。"""
+    success, message = requeue_dead_callback(entry_id)
+    return jsonify(success=success, message=message)
@@ -4,6 +4,7 @@ from flask_login import login_required, current_user
 from app.extensions import db
 from app.models.user import User, UserShopPermission
 from app.models.shop import Shop
+from app.services.user_cache import invalidate_users
 
 user_bp = Blueprint('user', __name__)
 
@@ -98,6 +99,7 @@ def user_edit(user_id):
             db.session.add(perm)
 
         db.session.commit()
+        invalidate_users()
         flash('用户更新成功', 'success')
         return redirect(url_for('user.user_list'))
 
@@ -117,5 +119,6 @@ def user_delete(user_id):
         else:
             db.session.delete(user)
             db.session.commit()
+            invalidate_users()
             flash('用户已删除', 'success')
     return redirect(url_for('user.user_list'))
@@ -18,6 +18,9 @@ import json
 import logging
 import requests
 
+from app.services import http_client
+from app.services.circuit_breaker import CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +56,9 @@ def _build_agiso_url(shop):
         str: API基础URL
     """
     host = shop.agiso_host or 'open.agiso.com'
+    if host.startswith(('http://', 'https://')):
+        # 主机地址带协议时原样使用（如对接本地模拟服务 http://127.0.0.1:9000）
+        return host.rstrip('/')
     port = shop.agiso_port
     if port and port not in (80, 443):
         return f'https://{host}:{port}'
@@ -120,7 +126,7 @@ def agiso_auto_deliver(shop, order):
     api_url = f'{base_url}/api/jd/order/deliver'
 
     try:
-        resp = requests.post(api_url, json=params, headers=headers, timeout=30)
+        resp = http_client.post(api_url, json=params, headers=headers, timeout=30)
         result = resp.json()
 
         if result.get('code') == 0 or result.get('success'):
@@ -130,6 +136,9 @@ def agiso_auto_deliver(shop, order):
             error_msg = result.get('message') or result.get('msg') or '发货失败'
             return False, f'阿奇索发货失败：{error_msg}', result
 
+    except CircuitOpenError as e:
+        logger.warning("阿奇索接口熔断中，跳过调用: %s", e.host)
+        return False, f'阿奇索接口{e}', None
     except requests.exceptions.Timeout:
         logger.exception("阿奇索接口调用超时")
         return False, '阿奇索接口调用超时', None
@@ -170,7 +179,7 @@ def agiso_query_order(shop, jd_order_no):
     api_url = f'{base_url}/api/jd/order/query'
 
     try:
-        resp = requests.post(api_url, json=params, headers=headers, timeout=10)
+        resp = http_client.post(api_url, json=params, headers=headers)
         result = resp.json()
 
         if result.get('code') == 0 or result.get('success'):
@@ -0,0 +1,24 @@
+"""跨进程缓存版本号。
+
+每个 gunicorn worker 各自持有进程内缓存。数据变更时递增 cache_versions
+表中对应名称的版本号，其他 worker 定期比较版本号即可发现缓存已过期，
+无需每次请求都查询业务表。
+"""
+from app.extensions import db
+from app.models.cache_version import CacheVersion
+
+
+def get_cache_version(name):
+    """读取缓存版本号，不存在时返回0。"""
+    version = db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+    return version or 0
+
+
+def bump_cache_version(name):
+    """递增缓存版本号并提交。"""
+    updated = CacheVersion.query.filter_by(name=name).update(
+        {'version': CacheVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1))
+    db.session.commit()
@@ -0,0 +1,297 @@
+"""京东回调发件箱。
+
+操作员点击「通知成功 / 通知退款」时，订单状态变更与一条 callback_outbox
+记录在同一事务中提交，接口立即返回；后台进程（python worker.py）负责
+把回调发送给京东：
+
+- 失败后按指数退避加随机抖动重试，超过 CALLBACK_MAX_ATTEMPTS 次进入死信状态，
+  订单回调状态标记为失败，可在 /system/callback-outbox 中查看并重新投递
+- 同一目标主机同时最多 CALLBACK_PER_HOST_LIMIT 个请求，单个主机变慢不会占满全部线程
+- 目标主机熔断期间（app/services/circuit_breaker.py）该主机的记录顺延，不消耗尝试次数
+- 多个 worker 同时运行时通过条件更新抢占记录，同一记录只会被发送一次
+"""
+import logging
+import random
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import current_app
+
+from app.extensions import db
+from app.models.callback_outbox import CallbackOutbox
+from app.models.order import Order
+from app.models.shop import Shop
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.http_client import host_of
+from app.services.jd_game import (
+    callback_game_direct_success,
+    callback_game_card_deliver,
+    callback_game_refund,
+)
+from app.services.jd_general import (
+    callback_general_success,
+    callback_general_card_deliver,
+    callback_general_refund,
+)
+
+logger = logging.getLogger(__name__)
+
+ACTION_SUCCESS = 'success'
+ACTION_REFUND = 'refund'
+
+# 发件箱状态：0=待发送 1=发送中 2=成功 3=死信
+OUTBOX_STATUS_PENDING = 0
+OUTBOX_STATUS_RUNNING = 1
+OUTBOX_STATUS_DONE = 2
+OUTBOX_STATUS_DEAD = 3
+
+# 订单回调状态：0=未回调 1=成功 2=失败
+NOTIFY_STATUS_PENDING = 0
+NOTIFY_STATUS_SUCCESS = 1
+NOTIFY_STATUS_FAILED = 2
+
+STALE_TIMEOUT = timedelta(minutes=5)
+
+
+def callback_url_for(shop, order, action):
+    """回调动作对应的京东回调地址。"""
+    if shop.shop_type == 1:
+        if action == ACTION_SUCCESS and order.order_type == 2:
+            return shop.game_card_callback_url
+        return shop.game_direct_callback_url
+    return shop.general_callback_url
+
+
+def dispatch_callback(shop, order, action):
+    """根据店铺类型、订单类型调用对应的京东回调接口。
+
+    Returns:
+        (bool, str): (是否成功, 消息)
+    """
+    if action == ACTION_REFUND:
+        if shop.shop_type == 1:
+            return callback_game_refund(shop, order)
+        return callback_general_refund(shop, order)
+
+    if shop.shop_type == 1:
+        # 游戏点卡平台
+        if order.order_type == 1:
+            return callback_game_direct_success(shop, order)
+        return callback_game_card_deliver(shop, order, order.card_info_parsed)
+    # 通用交易平台
+    if order.order_type == 1:
+        return callback_general_success(shop, order)
+    return callback_general_card_deliver(shop, order, order.card_info_parsed)
+
+
+def has_pending_callback(order_id, action):
+    return db.session.query(CallbackOutbox.id).filter(
+        CallbackOutbox.order_id == order_id,
+        CallbackOutbox.action == action,
+        CallbackOutbox.outbox_status.in_([OUTBOX_STATUS_PENDING, OUTBOX_STATUS_RUNNING]),
+    ).first() is not None
+
+
+def enqueue_callback(order, shop, action):
+    """把回调写入发件箱并把订单回调状态置为未回调，由调用方与状态变更一起提交。"""
+    url = callback_url_for(shop, order, action)
+    entry = CallbackOutbox(
+        order_id=order.id,
+        shop_id=shop.id,
+        action=action,
+        host=host_of(url) if url else None,
+        outbox_status=OUTBOX_STATUS_PENDING,
+        attempts=0,
+        next_run_time=datetime.utcnow(),
+    )
+    db.session.add(entry)
+    order.notify_status = NOTIFY_STATUS_PENDING
+    return entry
+
+
+def backoff_delay(attempts, base, cap):
+    """第 attempts 次失败后的等待秒数：指数退避，取上限后在后一半区间随机抖动。"""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def build_lanes(entries, per_host_limit):
+    """按主机把记录分成若干条顺序执行的通道，每个主机最多 per_host_limit 条通道。"""
+    by_host = defaultdict(list)
+    for entry in entries:
+        by_host[entry.host].append(entry)
+    lanes = []
+    for host_entries in by_host.values():
+        count = min(per_host_limit, len(host_entries))
+        lanes.extend(host_entries[i::count] for i in range(count))
+    return lanes
+
+
+class HostTask(namedtuple('HostTask', 'key host func')):
+    """一次对外调用：key 用于取回结果，host 用于按主机限制并发，func 无参数。"""
+
+
+def run_host_tasks(tasks, max_workers, per_host_limit, on_result=None):
+    """用有界线程池并发执行调用，每个主机最多 per_host_limit 个并发。
+
+    func 在工作线程中执行（已推入应用上下文），不能访问数据库会话，
+    所需的 ORM 属性需事先加载。on_result(key, result) 在每个调用完成后
+    于工作线程中调用，可用于汇报进度。
+
+    Returns:
+        dict: {key: func 返回值}，抛出异常时为 (False, 异常信息)
+    """
+    app = current_app._get_current_object()
+
+    def run_lane(lane):
+        results = {}
+        with app.app_context():
+            for task in lane:
+                try:
+                    results[task.key] = task.func()
+                except Exception as e:
+                    logger.exception("对外调用异常: host=%s", task.host)
+                    results[task.key] = (False, str(e))
+                if on_result:
+                    on_result(task.key, results[task.key])
+        return results
+
+    results = {}
+    lanes = build_lanes(tasks, per_host_limit)
+    if not lanes:
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(lanes))) as pool:
+        for lane_results in pool.map(run_lane, lanes):
+            results.update(lane_results)
+    return results
+
+
+def run_callbacks(entries, orders, shops, max_workers, per_host_limit):
+    """并发执行一批发件箱回调，返回 {entry.id: (ok, message)}。
+
+    Args:
+        entries: 发件箱记录（只读取 id/order_id/shop_id/action/host）
+        orders: {order_id: Order}，属性需已加载
+        shops: {shop_id: Shop}，属性需已加载
+    """
+    results = {}
+    tasks = []
+    for entry in entries:
+        order, shop = orders.get(entry.order_id), shops.get(entry.shop_id)
+        if not order or not shop:
+            results[entry.id] = (False, '订单或店铺不存在')
+            continue
+        tasks.append(HostTask(entry.id, entry.host, partial(dispatch_callback, shop, order, entry.action)))
+    results.update(run_host_tasks(tasks, max_workers, per_host_limit))
+    return results
+
+
+def apply_callback_result(entry, order, ok, message, config):
+    """根据回调结果更新发件箱记录和订单回调状态（不提交）。"""
+    now = datetime.utcnow()
+    entry.attempts = (entry.attempts or 0) + 1
+    if ok:
+        entry.outbox_status = OUTBOX_STATUS_DONE
+        entry.last_error = None
+        if order:
+            order.notify_status = NOTIFY_STATUS_SUCCESS
+            order.notify_time = datetime.now()
+        return
+
+    entry.last_error = message
+    if entry.attempts >= config['CALLBACK_MAX_ATTEMPTS']:
+        entry.outbox_status = OUTBOX_STATUS_DEAD
+        if order:
+            order.notify_status = NOTIFY_STATUS_FAILED
+        logger.error("京东回调进入死信: outbox=%s order=%s error=%s", entry.id, entry.order_id, message)
+    else:
+        entry.outbox_status = OUTBOX_STATUS_PENDING
+        entry.next_run_time = now + timedelta(seconds=backoff_delay(
+            entry.attempts, config['CALLBACK_BACKOFF_BASE'], config['CALLBACK_BACKOFF_MAX']))
+
+
+def process_callback_outbox(batch_size=100):
+    """发送一批到期的京东回调，返回处理的记录数。"""
+    config = current_app.config
+    _requeue_stale_entries()
+
+    _defer_blocked_hosts()
+
+    now = datetime.utcnow()
+    due = db.session.query(CallbackOutbox.id, CallbackOutbox.order_id).filter(
+        CallbackOutbox.outbox_status == OUTBOX_STATUS_PENDING,
+        CallbackOutbox.next_run_time <= now,
+    ).order_by(CallbackOutbox.id).limit(batch_size).all()
+
+    # 同一订单的多条回调按写入顺序逐条发送，本轮只取最早的一条
+    entry_ids, seen_orders = [], set()
+    for row in due:
+        if row.order_id not in seen_orders:
+            seen_orders.add(row.order_id)
+            entry_ids.append(row.id)
+    entry_ids = [entry_id for entry_id in entry_ids if _claim_entry(entry_id)]
+    if not entry_ids:
+        return 0
+
+    entries = CallbackOutbox.query.filter(CallbackOutbox.id.in_(entry_ids)).all()
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_({e.order_id for e in entries}))}
+    shops = {s.id: s for s in Shop.query.filter(Shop.id.in_({e.shop_id for e in entries}))}
+
+    results = run_callbacks(entries, orders, shops,
+                            config['CALLBACK_WORKER_THREADS'], config['CALLBACK_PER_HOST_LIMIT'])
+    for entry in entries:
+        ok, message = results.get(entry.id, (False, '未执行'))
+        apply_callback_result(entry, orders.get(entry.order_id), ok, message, config)
+    db.session.commit()
+    return len(entries)
+
+
+def requeue_dead_callback(entry_id):
+    """把死信记录重新放回发件箱。"""
+    entry = db.session.get(CallbackOutbox, entry_id)
+    if not entry:
+        return False, '记录不存在'
+    if entry.outbox_status != OUTBOX_STATUS_DEAD:
+        return False, '只能重新投递死信记录'
+    entry.outbox_status = OUTBOX_STATUS_PENDING
+    entry.attempts = 0
+    entry.next_run_time = datetime.utcnow()
+    db.session.commit()
+    return True, '已重新投递'
+
+
+def _defer_blocked_hosts():
+    """熔断中的主机不发送、不计入尝试次数，推迟到允许探测的时间。"""
+    breaker = get_circuit_breaker()
+    if not breaker:
+        return
+    now = datetime.utcnow()
+    for host, retry_at in breaker.blocked_hosts().items():
+        CallbackOutbox.query.filter(
+            CallbackOutbox.host == host,
+            CallbackOutbox.outbox_status == OUTBOX_STATUS_PENDING,
+            CallbackOutbox.next_run_time <= now,
+        ).update({'next_run_time': datetime.utcfromtimestamp(retry_at)}, synchronize_session=False)
+    db.session.commit()
+
+
+def _claim_entry(entry_id):
+    claimed = CallbackOutbox.query.filter_by(id=entry_id, outbox_status=OUTBOX_STATUS_PENDING).update(
+        {'outbox_status': OUTBOX_STATUS_RUNNING, 'update_time': datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _requeue_stale_entries():
+    deadline = datetime.utcnow() - STALE_TIMEOUT
+    count = CallbackOutbox.query.filter(
+        CallbackOutbox.outbox_status == OUTBOX_STATUS_RUNNING,
+        CallbackOutbox.update_time < deadline,
+    ).update({'outbox_status': OUTBOX_STATUS_PENDING}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logger.warning("重新放回发件箱的超时回调: %d", count)
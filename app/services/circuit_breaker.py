@@ -0,0 +1,184 @@
+"""按目标主机的熔断器。
+
+京东回调地址或阿奇索主机不可用时，每次调用都要等满超时，
+少量线程很快被占满、后台整体卡死。http_client 在发出请求前检查目标主机的熔断状态：
+
+- 关闭（正常）：按时间窗口统计请求数、失败数（异常或 5xx）、慢调用数，
+  请求数达到 BREAKER_MIN_REQUESTS 且失败率或慢调用率超过阈值时打开
+- 打开：直接抛出 CircuitOpenError，不发出请求，并累计跳过次数
+- 半开：打开 BREAKER_OPEN_SECONDS 秒后放行一个探测请求，成功则关闭，失败则重新打开
+
+状态保存在共享状态库中，同一台主机的所有 worker 和后台进程共用。
+"""
+import logging
+import time
+
+import requests
+from flask import current_app
+
+from app.services.shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+STATE_LABELS = {STATE_CLOSED: '正常', STATE_OPEN: '熔断', STATE_HALF_OPEN: '探测中'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    host TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'closed',
+    window_start REAL NOT NULL DEFAULT 0,
+    requests INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    slow_calls INTEGER NOT NULL DEFAULT 0,
+    opened_at REAL,
+    probe_started_at REAL,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL
+);
+"""
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """目标主机处于熔断状态，请求未发出。"""
+
+    def __init__(self, host):
+        super().__init__(f'{host} 暂时不可用（已熔断），请稍后重试')
+        self.host = host
+
+
+class CircuitBreaker:
+    def __init__(self, store, window=60, min_requests=5, failure_rate=0.5,
+                 slow_call_seconds=5.0, slow_call_rate=0.5, open_seconds=30):
+        self.store = store
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        store.register_schema(SCHEMA)
+
+    def before_call(self, host):
+        """请求前调用；主机熔断中时抛出 CircuitOpenError。"""
+        rows = self.store.query('SELECT state FROM circuit_breakers WHERE host = ?', (host,))
+        if not rows or rows[0]['state'] == STATE_CLOSED:
+            return
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT state, opened_at, probe_started_at FROM circuit_breakers WHERE host = ?',
+                               (host,)).fetchone()
+            if row is None or row['state'] == STATE_CLOSED:
+                return
+            if row['state'] == STATE_OPEN and now - row['opened_at'] >= self.open_seconds:
+                conn.execute('UPDATE circuit_breakers SET state = ?, probe_started_at = ?, updated_at = ? '
+                             'WHERE host = ?', (STATE_HALF_OPEN, now, now, host))
+                logger.info("熔断器半开，放行探测请求: %s", host)
+                return
+            # 探测请求超过一个打开周期仍无结果，视为丢失，再放行一个
+            if row['state'] == STATE_HALF_OPEN and now - (row['probe_started_at'] or 0) >= self.open_seconds:
+                conn.execute('UPDATE circuit_breakers SET probe_started_at = ?, updated_at = ? WHERE host = ?',
+                             (now, now, host))
+                return
+            conn.execute('UPDATE circuit_breakers SET skipped = skipped + 1 WHERE host = ?', (host,))
+        raise CircuitOpenError(host)
+
+    def after_call(self, host, ok, elapsed, error=None):
+        """请求结束后记录结果，必要时切换状态。"""
+        now = time.time()
+        slow = elapsed >= self.slow_call_seconds
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT * FROM circuit_breakers WHERE host = ?', (host,)).fetchone()
+            if row is None:
+                conn.execute('INSERT INTO circuit_breakers (host, window_start, updated_at) VALUES (?, ?, ?)',
+                             (host, now, now))
+                row = conn.execute('SELECT * FROM circuit_breakers WHERE host = ?', (host,)).fetchone()
+
+            if row['state'] == STATE_OPEN:
+                # 熔断前已发出的请求，结果不影响状态
+                return
+            if row['state'] == STATE_HALF_OPEN:
+                if ok and not slow:
+                    conn.execute('UPDATE circuit_breakers SET state = ?, window_start = ?, requests = 0, '
+                                 'failures = 0, slow_calls = 0, opened_at = NULL, probe_started_at = NULL, '
+                                 'updated_at = ? WHERE host = ?', (STATE_CLOSED, now, now, host))
+                    logger.info("熔断器恢复: %s", host)
+                else:
+                    self._open(conn, host, now, error)
+                return
+
+            if now - row['window_start'] >= self.window:
+                requests_, failures, slow_calls = 0, 0, 0
+                window_start = now
+            else:
+                requests_, failures, slow_calls = row['requests'], row['failures'], row['slow_calls']
+                window_start = row['window_start']
+            requests_ += 1
+            failures += 0 if ok else 1
+            slow_calls += 1 if slow else 0
+            conn.execute('UPDATE circuit_breakers SET window_start = ?, requests = ?, failures = ?, slow_calls = ?, '
+                         'last_error = COALESCE(?, last_error), updated_at = ? WHERE host = ?',
+                         (window_start, requests_, failures, slow_calls, error, now, host))
+            if requests_ >= self.min_requests and (failures / requests_ >= self.failure_rate
+                                                   or slow_calls / requests_ >= self.slow_call_rate):
+                self._open(conn, host, now, error)
+
+    def blocked_hosts(self):
+        """仍在熔断期内的主机：{host: 允许探测的时间戳}。"""
+        now = time.time()
+        rows = self.store.query('SELECT host, opened_at FROM circuit_breakers WHERE state = ?', (STATE_OPEN,))
+        return {row['host']: row['opened_at'] + self.open_seconds for row in rows
+                if now - row['opened_at'] < self.open_seconds}
+
+    def states(self):
+        now = time.time()
+        result = []
+        for row in self.store.query('SELECT * FROM circuit_breakers ORDER BY host'):
+            in_window = now - row['window_start'] < self.window
+            result.append({
+                'host': row['host'],
+                'state': row['state'],
+                'state_label': STATE_LABELS.get(row['state'], row['state']),
+                'requests': row['requests'] if in_window else 0,
+                'failures': row['failures'] if in_window else 0,
+                'slow_calls': row['slow_calls'] if in_window else 0,
+                'skipped': row['skipped'],
+                'open_remaining': max(0, round(row['opened_at'] + self.open_seconds - now))
+                if row['state'] == STATE_OPEN else 0,
+                'last_error': row['last_error'],
+            })
+        return result
+
+    def reset(self, host):
+        with self.store.transaction() as conn:
+            return conn.execute('DELETE FROM circuit_breakers WHERE host = ?', (host,)).rowcount == 1
+
+    def _open(self, conn, host, now, error):
+        conn.execute('UPDATE circuit_breakers SET state = ?, opened_at = ?, probe_started_at = NULL, '
+                     'last_error = COALESCE(?, last_error), updated_at = ? WHERE host = ?',
+                     (STATE_OPEN, now, error, now, host))
+        logger.warning("熔断器打开: %s error=%s", host, error)
+
+
+def get_circuit_breaker():
+    """当前应用的熔断器；BREAKER_ENABLED 关闭时返回 None。"""
+    config = current_app.config
+    if not config.get('BREAKER_ENABLED', True):
+        return None
+    breaker = current_app.extensions.get('circuit_breaker')
+    if breaker is None:
+        # 并发初始化时可能创建多个实例，状态都在共享状态库中，不影响结果
+        breaker = current_app.extensions['circuit_breaker'] = CircuitBreaker(
+            get_shared_state(),
+            window=config['BREAKER_WINDOW'],
+            min_requests=config['BREAKER_MIN_REQUESTS'],
+            failure_rate=config['BREAKER_FAILURE_RATE'],
+            slow_call_seconds=config['BREAKER_SLOW_CALL_SECONDS'],
+            slow_call_rate=config['BREAKER_SLOW_CALL_RATE'],
+            open_seconds=config['BREAKER_OPEN_SECONDS'],
+        )
+    return breaker
@@ -0,0 +1,174 @@
+"""对外 HTTP 调用的共享客户端。
+
+京东回调、阿奇索接口、钉钉/企业微信机器人都通过这里发出请求。
+每个进程持有一个 requests.Session，按目标主机维护 keep-alive 连接池，
+避免每次回调都重新建立 TCP/TLS 连接。
+
+- 连接池大小、默认超时通过 HTTP_POOL_SIZE / HTTP_POOL_HOSTS / HTTP_TIMEOUT 配置
+- gunicorn fork 出的子进程检测到进程号变化后重新创建会话，不复用父进程的连接
+- 按主机统计请求数、失败数、耗时和新建连接数（统计仅针对当前进程）
+- 有应用上下文时经过按主机的熔断器（app/services/circuit_breaker.py），
+  目标主机熔断中时直接抛出 CircuitOpenError，不等待超时
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.services.circuit_breaker import CircuitOpenError, get_circuit_breaker
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_HOSTS = 20
+DEFAULT_TIMEOUT = 10
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.new_connections = 0
+        self.skipped = 0
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time / self.requests * 1000, 1) if self.requests else 0,
+            'max_ms': round(self.max_time * 1000, 1),
+            'new_connections': self.new_connections,
+            'reused_connections': max(self.requests - self.errors - self.new_connections, 0),
+            'skipped': self.skipped,
+        }
+
+
+def _counting_pool(base, on_new_connection):
+    """连接池子类：每新建一个连接回调一次，用于统计连接复用情况。"""
+
+    class CountingPool(base):
+        def _new_conn(self):
+            on_new_connection(f'{self.host}:{self.port}')
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class HttpClient:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self._on_new_connection),
+            'https': _counting_pool(HTTPSConnectionPool, self._on_new_connection),
+        }
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def request(self, method, url, timeout=None, breaker=None, **kwargs):
+        host = host_of(url)
+        if breaker:
+            try:
+                breaker.before_call(host)
+            except CircuitOpenError:
+                self._record_skipped(host)
+                raise
+        start = time.perf_counter()
+        try:
+            resp = self._session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self._record(host, elapsed, failed=True)
+            if breaker:
+                breaker.after_call(host, False, elapsed, error=type(e).__name__)
+            raise
+        elapsed = time.perf_counter() - start
+        self._record(host, elapsed, failed=False)
+        if breaker:
+            server_error = resp.status_code >= 500
+            breaker.after_call(host, not server_error, elapsed,
+                               error=f'HTTP {resp.status_code}' if server_error else None)
+        return resp
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {host: s.to_dict() for host, s in self._stats.items()}
+
+    def close(self):
+        self._session.close()
+
+    def _record(self, host, elapsed, failed):
+        with self._lock:
+            stats = self._stats.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.errors += 1 if failed else 0
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+
+    def _record_skipped(self, host):
+        with self._lock:
+            self._stats.setdefault(host, HostStats()).skipped += 1
+
+    def _on_new_connection(self, host):
+        with self._lock:
+            self._stats.setdefault(host, HostStats()).new_connections += 1
+
+
+def host_of(url):
+    """URL 对应的 host:port，作为连接池和统计的键。"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return f'{parts.hostname}:{port}'
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """当前进程的共享客户端；fork 后在子进程中重新创建。"""
+    global _client
+    client = _client
+    if client is None or client.pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client.pid != os.getpid():
+                config = current_app.config if has_app_context() else {}
+                _client = HttpClient(
+                    pool_size=config.get('HTTP_POOL_SIZE', DEFAULT_POOL_SIZE),
+                    pool_hosts=config.get('HTTP_POOL_HOSTS', DEFAULT_POOL_HOSTS),
+                    timeout=config.get('HTTP_TIMEOUT', DEFAULT_TIMEOUT),
+                )
+            client = _client
+    return client
+
+
+def _current_breaker():
+    return get_circuit_breaker() if has_app_context() else None
+
+
+def post(url, **kwargs):
+    return get_http_client().post(url, breaker=_current_breaker(), **kwargs)
+
+
+def get(url, **kwargs):
+    return get_http_client().get(url, breaker=_current_breaker(), **kwargs)
+
+
+def get_http_stats():
+    return get_http_client().stats()
@@ -6,7 +6,7 @@
 import hashlib
 import json
 import logging
-import requests
+from app.services import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -84,7 +84,7 @@ def callback_game_direct_success(shop, order):
         params['sign'] = generate_game_sign(params, shop.game_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '回调成功'
@@ -123,7 +123,7 @@ def callback_game_card_deliver(shop, order, cards):
         params['sign'] = generate_game_sign(sign_params, shop.game_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '卡密回调成功'
@@ -158,7 +158,7 @@ def callback_game_refund(shop, order):
         params['sign'] = generate_game_sign(params, shop.game_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '退款回调成功'
@@ -7,7 +7,7 @@
 import hashlib
 import json
 import logging
-import requests
+from app.services import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -85,7 +85,7 @@ def callback_general_success(shop, order):
         params['sign'] = generate_general_sign(params, shop.general_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '回调成功'
@@ -128,7 +128,7 @@ def callback_general_card_deliver(shop, order, cards):
         params['sign'] = generate_general_sign(sign_params, shop.general_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '卡密回调成功'
@@ -164,7 +164,7 @@ def callback_general_refund(shop, order):
         params['sign'] = generate_general_sign(params, shop.general_md5_secret)
 
     try:
-        resp = requests.post(callback_url, json=params, timeout=10)
+        resp = http_client.post(callback_url, json=params)
         result = resp.json()
         if result.get('success') or result.get('code') == 0:
             return True, '退款回调成功'
@@ -6,31 +6,79 @@ import time
 import logging
 from urllib.parse import quote_plus
 
-import requests
+from app.services import http_client
 
 from app.extensions import db
 from app.models.notification_log import NotificationLog
+from app.services.webhook_limiter import get_webhook_limiter
 
 logger = logging.getLogger(__name__)
 
 RETRY_INTERVALS = [1, 3, 5]
 
 
+def build_order_fragment(order, shop=None):
+    """Build the order detail lines of a notification (shop line omitted when shop is None)."""
+    lines = [f"**订单号：** {order.jd_order_no}"]
+    if shop is not None:
+        lines.append(f"**店铺：** {shop.shop_name}")
+    lines += [
+        f"**商品：** {order.product_info or '-'}",
+        f"**金额：** ¥{order.amount_yuan}",
+        f"**数量：** {order.quantity}",
+        f"**充值账号：** {order.produce_account or '-'}",
+        f"**创建时间：** {order.create_time.strftime('%Y-%m-%d %H:%M:%S') if order.create_time else '-'}",
+    ]
+    return "\n\n".join(lines)
+
+
 def build_order_message(order, shop):
     """Build notification message for an order."""
+    return f"### 📦 新订单通知\n\n{build_order_fragment(order, shop)}\n\n> 请及时处理订单"
+
+
+# Maximum UTF-8 size of one markdown message per channel (WeCom rejects longer ones with errcode 40058)
+MESSAGE_BYTE_LIMITS = {'dingtalk': 20000, 'wecom': 4096}
+
+
+def build_digest_message(orders, shop):
+    """Build one combined notification message for several orders of a shop."""
+    fragments = "\n\n---\n\n".join(build_order_fragment(order) for order in orders)
     return (
-        f"### 📦 新订单通知\n\n"
-        f"**订单号：** {order.jd_order_no}\n\n"
-        f"**店铺：** {shop.shop_name}\n\n"
-        f"**商品：** {order.product_info or '-'}\n\n"
-        f"**金额：** ¥{order.amount_yuan}\n\n"
-        f"**数量：** {order.quantity}\n\n"
-        f"**充值账号：** {order.produce_account or '-'}\n\n"
-        f"**创建时间：** {order.create_time.strftime('%Y-%m-%d %H:%M:%S') if order.create_time else '-'}\n\n"
+        f"### 📦 新订单通知（共{len(orders)}单）\n\n"
+        f"**店铺：** {shop.shop_name}\n\n---\n\n"
+        f"{fragments}\n\n"
         f"> 请及时处理订单"
     )
 
 
+def truncate_utf8(message, limit):
+    """Cut a message to at most limit UTF-8 bytes without splitting a character."""
+    data = message.encode('utf-8')
+    if len(data) <= limit:
+        return message
+    return data[:limit].decode('utf-8', errors='ignore')
+
+
+def fit_digest_message(orders, shop, notify_type):
+    """Build the digest for the longest leading run of orders that fits the channel's byte limit.
+
+    Returns (count, message): the first count orders are covered by message; the caller sends the
+    remaining orders in further messages. A single order that alone exceeds the limit is truncated.
+    """
+    limit = MESSAGE_BYTE_LIMITS.get(notify_type)
+    message = build_digest_message(orders, shop)
+    if limit is None or len(message.encode('utf-8')) <= limit:
+        return len(orders), message
+    count, message = 1, truncate_utf8(build_digest_message(orders[:1], shop), limit)
+    for n in range(2, len(orders)):
+        candidate = build_digest_message(orders[:n], shop)
+        if len(candidate.encode('utf-8')) > limit:
+            break
+        count, message = n, candidate
+    return count, message
+
+
 def _generate_dingtalk_sign(timestamp, secret):
     """Generate DingTalk webhook signature."""
     string_to_sign = f"{timestamp}\n{secret}"
@@ -63,7 +111,7 @@ def send_dingtalk(webhook, secret, message):
             }
         }
 
-        resp = requests.post(url, json=data, timeout=10)
+        resp = http_client.post(url, json=data)
         resp_text = resp.text
         result = resp.json()
         if result.get('errcode', -1) == 0:
@@ -87,7 +135,7 @@ def send_wecom(webhook, message):
             }
         }
 
-        resp = requests.post(webhook, json=data, timeout=10)
+        resp = http_client.post(webhook, json=data)
         resp_text = resp.text
         result = resp.json()
         if result.get('errcode', -1) == 0:
@@ -98,6 +146,27 @@ def send_wecom(webhook, message):
         return False, '', str(e)
 
 
+def notify_webhook(notify_type, shop):
+    """Return the webhook URL a channel sends to (also the rate-limit key)."""
+    if notify_type == 'dingtalk':
+        return shop.dingtalk_webhook
+    if notify_type == 'wecom':
+        return shop.wecom_webhook
+    return None
+
+
+def _send_paced(notify_type, shop, message):
+    """Send synchronously after waiting for the webhook's rate-limit token.
+
+    Gives up with an error once NOTIFY_RATE_MAX_WAIT is exceeded.
+    """
+    webhook = notify_webhook(notify_type, shop)
+    limiter = get_webhook_limiter()
+    if webhook and limiter and not limiter.acquire(webhook, notify_type):
+        return False, '', '发送过于频繁，超过机器人限流，请稍后重试'
+    return _do_send(notify_type, shop, message)
+
+
 def _do_send(notify_type, shop, message):
     """Execute send for a specific notification type."""
     if notify_type == 'dingtalk' and shop.dingtalk_webhook:
@@ -107,28 +176,59 @@ def _do_send(notify_type, shop, message):
     return False, '', '未配置通知渠道'
 
 
-def send_order_notification(order, shop):
-    """Send order notification via configured channels with retry."""
-    if shop.notify_enabled != 1:
-        return
-
-    message = build_order_message(order, shop)
-
+def get_notify_channels(shop):
+    """Return the notification channels configured for a shop."""
     channels = []
     if shop.dingtalk_webhook:
         channels.append('dingtalk')
     if shop.wecom_webhook:
         channels.append('wecom')
+    return channels
+
+
+def notification_log_values(order, shop, notify_type, success, message, resp_text, error_msg, digest_id=None):
+    """Column values of a NotificationLog row, usable for a batch insert."""
+    return dict(
+        order_id=order.id,
+        shop_id=shop.id,
+        notify_type=notify_type,
+        notify_status=1 if success else 0,
+        request_data=json.dumps({"message": message[:500]}, ensure_ascii=False),
+        response_data=resp_text[:2000] if resp_text else None,
+        error_message=error_msg,
+        digest_id=digest_id,
+    )
+
+
+def build_notification_log(order, shop, notify_type, success, message, resp_text, error_msg, digest_id=None):
+    """Build a NotificationLog row for one send attempt (caller adds and commits).
+
+    digest_id links the logs of orders that were sent together in one digest message.
+    """
+    return NotificationLog(**notification_log_values(order, shop, notify_type, success, message,
+                                                     resp_text, error_msg, digest_id=digest_id))
+
+
+def send_order_notification(order, shop):
+    """Send order notification via configured channels with retry.
+
+    This blocks while retrying; request handlers should enqueue through
+    app.services.notification_queue instead.
+    """
+    if shop.notify_enabled != 1:
+        return
+
+    message = build_order_message(order, shop)
 
     from datetime import datetime
 
-    for channel in channels:
+    for channel in get_notify_channels(shop):
         success = False
         resp_text = ''
         error_msg = None
 
         for attempt, wait in enumerate(RETRY_INTERVALS):
-            ok, resp_text, err = _do_send(channel, shop, message)
+            ok, resp_text, err = _send_paced(channel, shop, message)
             if ok:
                 success = True
                 error_msg = None
@@ -137,16 +237,7 @@ def send_order_notification(order, shop):
             if attempt < len(RETRY_INTERVALS) - 1:
                 time.sleep(wait)
 
-        log = NotificationLog(
-            order_id=order.id,
-            shop_id=shop.id,
-            notify_type=channel,
-            notify_status=1 if success else 0,
-            request_data=json.dumps({"message": message[:500]}, ensure_ascii=False),
-            response_data=resp_text[:2000] if resp_text else None,
-            error_message=error_msg,
-        )
-        db.session.add(log)
+        db.session.add(build_notification_log(order, shop, channel, success, message, resp_text, error_msg))
 
     order.notified = 1
     order.notify_send_time = datetime.utcnow()
@@ -168,18 +259,9 @@ def resend_notification(log_id):
         return False, '订单或店铺不存在'
 
     message = build_order_message(order, shop)
-    ok, resp_text, err = _do_send(log_entry.notify_type, shop, message)
+    ok, resp_text, err = _send_paced(log_entry.notify_type, shop, message)
 
-    new_log = NotificationLog(
-        order_id=order.id,
-        shop_id=shop.id,
-        notify_type=log_entry.notify_type,
-        notify_status=1 if ok else 0,
-        request_data=json.dumps({"message": message[:500]}, ensure_ascii=False),
-        response_data=resp_text[:2000] if resp_text else None,
-        error_message=err,
-    )
-    db.session.add(new_log)
+    db.session.add(build_notification_log(order, shop, log_entry.notify_type, ok, message, resp_text, err))
     db.session.commit()
 
     return ok, err if not ok else '发送成功'
@@ -195,5 +277,5 @@ def send_test_notification(shop, notify_type):
         "> 这是一条测试通知，收到此消息说明配置正确"
     )
 
-    ok, resp_text, err = _do_send(notify_type, shop, message)
+    ok, resp_text, err = _send_paced(notify_type, shop, message)
     return ok, err if not ok else '测试通知发送成功'
@@ -0,0 +1,72 @@
+"""通知日志保留与归档。
+
+notification_logs 每个订单每个渠道至少一行，并带有请求/响应原文。
+超过 NOTIFY_LOG_RETENTION_DAYS 天的日志由后台进程每天按主键分批搬到
+notification_logs_archive：请求、响应、错误信息压缩为一个字段，
+每批单独提交，避免长事务和大范围锁。先按 idx_log_create_time 取出过期日志的
+最大 id，每批只扫描该 id 之前的主键范围，不会读到未过期的日志。
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert
+
+from app.extensions import db
+from app.models.notification_log import NotificationLog
+from app.models.notification_log_archive import NotificationLogArchive
+
+logger = logging.getLogger(__name__)
+
+
+def archive_notification_logs(retention_days, chunk_size=1000, max_chunks=None):
+    """把早于 retention_days 天的通知日志移入归档表。
+
+    Args:
+        retention_days: 保留天数，小于等于 0 时不归档
+        chunk_size: 每批搬移的行数
+        max_chunks: 本次最多处理的批数，None 表示直到没有过期日志
+
+    Returns:
+        int: 归档的日志条数
+    """
+    if retention_days <= 0:
+        return 0
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    max_id = db.session.query(func.max(NotificationLog.id)).filter(NotificationLog.create_time < cutoff).scalar()
+    if max_id is None:
+        return 0
+
+    archived = 0
+    chunks = 0
+    last_id = 0
+    while max_chunks is None or chunks < max_chunks:
+        # 按主键范围 (last_id, max_id] 分批，create_time 基本随 id 递增，范围内几乎都是过期日志
+        logs = NotificationLog.query.filter(
+            NotificationLog.id > last_id,
+            NotificationLog.id <= max_id,
+            NotificationLog.create_time < cutoff,
+        ).order_by(NotificationLog.id).limit(chunk_size).all()
+        if not logs:
+            break
+
+        ids = [log.id for log in logs]
+        db.session.execute(insert(NotificationLogArchive), [
+            dict(id=log.id, order_id=log.order_id, shop_id=log.shop_id, notify_type=log.notify_type,
+                 notify_status=log.notify_status, digest_id=log.digest_id, create_time=log.create_time,
+                 payload=NotificationLogArchive.pack(log.request_data, log.response_data, log.error_message))
+            for log in logs
+        ])
+        db.session.execute(delete(NotificationLog).where(NotificationLog.id.in_(ids)))
+        db.session.commit()
+        db.session.expunge_all()
+
+        archived += len(ids)
+        chunks += 1
+        last_id = ids[-1]
+        if len(ids) < chunk_size:
+            break
+
+    if archived:
+        logger.info("已归档通知日志 %d 条（%s 之前）", archived, cutoff.strftime('%Y-%m-%d'))
+    return archived
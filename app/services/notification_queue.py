@@ -0,0 +1,395 @@
+"""订单通知任务队列。
+
+/api/order/create 只把通知任务写入 notification_jobs 表（与订单同一事务），
+由后台进程（python worker.py）取出并发送。重试与退避通过推迟
+next_run_time 实现，不在请求线程里 sleep，订单接收的响应时间
+不再受钉钉/企业微信 Webhook 可用性影响。
+
+店铺开启合并通知（notify_digest_enabled）后，该店铺的任务不逐条发送：
+同一店铺、同一渠道的待发送任务等待 notify_digest_window 秒或攒够
+notify_digest_max 单后合并为一条消息发送，每个订单仍各写一条 NotificationLog
+（request_data 为实际发送的合并消息），以 digest_id 关联同一次发送。
+合并消息超过渠道的字节上限（企业微信 4096 字节）时，放不下的订单留在队列中，
+由下一条消息发送。
+
+发送前按 Webhook 取令牌（app.services.webhook_limiter），取不到时任务留在队列中，
+next_run_time 推迟到有令牌的时间，不计入尝试次数。
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from app.extensions import db
+from app.models.notification_job import NotificationJob
+from app.models.order import Order
+from app.models.shop import Shop
+from app.services.notification import (
+    RETRY_INTERVALS,
+    _do_send,
+    build_order_message,
+    build_notification_log,
+    fit_digest_message,
+    get_notify_channels,
+    notify_webhook,
+)
+from app.services.webhook_limiter import get_webhook_limiter, mask_webhook
+
+logger = logging.getLogger(__name__)
+
+# 任务状态：0=待发送 1=发送中 2=已完成 3=失败
+JOB_STATUS_PENDING = 0
+JOB_STATUS_RUNNING = 1
+JOB_STATUS_DONE = 2
+JOB_STATUS_FAILED = 3
+
+MAX_ATTEMPTS = len(RETRY_INTERVALS)
+
+# 发送中超过该时间未完成的任务视为 worker 异常退出，重新放回队列
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue_order_notification(order, shop):
+    """为订单的每个通知渠道创建一条待发送任务。
+
+    只加入当前会话，由调用方统一提交，保证任务与订单在同一事务中落库。
+    订单需已 flush（拥有 id）。
+
+    Args:
+        order: 订单对象
+        shop: 店铺对象
+
+    Returns:
+        list[NotificationJob]: 新建的任务
+    """
+    if shop.notify_enabled != 1:
+        return []
+
+    now = datetime.utcnow()
+    jobs = [
+        NotificationJob(order_id=order.id, shop_id=shop.id, notify_type=channel, digest=_digest_flag(shop),
+                        job_status=JOB_STATUS_PENDING, attempts=0, next_run_time=now)
+        for channel in get_notify_channels(shop)
+    ]
+    db.session.add_all(jobs)
+    return jobs
+
+
+def enqueue_order_notifications_bulk(order_shops):
+    """批量写入通知任务（单条多行 INSERT），由调用方提交。
+
+    Args:
+        order_shops: [(order_id, shop), ...]
+
+    Returns:
+        int: 写入的任务数量
+    """
+    now = datetime.utcnow()
+    rows = [
+        dict(order_id=order_id, shop_id=shop.id, notify_type=channel, digest=_digest_flag(shop),
+             job_status=JOB_STATUS_PENDING, attempts=0, next_run_time=now)
+        for order_id, shop in order_shops if shop.notify_enabled == 1
+        for channel in get_notify_channels(shop)
+    ]
+    if rows:
+        db.session.execute(insert(NotificationJob), rows)
+    return len(rows)
+
+
+def process_notification_jobs(batch_size=50):
+    """取出到期的通知任务并逐个发送，直到队列中没有到期任务。
+
+    多个 worker 同时运行时，通过条件更新 job_status 抢占任务，
+    同一任务只会被一个 worker 执行。
+
+    Args:
+        batch_size: 每次从数据库读取的任务数量
+
+    Returns:
+        int: 本次处理的任务数量
+    """
+    _requeue_stale_jobs()
+
+    processed = _process_digest_jobs()
+    while True:
+        now = datetime.utcnow()
+        rows = db.session.query(NotificationJob.id, NotificationJob.shop_id, NotificationJob.notify_type).filter(
+            NotificationJob.job_status == JOB_STATUS_PENDING,
+            NotificationJob.next_run_time <= now,
+            NotificationJob.digest == 0,
+        ).order_by(NotificationJob.next_run_time, NotificationJob.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        # 本批内已被限流的 (店铺, 渠道)，其余任务直接推迟，不再抢占
+        throttled = {}
+        for job_id, shop_id, notify_type in rows:
+            until = throttled.get((shop_id, notify_type))
+            if until:
+                _defer_job(job_id, until)
+                continue
+            if _claim_job(job_id):
+                until = _run_job(db.session.get(NotificationJob, job_id))
+                if until:
+                    throttled[(shop_id, notify_type)] = until
+                else:
+                    processed += 1
+        db.session.commit()
+
+        if len(rows) < batch_size:
+            break
+
+    return processed
+
+
+def _digest_flag(shop):
+    return 1 if getattr(shop, 'notify_digest_enabled', 0) == 1 else 0
+
+
+def _process_digest_jobs():
+    """发送已到合并时间或已攒够订单数的合并通知，返回处理的任务数量。"""
+    now = datetime.utcnow()
+    groups = db.session.query(
+        NotificationJob.shop_id, NotificationJob.notify_type,
+        func.count(NotificationJob.id), func.min(NotificationJob.create_time),
+    ).filter(
+        NotificationJob.job_status == JOB_STATUS_PENDING,
+        NotificationJob.next_run_time <= now,
+        NotificationJob.digest == 1,
+    ).group_by(NotificationJob.shop_id, NotificationJob.notify_type).all()
+
+    processed = 0
+    for shop_id, notify_type, count, oldest in groups:
+        shop = db.session.get(Shop, shop_id)
+        max_orders = (shop.notify_digest_max if shop else None) or 20
+        window = timedelta(seconds=(shop.notify_digest_window if shop else None) or 60)
+        # 店铺已关闭合并通知时不再等待，立即发出
+        digest_on = shop is not None and shop.notify_digest_enabled == 1
+        if digest_on and count < max_orders and oldest > now - window:
+            continue
+
+        while True:
+            # 店铺已关闭合并通知时同样先取令牌；店铺不存在或已关闭通知时不发送，不需要令牌
+            wait = _rate_limit_wait(notify_type, shop) if shop is not None and shop.notify_enabled == 1 else 0
+            if wait:
+                NotificationJob.query.filter(
+                    NotificationJob.shop_id == shop_id,
+                    NotificationJob.notify_type == notify_type,
+                    NotificationJob.job_status == JOB_STATUS_PENDING,
+                    NotificationJob.digest == 1,
+                ).update({'next_run_time': now + timedelta(seconds=wait)}, synchronize_session=False)
+                db.session.commit()
+                break
+            job_ids = [row.id for row in db.session.query(NotificationJob.id).filter(
+                NotificationJob.shop_id == shop_id,
+                NotificationJob.notify_type == notify_type,
+                NotificationJob.job_status == JOB_STATUS_PENDING,
+                NotificationJob.next_run_time <= now,
+                NotificationJob.digest == 1,
+            ).order_by(NotificationJob.id).limit(max_orders).all()]
+            claimed = [job_id for job_id in job_ids if _claim_job(job_id)]
+            if not claimed:
+                # 任务已被其他 worker 取走，本次没有发送，归还令牌
+                if shop is not None and shop.notify_enabled == 1:
+                    _release_rate_limit(notify_type, shop)
+                break
+            handled = _run_digest(shop, notify_type, NotificationJob.query.filter(
+                NotificationJob.id.in_(claimed)).order_by(NotificationJob.id).all())
+            processed += handled
+            # 超过消息字节上限而放回队列的订单，继续由下一条消息发送
+            if len(job_ids) < max_orders and handled == len(claimed):
+                break
+    return processed
+
+
+def _run_digest(shop, notify_type, jobs):
+    """把一组任务合并为一条消息发送；失败的任务按各自的尝试次数重试。
+
+    消息超过渠道字节上限时只发送放得下的订单，其余任务放回队列（不计入尝试次数）。
+
+    Returns:
+        int: 已处理（发送或失败）的任务数
+    """
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_([job.order_id for job in jobs]))}
+    if not shop or shop.notify_enabled != 1:
+        for job in jobs:
+            job.job_status = JOB_STATUS_DONE if shop else JOB_STATUS_FAILED
+            job.last_error = '店铺已关闭通知' if shop else '订单或店铺不存在'
+        db.session.commit()
+        return len(jobs)
+
+    sendable = []
+    for job in jobs:
+        if job.order_id in orders:
+            sendable.append(job)
+        else:
+            job.job_status = JOB_STATUS_FAILED
+            job.last_error = '订单或店铺不存在'
+    if not sendable:
+        db.session.commit()
+        return len(jobs)
+
+    count, message = fit_digest_message([orders[job.order_id] for job in sendable], shop, notify_type)
+    for job in sendable[count:]:
+        job.job_status = JOB_STATUS_PENDING
+    handled = len(jobs) - len(sendable[count:])
+    sendable = sendable[:count]
+    ok, resp_text, err = _do_send(notify_type, shop, message)
+    digest_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+
+    for job in sendable:
+        order = orders[job.order_id]
+        job.attempts = (job.attempts or 0) + 1
+        job.last_error = err
+        if ok or job.attempts >= MAX_ATTEMPTS:
+            job.job_status = JOB_STATUS_DONE if ok else JOB_STATUS_FAILED
+            db.session.add(build_notification_log(order, shop, notify_type, ok, message,
+                                                  resp_text, err, digest_id=digest_id))
+            order.notified = 1
+            order.notify_send_time = now
+        else:
+            job.job_status = JOB_STATUS_PENDING
+            job.next_run_time = now + timedelta(seconds=RETRY_INTERVALS[job.attempts - 1])
+
+    if not ok:
+        logger.info("合并通知发送失败，稍后重试: shop=%s channel=%s orders=%d",
+                    shop.shop_code, notify_type, len(sendable))
+    db.session.commit()
+    return handled
+
+
+def _rate_limit_wait(notify_type, shop):
+    """从 Webhook 令牌桶取令牌，返回需等待的秒数（0 表示可以立即发送）。"""
+    webhook = notify_webhook(notify_type, shop)
+    limiter = get_webhook_limiter()
+    if not webhook or not limiter:
+        return 0
+    return limiter.try_acquire(webhook, notify_type)
+
+
+def _release_rate_limit(notify_type, shop):
+    """归还 _rate_limit_wait 取得但没有使用的令牌。"""
+    webhook = notify_webhook(notify_type, shop)
+    limiter = get_webhook_limiter()
+    if webhook and limiter:
+        limiter.release(webhook)
+
+
+def _defer_job(job_id, until):
+    """把待发送任务推迟到 until（由调用方提交）。"""
+    NotificationJob.query.filter_by(id=job_id, job_status=JOB_STATUS_PENDING).update(
+        {'next_run_time': until}, synchronize_session=False)
+
+
+def webhook_queue_stats():
+    """各 Webhook 的排队任务数、最早任务已等待秒数及令牌桶状态。
+
+    Returns:
+        list[dict]: 按排队数从多到少排列
+    """
+    now = datetime.utcnow()
+    rows = db.session.query(
+        NotificationJob.shop_id, NotificationJob.notify_type,
+        func.count(NotificationJob.id), func.min(NotificationJob.create_time), func.max(NotificationJob.next_run_time),
+    ).filter(
+        NotificationJob.job_status.in_([JOB_STATUS_PENDING, JOB_STATUS_RUNNING]),
+    ).group_by(NotificationJob.shop_id, NotificationJob.notify_type).all()
+
+    limiter = get_webhook_limiter()
+    buckets = limiter.states() if limiter else {}
+    stats = {}
+    for shop_id, notify_type, count, oldest, latest_run in rows:
+        shop = db.session.get(Shop, shop_id)
+        webhook = notify_webhook(notify_type, shop) if shop else None
+        if not webhook:
+            continue
+        item = stats.setdefault(webhook, {'channel': notify_type, 'shops': [], 'queued': 0,
+                                          'oldest_wait': 0, 'drain_at': None})
+        item['shops'].append(shop.shop_code)
+        item['queued'] += count
+        item['oldest_wait'] = max(item['oldest_wait'], round((now - oldest).total_seconds()))
+        if latest_run and (item['drain_at'] is None or latest_run > item['drain_at']):
+            item['drain_at'] = latest_run
+    for webhook, bucket in buckets.items():
+        stats.setdefault(webhook, {'channel': bucket['channel'], 'shops': [], 'queued': 0,
+                                   'oldest_wait': 0, 'drain_at': None})
+
+    result = []
+    for webhook, item in stats.items():
+        item['webhook'] = mask_webhook(webhook)
+        item['drain_at'] = item['drain_at'].strftime('%Y-%m-%d %H:%M:%S') if item['drain_at'] else None
+        item['bucket'] = buckets.get(webhook)
+        result.append(item)
+    result.sort(key=lambda item: item['queued'], reverse=True)
+    return result
+
+
+def _claim_job(job_id):
+    """将任务从待发送改为发送中，返回是否抢占成功。"""
+    claimed = NotificationJob.query.filter_by(id=job_id, job_status=JOB_STATUS_PENDING).update(
+        {'job_status': JOB_STATUS_RUNNING, 'update_time': datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _requeue_stale_jobs():
+    """把长时间处于发送中的任务放回待发送状态。"""
+    deadline = datetime.utcnow() - STALE_JOB_TIMEOUT
+    count = NotificationJob.query.filter(
+        NotificationJob.job_status == JOB_STATUS_RUNNING,
+        NotificationJob.update_time < deadline,
+    ).update({'job_status': JOB_STATUS_PENDING}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logger.warning("重新放回队列的超时通知任务: %d", count)
+
+
+def _run_job(job):
+    """执行一次发送；失败且未达到重试上限时按 RETRY_INTERVALS 推迟重试。
+
+    Returns:
+        datetime|None: 被 Webhook 限流时返回任务推迟到的时间
+    """
+    order = db.session.get(Order, job.order_id)
+    shop = db.session.get(Shop, job.shop_id)
+    if not order or not shop:
+        job.job_status = JOB_STATUS_FAILED
+        job.last_error = '订单或店铺不存在'
+        db.session.commit()
+        return
+
+    if shop.notify_enabled != 1:
+        job.job_status = JOB_STATUS_DONE
+        job.last_error = '店铺已关闭通知'
+        db.session.commit()
+        return
+
+    wait = _rate_limit_wait(job.notify_type, shop)
+    if wait:
+        job.job_status = JOB_STATUS_PENDING
+        job.next_run_time = datetime.utcnow() + timedelta(seconds=wait)
+        db.session.commit()
+        return job.next_run_time
+
+    message = build_order_message(order, shop)
+    ok, resp_text, err = _do_send(job.notify_type, shop, message)
+    job.attempts = (job.attempts or 0) + 1
+
+    if ok or job.attempts >= MAX_ATTEMPTS:
+        job.job_status = JOB_STATUS_DONE if ok else JOB_STATUS_FAILED
+        job.last_error = err
+        db.session.add(build_notification_log(order, shop, job.notify_type, ok, message, resp_text, err))
+        order.notified = 1
+        order.notify_send_time = datetime.utcnow()
+    else:
+        job.job_status = JOB_STATUS_PENDING
+        job.last_error = err
+        job.next_run_time = datetime.utcnow() + timedelta(seconds=RETRY_INTERVALS[job.attempts - 1])
+        logger.info("通知发送失败，稍后重试: order=%s channel=%s attempt=%d",
+                    order.order_no, job.notify_type, job.attempts)
+
+    db.session.commit()
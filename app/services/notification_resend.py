@@ -0,0 +1,123 @@
+"""批量重发失败的订单通知。
+
+Webhook 故障恢复后，按店铺和时间范围选出发送失败的通知日志，
+每个订单、每个渠道只重发最近一次失败且之后没有成功记录的那条：
+
+- 订单、店铺各用一次查询加载，消息在主线程中生成
+- 发送使用有界线程池，同一 Webhook 的消息在一条通道中顺序发出，
+  每条发送前从 Webhook 令牌桶取令牌，不会超过机器人限流
+- 新的通知日志在全部发送完成后一次批量写入
+"""
+import logging
+import threading
+from functools import partial
+
+from flask import current_app
+from sqlalchemy import func, insert
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.models.notification_log import NotificationLog
+from app.models.order import Order
+from app.models.shop import Shop
+from app.services.callback_outbox import HostTask, run_host_tasks
+from app.services.notification import (
+    _send_paced,
+    build_order_message,
+    notification_log_values,
+    notify_webhook,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def select_failed_logs(shop_ids=None, start_time=None, end_time=None, limit=1000):
+    """选出需要重发的失败通知日志。
+
+    Args:
+        shop_ids: 店铺ID列表，None 表示全部店铺
+        start_time: 日志创建时间下限（含）
+        end_time: 日志创建时间上限（不含）
+        limit: 最多返回条数
+
+    Returns:
+        list[NotificationLog]: 每个 (订单, 渠道) 最近一次失败的日志，按 id 排序
+    """
+    # 失败之后已经重发成功的不再重发
+    success = aliased(NotificationLog)
+    resolved = db.session.query(success.id).filter(
+        success.order_id == NotificationLog.order_id,
+        success.notify_type == NotificationLog.notify_type,
+        success.notify_status == 1,
+        success.id > NotificationLog.id,
+    ).exists()
+
+    query = db.session.query(func.max(NotificationLog.id)).filter(NotificationLog.notify_status == 0, ~resolved)
+    if shop_ids is not None:
+        query = query.filter(NotificationLog.shop_id.in_(shop_ids))
+    if start_time:
+        query = query.filter(NotificationLog.create_time >= start_time)
+    if end_time:
+        query = query.filter(NotificationLog.create_time < end_time)
+    latest_failed = [row[0] for row in query.group_by(NotificationLog.order_id, NotificationLog.notify_type)
+                     .order_by(func.max(NotificationLog.id)).limit(limit)]
+    if not latest_failed:
+        return []
+    return NotificationLog.query.filter(NotificationLog.id.in_(latest_failed)).order_by(NotificationLog.id).all()
+
+
+def bulk_resend_notifications(logs, on_progress=None):
+    """并发重发一组失败的通知日志，并批量写入新的通知日志。
+
+    Args:
+        logs: select_failed_logs 返回的日志
+        on_progress: 可选回调 on_progress(done, total, succeeded)，在发送线程中调用
+
+    Returns:
+        dict: {total, succeeded, failed, skipped}
+    """
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_({log.order_id for log in logs}))} if logs else {}
+    shops = {s.id: s for s in Shop.query.filter(Shop.id.in_({log.shop_id for log in logs}))} if logs else {}
+
+    tasks = []
+    messages = {}
+    skipped = 0
+    for log in logs:
+        order, shop = orders.get(log.order_id), shops.get(log.shop_id)
+        webhook = notify_webhook(log.notify_type, shop) if shop else None
+        if not order or not webhook:
+            skipped += 1
+            continue
+        messages[log.id] = build_order_message(order, shop)
+        tasks.append(HostTask(log.id, webhook, partial(_send_paced, log.notify_type, shop, messages[log.id])))
+
+    total = len(tasks)
+    progress = {'done': 0, 'succeeded': 0}
+    lock = threading.Lock()
+
+    def on_result(key, result):
+        with lock:
+            progress['done'] += 1
+            progress['succeeded'] += 1 if result[0] else 0
+            done, succeeded = progress['done'], progress['succeeded']
+        if on_progress:
+            on_progress(done, total, succeeded)
+
+    # 同一 Webhook 只开一条通道，按令牌桶节奏顺序发送
+    results = run_host_tasks(tasks, current_app.config['NOTIFY_RESEND_WORKERS'], 1, on_result=on_result)
+
+    rows = []
+    for log in logs:
+        if log.id not in results:
+            continue
+        ok, resp_text, err = results[log.id] if len(results[log.id]) == 3 else (False, '', results[log.id][1])
+        rows.append(notification_log_values(orders[log.order_id], shops[log.shop_id], log.notify_type, ok,
+                                            messages[log.id], resp_text, err))
+    if rows:
+        db.session.execute(insert(NotificationLog), rows)
+    db.session.commit()
+
+    summary = {'total': total, 'succeeded': progress['succeeded'], 'failed': total - progress['succeeded'],
+               'skipped': skipped}
+    logger.info("批量重发通知: %s", summary)
+    return summary
@@ -0,0 +1,172 @@
+"""订单批量操作：批量通知成功、通知退款、阿奇索发货。
+
+所有订单和店铺一次查询加载，对外调用通过有界线程池并发执行，状态更新一次提交。
+京东回调通常都发往同一主机，批量操作按 ORDER_BULK_CONCURRENCY（不超过 HTTP_POOL_SIZE）
+控制每个主机的并发数，而不是后台重试使用的 CALLBACK_PER_HOST_LIMIT；
+100 个订单的耗时约为 100 / ORDER_BULK_CONCURRENCY 次调用，而不是全部调用之和。
+
+通知成功 / 通知退款仍然经过回调发件箱：先写入发件箱并提交（标记为发送中），
+再当场发送；失败的回调留在发件箱中由后台进程按退避策略继续重试。
+"""
+import logging
+from datetime import datetime
+from functools import partial
+
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models.callback_outbox import CallbackOutbox
+from app.models.order import Order
+from app.services.agiso import agiso_auto_deliver, _build_agiso_url
+from app.services.callback_outbox import (
+    ACTION_SUCCESS,
+    ACTION_REFUND,
+    NOTIFY_STATUS_SUCCESS,
+    OUTBOX_STATUS_PENDING,
+    OUTBOX_STATUS_RUNNING,
+    OUTBOX_STATUS_DEAD,
+    HostTask,
+    apply_callback_result,
+    enqueue_callback,
+    run_callbacks,
+    run_host_tasks,
+)
+from app.services.http_client import host_of
+
+logger = logging.getLogger(__name__)
+
+ACTION_AGISO_DELIVER = 'agiso-deliver'
+BULK_ACTIONS = (ACTION_SUCCESS, ACTION_REFUND, ACTION_AGISO_DELIVER)
+
+
+def bulk_order_action(order_ids, action, permitted_shop_ids=None):
+    """对一组订单执行同一操作。
+
+    Args:
+        order_ids: 订单ID列表
+        action: success / refund / agiso-deliver
+        permitted_shop_ids: 可操作的店铺ID列表，None 表示不限制（管理员）
+
+    Returns:
+        list[dict]: 按 order_ids 顺序的结果 {order_id, success, message}
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    orders = {o.id: o for o in _load_orders(order_ids)}
+    messages = {}
+    targets = []
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        error = _check_order(order, action, permitted_shop_ids)
+        if error:
+            messages[order_id] = (False, error)
+        else:
+            targets.append(order)
+
+    if action == ACTION_AGISO_DELIVER:
+        messages.update(_bulk_agiso_deliver(targets))
+    else:
+        messages.update(_bulk_callback(targets, action))
+
+    return [
+        {'order_id': order_id, 'success': messages[order_id][0], 'message': messages[order_id][1]}
+        for order_id in order_ids
+    ]
+
+
+def _load_orders(order_ids):
+    if not order_ids:
+        return []
+    return Order.query.options(joinedload(Order.shop)).filter(Order.id.in_(order_ids)).all()
+
+
+def _check_order(order, action, permitted_shop_ids):
+    if not order:
+        return '订单不存在'
+    if permitted_shop_ids is not None and order.shop_id not in permitted_shop_ids:
+        return '无权限操作该订单'
+    if not order.shop:
+        return '店铺不存在'
+    if action == ACTION_SUCCESS and order.order_type == 2 and not order.card_info_parsed:
+        return '请先填写卡密信息'
+    if action == ACTION_REFUND and order.order_status == 4:
+        return '订单已退款'
+    return None
+
+
+def _bulk_concurrency(config):
+    """批量操作每个主机的并发数，同时也是线程数：同一主机的连接池只有 HTTP_POOL_SIZE 个连接。"""
+    return max(1, min(config['ORDER_BULK_CONCURRENCY'], config['HTTP_POOL_SIZE']))
+
+
+def _bulk_callback(orders, action):
+    """写入发件箱后当场并发发送京东回调。"""
+    if not orders:
+        return {}
+    results = {}
+    busy = {row.order_id for row in db.session.query(CallbackOutbox.order_id).filter(
+        CallbackOutbox.order_id.in_([o.id for o in orders]),
+        CallbackOutbox.action == action,
+        CallbackOutbox.outbox_status.in_([OUTBOX_STATUS_PENDING, OUTBOX_STATUS_RUNNING]),
+    )}
+
+    entry_orders = {}
+    for order in orders:
+        if order.id in busy:
+            results[order.id] = (False, '回调已在处理中')
+            continue
+        order.order_status = 2 if action == ACTION_SUCCESS else 4
+        entry = enqueue_callback(order, order.shop, action)
+        # 由本请求直接发送，标记为发送中，避免后台进程同时取走
+        entry.outbox_status = OUTBOX_STATUS_RUNNING
+        entry_orders[order.id] = entry
+    if not entry_orders:
+        return results
+    db.session.flush()
+    entry_ids = [entry.id for entry in entry_orders.values()]
+    db.session.commit()
+
+    # 提交后属性已过期，重新加载，工作线程中不能访问数据库会话
+    entries = CallbackOutbox.query.filter(CallbackOutbox.id.in_(entry_ids)).all()
+    orders = {o.id: o for o in _load_orders(list(entry_orders))}
+    shops = {o.shop_id: o.shop for o in orders.values()}
+    config = current_app.config
+    concurrency = _bulk_concurrency(config)
+    sent = run_callbacks(entries, orders, shops, concurrency, concurrency)
+
+    for entry in entries:
+        ok, message = sent.get(entry.id, (False, '未执行'))
+        apply_callback_result(entry, orders.get(entry.order_id), ok, message, config)
+        if ok:
+            message = '通知成功' if action == ACTION_SUCCESS else '退款通知已发送'
+        elif entry.outbox_status != OUTBOX_STATUS_DEAD:
+            message = f'{message}（稍后自动重试）'
+        results[entry.order_id] = (ok, message)
+    db.session.commit()
+    return results
+
+
+def _bulk_agiso_deliver(orders):
+    """并发调用阿奇索发货接口，成功的订单一次提交状态。"""
+    if not orders:
+        return {}
+    tasks = [
+        HostTask(order.id, host_of(_build_agiso_url(order.shop)), partial(agiso_auto_deliver, order.shop, order))
+        for order in orders
+    ]
+    config = current_app.config
+    concurrency = _bulk_concurrency(config)
+    sent = run_host_tasks(tasks, concurrency, concurrency)
+
+    results = {}
+    now = datetime.now()
+    for order in orders:
+        ok, message = sent[order.id][:2]
+        if ok:
+            order.order_status = 2
+            order.notify_status = NOTIFY_STATUS_SUCCESS
+            order.notify_time = now
+        results[order.id] = (ok, message)
+    db.session.commit()
+    logger.info("批量阿奇索发货: %d 个订单，成功 %d 个", len(orders), sum(1 for ok, _ in results.values() if ok))
+    return results
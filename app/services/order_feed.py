@@ -0,0 +1,286 @@
+"""订单变更读取：订单列表实时推送和增量同步接口。
+
+订单列表页通过 SSE（/order/stream）接收新增和变更的订单，不再需要反复刷新整页：
+
+- 订单按 (update_time, id) 游标读取，走 idx_update_time_id 索引，
+  每次只读取上次之后变化的行；与增量同步接口一样只读取早于
+  change_horizon(ORDER_FEED_SETTLE) 的行，避免提交较晚的事务被游标越过
+- 每个 worker 一个 OrderFeedHub：有订阅者时由一个后台线程每
+  ORDER_FEED_INTERVAL 秒轮询一次，按订阅者的店铺权限分发到各自的队列，
+  轮询次数与连接数无关；没有订阅者时线程退出
+- 每行 HTML 在 hub 中按 order/_row.html 渲染一次，所有订阅者共用
+
+SSE 连接会一直占用一个线程，gunicorn 需使用 gthread worker（见 gunicorn_conf.py），
+每个 worker 最多 ORDER_FEED_MAX_CLIENTS 个连接。
+
+财务、BI 等下游系统通过 /api/orders/changes 按同一游标增量同步订单（iter_change_records），
+结果用服务端游标逐批读取（yield_per），内存占用与每页条数无关。
+推送和同步都不能漏掉订单：update_time 由数据库时钟生成（Order.update_time 的默认值），
+只读取早于 change_horizon() 的订单，即早于仍未提交的最早事务开始时间，
+提交再慢的事务也不会被游标越过。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import load_only
+
+from app.extensions import db
+from app.models.order import Order
+from app.services.order_query import order_list_columns
+from app.services.shop_cache import get_cached_shop
+
+logger = logging.getLogger(__name__)
+
+# 一条推送：cursor 为 (update_time, id)，html 为订单列表的一行
+FeedEvent = namedtuple('FeedEvent', 'cursor order_id shop_id html')
+
+
+def encode_cursor(cursor):
+    """游标编码为字符串（SSE 的 id、变更接口的 cursor 参数）。"""
+    update_time, order_id = cursor
+    return f"{update_time.isoformat(timespec='microseconds')}_{order_id}"
+
+
+def decode_cursor(value):
+    """解析 encode_cursor 生成的字符串，格式错误时抛出 ValueError。"""
+    timestamp, _, order_id = (value or '').rpartition('_')
+    return datetime.fromisoformat(timestamp), int(order_id)
+
+
+def database_utcnow():
+    """数据库时钟的当前 UTC 时间（与 Order.update_time 使用同一时钟）。"""
+    if db.engine.dialect.name == 'mysql':
+        return db.session.execute(text('SELECT UTC_TIMESTAMP()')).scalar()
+    return datetime.utcnow()
+
+
+def latest_cursor(settle=0, until=None):
+    """当前最后一个（settle 秒前，或不晚于 until）订单变更的游标，没有订单时为 (datetime.min, 0)。"""
+    query = db.session.query(Order.update_time, Order.id)
+    if until is None and settle:
+        until = database_utcnow() - timedelta(seconds=settle)
+    if until is not None:
+        query = query.filter(Order.update_time <= until)
+    row = query.order_by(Order.update_time.desc(), Order.id.desc()).first()
+    return (row.update_time, row.id) if row and row.update_time else (datetime.min, 0)
+
+
+def _oldest_open_transaction():
+    """其他连接上仍未提交的最早事务的开始时间（UTC，数据库时钟），没有时为 None。
+
+    MySQL 读取 information_schema.INNODB_TRX（数据库账号需要 PROCESS 权限）；
+    SQLite 同一时间只有一个写事务且只用于开发测试，返回 None。
+    """
+    if db.engine.dialect.name != 'mysql':
+        return None
+    # trx_started 为服务器时区的时间，按 NOW() 与 UTC_TIMESTAMP() 的差换算为 UTC
+    oldest, offset = db.session.execute(text(
+        'SELECT (SELECT MIN(trx_started) FROM information_schema.INNODB_TRX '
+        '        WHERE trx_mysql_thread_id <> CONNECTION_ID()), '
+        '       TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), NOW())')).one()
+    return None if oldest is None else oldest - timedelta(seconds=offset)
+
+
+def change_horizon(settle=0):
+    """可以安全读取的最大 update_time：此前更新的订单都已提交或永远不会出现。
+
+    未提交事务写入的 update_time 不早于事务开始时间（同一数据库时钟），因此取
+    「当前时间」与「仍未提交的最早事务开始时间」中较早者，再减去 settle 秒作为余量
+    （至少 1 秒：MySQL 的 DATETIME 只精确到秒，事务开始的同一秒内写入的订单不能读取）。
+    """
+    horizon = database_utcnow()
+    oldest = _oldest_open_transaction()
+    if oldest is not None:
+        horizon = min(horizon, oldest)
+    return horizon - timedelta(seconds=max(settle, 1))
+
+
+def changes_query(cursor, shop_ids=None, settle=0, query=None, until=None):
+    """游标之后变化的订单（新增或修改）的查询，按 (update_time, id) 升序，走 idx_update_time_id。
+
+    Args:
+        cursor: (update_time, id)
+        shop_ids: 店铺ID列表，None 表示全部店铺
+        settle: 只返回 update_time 早于该秒数之前的订单
+        query: 基础查询，默认 Order.query
+        until: 只返回 update_time 不晚于该时间的订单（如 change_horizon() 的返回值），优先于 settle
+    """
+    update_time, order_id = cursor
+    # update_time >= 游标时间 保证 MySQL 按 idx_update_time_id 做一次范围扫描，OR 只用于同一时间内按 id 续读
+    query = (query or Order.query).filter(
+        Order.update_time >= update_time,
+        or_(Order.update_time > update_time, and_(Order.update_time == update_time, Order.id > order_id)),
+    )
+    if until is None and settle:
+        until = database_utcnow() - timedelta(seconds=settle)
+    if until is not None:
+        query = query.filter(Order.update_time <= until)
+    if shop_ids is not None:
+        query = query.filter(Order.shop_id.in_(shop_ids)) if shop_ids else query.filter(db.false())
+    return query.order_by(Order.update_time, Order.id)
+
+
+def order_changes(cursor, shop_ids=None, limit=100, settle=0, query=None, until=None):
+    """读取游标之后变化的订单，参数见 changes_query。
+
+    Returns:
+        (list[Order], cursor): 订单和最后一个订单的游标（没有订单时为传入的游标）
+    """
+    orders = changes_query(cursor, shop_ids, settle, query, until).limit(limit).all()
+    return orders, ((orders[-1].update_time, orders[-1].id) if orders else cursor)
+
+
+# 增量同步接口返回的字段，不含卡密、回调地址和备注
+CHANGE_COLUMNS = (
+    Order.id, Order.order_no, Order.jd_order_no, Order.shop_id, Order.shop_type, Order.order_type,
+    Order.order_status, Order.sku_id, Order.product_info, Order.amount, Order.quantity, Order.produce_account,
+    Order.notify_status, Order.pay_time, Order.deliver_time, Order.create_time, Order.update_time,
+)
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def change_record(order):
+    """增量同步接口中的一条订单，cursor 为读取到该订单为止的游标。"""
+    record = order.to_dict()
+    record.update(
+        notify_status=order.notify_status,
+        pay_time=_format_time(order.pay_time),
+        deliver_time=_format_time(order.deliver_time),
+        update_time=_format_time(order.update_time),
+        cursor=encode_cursor((order.update_time, order.id)),
+    )
+    return record
+
+
+def iter_change_records(cursor, limit, settle=0, chunk_size=500):
+    """逐条读取游标之后变化的订单（change_record），最多 limit 条，只读取 change_horizon(settle) 之前的订单。
+
+    用 yield_per 按 chunk_size 条一批从服务端游标读取（MySQL 为 SSCursor），
+    已处理的订单不在内存中保留。
+    """
+    query = changes_query(cursor, until=change_horizon(settle),
+                          query=Order.query.options(load_only(*CHANGE_COLUMNS, raiseload=True)))
+    for order in query.limit(limit).yield_per(chunk_size):
+        yield change_record(order)
+
+
+def render_events(orders):
+    """把订单渲染为推送事件（需要应用上下文）。"""
+    return [
+        FeedEvent((order.update_time, order.id), order.id, order.shop_id,
+                  render_template('order/_row.html', order=order, shop=get_cached_shop(order.shop_id)))
+        for order in orders
+    ]
+
+
+class Subscription:
+    def __init__(self, shop_ids, queue_size):
+        self.shop_ids = None if shop_ids is None else frozenset(shop_ids)
+        self.queue = queue.Queue(maxsize=queue_size)
+        # 处理太慢、队列已满时置位，连接随后关闭，由浏览器带 Last-Event-ID 重连补齐
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.shop_ids is None or event.shop_id in self.shop_ids
+
+
+class OrderFeedHub:
+    def __init__(self, app, interval=1.0, settle=1.0, batch=200, queue_size=500, max_clients=20):
+        self.app = app
+        self.interval = interval
+        self.settle = settle
+        self.batch = batch
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self.cursor = None
+
+    def subscribe(self, shop_ids):
+        """订阅；shop_ids 为 None 表示全部店铺。连接数已满时返回 None。"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            subscription = Subscription(shop_ids, self.queue_size)
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                # 从订阅时的最新位置开始推送，更早的变更由订阅者按 Last-Event-ID 自行补发
+                self.cursor = latest_cursor(until=change_horizon(self.settle))
+                self._start()
+        return subscription
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='order-feed', daemon=True)
+        self._thread.start()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def poll_once(self):
+        """轮询一次并分发（需要应用上下文），返回本次读取的订单数。"""
+        until = change_horizon(self.settle)
+        if self.cursor is None:
+            self.cursor = latest_cursor(until=until)
+        orders, self.cursor = order_changes(self.cursor, limit=self.batch, until=until,
+                                            query=order_list_columns(Order.query))
+        events = render_events(orders)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                if not subscription.wants(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    subscription.overflowed = True
+                    self.unsubscribe(subscription)
+                    break
+        return len(orders)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            started = time.monotonic()
+            with self.app.app_context():
+                try:
+                    # 一次读满 batch 说明还有积压，立即继续
+                    if self.poll_once() >= self.batch:
+                        continue
+                except Exception:
+                    logger.exception("订单推送轮询失败")
+                finally:
+                    db.session.remove()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def get_order_feed_hub():
+    hub = current_app.extensions.get('order_feed_hub')
+    if hub is None:
+        config = current_app.config
+        hub = current_app.extensions['order_feed_hub'] = OrderFeedHub(
+            current_app._get_current_object(),
+            interval=config['ORDER_FEED_INTERVAL'],
+            settle=config['ORDER_FEED_SETTLE'],
+            max_clients=config['ORDER_FEED_MAX_CLIENTS'],
+        )
+    return hub
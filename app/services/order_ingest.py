@@ -0,0 +1,158 @@
+"""京东订单入库。
+
+京东在我方应答慢时会重复推送同一订单，订单以 (shop_id, jd_order_no)
+唯一约束去重：重复推送返回首次创建的 order_no，不会重复入库，
+也不会重复发送订单通知。
+"""
+import logging
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.order import Order
+from app.services.notification_queue import enqueue_order_notification, enqueue_order_notifications_bulk
+from app.services.order_no import generate_order_no
+from app.services.order_search import add_search_tokens
+from app.services.order_stats import add_orders_to_rollup
+
+logger = logging.getLogger(__name__)
+
+
+def find_order_no(shop_id, jd_order_no):
+    """按 (shop_id, jd_order_no) 唯一索引查找已存在订单的 order_no。"""
+    return db.session.query(Order.order_no).filter_by(shop_id=shop_id, jd_order_no=jd_order_no).scalar()
+
+
+# 推送数据中的整数字段及缺省值
+INT_FIELDS = (('order_type', 1), ('order_status', 0), ('amount', 0), ('quantity', 1))
+
+
+def parse_int_fields(data):
+    """把推送数据中的整数字段转换为 int，某个字段不是整数时抛出 ValueError。"""
+    values = {}
+    for field, default in INT_FIELDS:
+        try:
+            values[field] = int(data.get(field, default))
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} 必须为整数') from None
+    return values
+
+
+def build_order_fields(shop, data, order_no):
+    """根据推送数据构造订单字段，整数字段格式错误时抛出 ValueError（见 parse_int_fields）。"""
+    return dict(
+        parse_int_fields(data),
+        order_no=order_no,
+        jd_order_no=data.get('jd_order_no', ''),
+        shop_id=shop.id,
+        shop_type=shop.shop_type,
+        sku_id=data.get('sku_id'),
+        product_info=data.get('product_info'),
+        produce_account=data.get('produce_account'),
+        notify_url=data.get('notify_url'),
+    )
+
+
+def ingest_order(shop, data):
+    """创建订单；同一店铺的京东订单号已存在时直接返回原订单号。
+
+    Args:
+        shop: 店铺对象（已通过签名验证）
+        data: 京东推送数据
+
+    Returns:
+        (str, bool): (订单号, 是否新建)
+    """
+    jd_order_no = data.get('jd_order_no')
+    existing = find_order_no(shop.id, jd_order_no)
+    if existing:
+        return existing, False
+
+    order = Order(**build_order_fields(shop, data, generate_order_no()))
+    db.session.add(order)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # 并发重复推送：另一请求已先插入同一订单
+        db.session.rollback()
+        existing = find_order_no(shop.id, jd_order_no)
+        if existing:
+            logger.info("重复推送订单: shop=%s jd_order_no=%s", shop.shop_code, jd_order_no)
+            return existing, False
+        raise
+
+    add_search_tokens([order])
+    enqueue_order_notification(order, shop)
+    db.session.commit()
+    return order.order_no, True
+
+
+def ingest_orders_bulk(items):
+    """批量创建订单，一次多行 INSERT 写入全部新订单并批量写入通知任务。
+
+    已存在的订单（包括同一批次内重复的京东订单号）返回原订单号。
+    批量插入遇到并发重复推送导致的唯一约束冲突时，回滚并逐条入库。
+
+    Args:
+        items: [(key, shop, data), ...]，shop 已通过签名验证
+
+    Returns:
+        dict: {key: (订单号, 是否新建)}
+    """
+    results = {}
+    if not items:
+        return results
+
+    shop_ids = {shop.id for _, shop, _ in items}
+    jd_order_nos = {data.get('jd_order_no') for _, _, data in items}
+    known = {
+        (row.shop_id, row.jd_order_no): row.order_no
+        for row in db.session.query(Order.shop_id, Order.jd_order_no, Order.order_no).filter(
+            Order.jd_order_no.in_(jd_order_nos), Order.shop_id.in_(shop_ids)
+        )
+    }
+
+    rows = []
+    new_keys = {}
+    shops = {}
+    for key, shop, data in items:
+        pair = (shop.id, data.get('jd_order_no'))
+        if pair in known:
+            results[key] = (known[pair], False)
+            continue
+        if pair in new_keys:
+            new_keys[pair].append(key)
+            continue
+        row = build_order_fields(shop, data, generate_order_no())
+        rows.append(row)
+        new_keys[pair] = [key]
+        shops[shop.id] = shop
+
+    if not rows:
+        return results
+
+    try:
+        db.session.execute(insert(Order), rows)
+        inserted = db.session.query(
+            Order.id, Order.shop_id, Order.order_no, Order.jd_order_no, Order.produce_account,
+            Order.create_time, Order.order_status, Order.order_type, Order.amount,
+        ).filter(Order.order_no.in_([row['order_no'] for row in rows])).all()
+        add_search_tokens(inserted)
+        add_orders_to_rollup(inserted)
+        enqueue_order_notifications_bulk([(row.id, shops[row.shop_id]) for row in inserted])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.info("批量入库遇到重复订单，改为逐条入库: %d 条", len(rows))
+        for key, shop, data in items:
+            if key not in results:
+                results[key] = ingest_order(shop, data)
+        return results
+
+    for row in rows:
+        keys = new_keys[(row['shop_id'], row['jd_order_no'])]
+        results[keys[0]] = (row['order_no'], True)
+        for key in keys[1:]:
+            results[key] = (row['order_no'], False)
+    return results
@@ -0,0 +1,80 @@
+"""订单号生成器。
+
+格式（共25位，与原格式长度一致）：
+    ORD + UTC时间 yyyyMMddHHmmss（14位） + 毫秒（3位） + worker编号（2位） + 序列号（3位）
+
+- 同一进程内严格递增：同一毫秒内序列号递增，序列号用尽时借用下一毫秒；
+  系统时钟回拨时沿用上一次的时间戳继续递增，不会重复
+- 不同进程/主机之间依靠 worker 编号（0-99）区分，保证不冲突
+- 订单号按时间递增，新订单总是追加在唯一索引的末尾
+
+worker 编号来自环境变量 ORDER_NO_WORKER_ID，gunicorn 下由 gunicorn_conf.py
+在 fork 时按 ORDER_NO_HOST_ID（0-9，每台主机不同）和 worker 槽位（0-9）分配。
+未设置时（开发环境、脚本）按进程号取模，仅适合单进程使用。
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'ORD'
+MAX_WORKER_ID = 99
+MAX_SEQUENCE = 999
+
+
+class OrderNoGenerator:
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id 必须在 0-{MAX_WORKER_ID} 之间: {worker_id}')
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self._stamp_seconds = None
+        self._stamp = ''
+
+    def next(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms += 1
+                self._sequence = 0
+            seconds, millis = divmod(self._last_ms, 1000)
+            if seconds != self._stamp_seconds:
+                self._stamp = datetime.fromtimestamp(seconds, tz=timezone.utc).strftime('%Y%m%d%H%M%S')
+                self._stamp_seconds = seconds
+            return f'{PREFIX}{self._stamp}{millis:03d}{self.worker_id:02d}{self._sequence:03d}'
+
+
+def resolve_worker_id():
+    value = os.environ.get('ORDER_NO_WORKER_ID')
+    if value is not None:
+        return int(value)
+    worker_id = os.getpid() % (MAX_WORKER_ID + 1)
+    logger.warning("未设置 ORDER_NO_WORKER_ID，按进程号使用 worker 编号 %d（多进程部署时可能冲突）", worker_id)
+    return worker_id
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def generate_order_no():
+    """生成订单号。fork 后的子进程会按自己的 worker 编号重新创建生成器。"""
+    global _generator, _generator_pid
+    pid = os.getpid()
+    if _generator_pid != pid:
+        with _generator_lock:
+            if _generator_pid != pid:
+                _generator = OrderNoGenerator(resolve_worker_id())
+                _generator_pid = pid
+    return _generator.next()
@@ -0,0 +1,277 @@
+"""订单列表查询。
+
+订单列表页的筛选条件在这里统一解析和拼装，路由和索引检查
+（migrations/check_indexes.py）使用同一套查询，保证检查的就是线上实际执行的 SQL。
+
+翻页使用 id 游标（before_id / after_id），每页只读取 per_page + 1 行，
+与翻到第几页无关；总数不再精确统计，按筛选条件缓存一个有上限的计数，
+页面显示为「约 N 条」。
+
+关键字搜索（订单号、京东订单号、充值账号）见 app/services/order_search.py。
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import combinations
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import load_only, with_expression
+
+from app.extensions import db
+from app.models.order import Order
+from app.services.order_search import MODE_EXACT, MODE_PREFIX, MODE_SUBSTRING, apply_keyword
+
+# 订单列表可用的筛选字段
+FILTER_FIELDS = ('shop_id', 'shop_type', 'order_type', 'order_status', 'keyword', 'start_date', 'end_date')
+
+
+def parse_order_filters(args):
+    """从请求参数解析订单列表筛选条件，无效或为空的条件不返回。"""
+    filters = {}
+    for name in ('shop_id', 'shop_type', 'order_type'):
+        value = args.get(name, type=int)
+        if value:
+            filters[name] = value
+    order_status = args.get('order_status', type=int)
+    if order_status is not None and order_status != -1:
+        filters['order_status'] = order_status
+    # 兼容旧链接的 jd_order_no 参数
+    keyword = (args.get('keyword') or args.get('jd_order_no') or '').strip()
+    if keyword:
+        filters['keyword'] = keyword
+    for name in ('start_date', 'end_date'):
+        value = args.get(name, '').strip()
+        try:
+            if value:
+                filters[name] = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            pass
+    return filters
+
+
+def build_order_list_query(filters, permitted_shop_ids=None):
+    """按筛选条件拼装订单列表查询（按 id 倒序）。
+
+    Args:
+        filters: parse_order_filters 的返回值；可带 keyword_mode 指定关键字搜索方式，
+            不指定时按关键字自动判断（见 order_search.apply_keyword）
+        permitted_shop_ids: 可查看的店铺ID列表，None 表示不限制（管理员）
+
+    Returns:
+        Query
+    """
+    query = Order.query
+    if permitted_shop_ids is not None:
+        query = query.filter(Order.shop_id.in_(permitted_shop_ids)) if permitted_shop_ids else query.filter(db.false())
+
+    if 'shop_id' in filters:
+        query = query.filter(Order.shop_id == filters['shop_id'])
+    if 'shop_type' in filters:
+        query = query.filter(Order.shop_type == filters['shop_type'])
+    if 'order_type' in filters:
+        query = query.filter(Order.order_type == filters['order_type'])
+    if 'order_status' in filters:
+        query = query.filter(Order.order_status == filters['order_status'])
+    if 'start_date' in filters:
+        query = query.filter(Order.create_time >= filters['start_date'])
+    if 'end_date' in filters:
+        query = query.filter(Order.create_time <= filters['end_date'].replace(hour=23, minute=59, second=59))
+    if 'keyword' in filters:
+        query = apply_keyword(query, filters['keyword'], filters.get('keyword_mode'))
+    return query.order_by(Order.id.desc())
+
+
+# 订单列表悬停提示显示的商品信息长度
+PRODUCT_SUMMARY_LENGTH = 100
+
+
+def order_list_columns(query):
+    """订单列表页只读取显示用到的字段。
+
+    卡密、备注等大字段不读取；商品信息只截取前 PRODUCT_SUMMARY_LENGTH 个字符，
+    放在 Order.product_summary 中。店铺名称由调用方从店铺缓存中取，不访问 order.shop。
+    update_time 用作实时推送的游标（见 order_feed）。
+    """
+    return query.options(
+        load_only(Order.id, Order.order_no, Order.jd_order_no, Order.shop_id, Order.shop_type,
+                  Order.order_status, Order.amount, Order.quantity, Order.create_time, Order.update_time,
+                  raiseload=True),
+        with_expression(Order.product_summary, func.substr(Order.product_info, 1, PRODUCT_SUMMARY_LENGTH)),
+    )
+
+
+class OrderPage(namedtuple('OrderPage', 'items has_prev has_next')):
+    """一页订单（按 id 倒序）及是否还有上一页/下一页。"""
+
+    @property
+    def first_id(self):
+        return self.items[0].id if self.items else None
+
+    @property
+    def last_id(self):
+        return self.items[-1].id if self.items else None
+
+
+def keyset_page(query, before_id=None, after_id=None, per_page=20):
+    """按 id 游标取一页。
+
+    Args:
+        query: build_order_list_query 的返回值
+        before_id: 取 id 小于它的一页（下一页）
+        after_id: 取 id 大于它的一页（上一页），优先于 before_id
+        per_page: 每页条数
+
+    Returns:
+        OrderPage
+    """
+    if after_id:
+        rows = query.filter(Order.id > after_id).order_by(None).order_by(Order.id.asc()).limit(per_page + 1).all()
+        return OrderPage(list(reversed(rows[:per_page])), len(rows) > per_page, True)
+    if before_id:
+        query = query.filter(Order.id < before_id)
+    rows = query.limit(per_page + 1).all()
+    return OrderPage(rows[:per_page], bool(before_id), len(rows) > per_page)
+
+
+class _CountCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if len(self._entries) > 1000:
+                self._entries.clear()
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+
+def approximate_order_count(filters, permitted_shop_ids=None):
+    """订单列表的近似总数。
+
+    - 管理员无筛选条件且为 MySQL 时，直接读取表统计信息中的行数
+    - 其余情况最多数到 ORDER_COUNT_LIMIT 条，结果按筛选条件缓存 ORDER_COUNT_CACHE_TTL 秒
+
+    Returns:
+        tuple: (count, capped)，capped 为 True 表示实际数量超过 count
+    """
+    config = current_app.config
+    cache = current_app.extensions.get('order_count_cache')
+    if cache is None:
+        cache = current_app.extensions['order_count_cache'] = _CountCache()
+    key = (tuple(sorted((name, str(value)) for name, value in filters.items())),
+           None if permitted_shop_ids is None else tuple(sorted(permitted_shop_ids)))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not filters and permitted_shop_ids is None and db.engine.dialect.name == 'mysql':
+        rows = db.session.execute(db.text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'orders'")).scalar()
+        result = (int(rows or 0), False)
+    else:
+        limit = config['ORDER_COUNT_LIMIT']
+        capped_ids = build_order_list_query(filters, permitted_shop_ids).order_by(None) \
+            .with_entities(Order.id).limit(limit + 1).subquery()
+        count = db.session.query(func.count()).select_from(capped_ids).scalar()
+        result = (min(count, limit), count > limit)
+    cache.set(key, result, config['ORDER_COUNT_CACHE_TTL'])
+    return result
+
+
+# 索引检查使用的筛选条件取值
+SAMPLE_FILTERS = {
+    'shop_id': 1,
+    'shop_type': 1,
+    'order_type': 1,
+    'order_status': 2,
+    'start_date': datetime(2024, 1, 1),
+    'end_date': datetime(2024, 1, 31),
+}
+
+CHECKED_FIELDS = ('shop_id', 'shop_type', 'order_type', 'order_status', 'start_date', 'end_date')
+
+# 关键字搜索单独检查三种方式，不与其他条件组合
+KEYWORD_SAMPLES = (
+    (MODE_EXACT, 'JD20240101000001'),
+    (MODE_PREFIX, 'JD2024*'),
+    (MODE_SUBSTRING, '0101000'),
+)
+
+# 区分度高、必须通过二级索引定位的条件。shop_type / order_type 只有两种取值；
+# create_time 与 id 同步递增，日期范围内的订单在主键上也是连续的。
+# 只有这些条件时，沿主键倒序扫描、取满一页即停止同样是可接受的执行计划
+SELECTIVE_FIELDS = ('shop_id', 'order_status')
+
+
+def _explain(query):
+    """执行 EXPLAIN，返回 (方言, 执行计划行)。"""
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'mysql':
+        return 'mysql', [dict(row._mapping) for row in db.session.execute(db.text(f'EXPLAIN {sql}'))]
+    return 'sqlite', [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def _format_plan(dialect, rows):
+    if dialect == 'mysql':
+        return '; '.join(f"table={r.get('table')} type={r.get('type')} key={r.get('key')} extra={r.get('Extra')}"
+                         for r in rows)
+    return '; '.join(rows)
+
+
+def explain_order_list(per_page=20):
+    """对订单列表的每种筛选组合（含非管理员的店铺范围）及关键字搜索执行 EXPLAIN。
+
+    含区分度高的条件（店铺、状态或店铺范围）时，要求通过二级索引定位；
+    其余组合不能出现全表扫描后再排序。关键字搜索的三种方式都不能全表扫描
+    orders 或 order_search_tokens。
+    MySQL 的执行计划与数据量有关，应在有代表性数据的库上运行。
+
+    Returns:
+        list[dict]: {filters, permitted, plan, uses_index}
+    """
+    results = []
+    for size in range(len(CHECKED_FIELDS) + 1):
+        for fields in combinations(CHECKED_FIELDS, size):
+            filters = {name: SAMPLE_FILTERS[name] for name in fields}
+            for permitted in (None, [1, 2, 3]):
+                selective = permitted is not None or any(name in SELECTIVE_FIELDS for name in fields)
+                dialect, rows = _explain(build_order_list_query(filters, permitted).limit(per_page))
+                if dialect == 'mysql':
+                    if selective:
+                        uses_index = all(r.get('type') in ('ref', 'range', 'eq_ref', 'const', 'index_merge')
+                                         for r in rows)
+                    else:
+                        uses_index = all(r.get('type') != 'ALL' for r in rows)
+                else:
+                    if selective:
+                        uses_index = all(not d.startswith('SCAN') for d in rows) \
+                            and any('USING' in d and 'TEMP' not in d for d in rows)
+                    else:
+                        full_scan = any(d.startswith('SCAN') and 'USING' not in d for d in rows)
+                        uses_index = not (full_scan and any('TEMP B-TREE' in d for d in rows))
+                results.append({'filters': list(fields), 'permitted': permitted is not None,
+                                'plan': _format_plan(dialect, rows), 'uses_index': uses_index})
+
+    for mode, keyword in KEYWORD_SAMPLES:
+        for permitted in (None, [1, 2, 3]):
+            filters = {'keyword': keyword, 'keyword_mode': mode}
+            dialect, rows = _explain(build_order_list_query(filters, permitted).limit(per_page))
+            if dialect == 'mysql':
+                uses_index = not any(r.get('table') in ('orders', 'order_search_tokens') and r.get('type') == 'ALL'
+                                     for r in rows)
+            else:
+                uses_index = not any(d.startswith(('SCAN orders', 'SCAN order_search_tokens')) and 'USING' not in d
+                                     for d in rows)
+            results.append({'filters': [f'keyword:{mode}'], 'permitted': permitted is not None,
+                            'plan': _format_plan(dialect, rows), 'uses_index': uses_index})
+    return results
@@ -0,0 +1,128 @@
+"""订单号 / 京东订单号 / 充值账号搜索。
+
+`LIKE '%关键字%'` 无法使用索引，每次搜索都要扫描整张订单表。搜索按关键字分三种方式：
+
+- 精确：关键字与某个字段完全相同（最常见的「粘贴京东订单号」），
+  三个字段各有索引，先用一次带 LIMIT 1 的查询探测是否命中
+- 前缀：关键字以 * 结尾（如 JD2024*），走三个字段索引的范围扫描
+- 子串：精确未命中时，用 order_search_tokens 三元组倒排表找出包含关键字
+  全部三元组的订单，再用 LIKE 复核；关键字不足 3 个字符时按前缀搜索
+
+三元组在订单入库时与订单同一事务写入；历史订单由 migrations/versions/0007 回填，
+也可以调用 rebuild_search_tokens() 重建。
+"""
+from sqlalchemy import and_, delete, func, insert, or_, true
+
+from app.extensions import db
+from app.models.order import Order
+from app.models.order_search_token import OrderSearchToken
+
+NGRAM = 3
+SEARCH_FIELDS = ('jd_order_no', 'order_no', 'produce_account')
+
+MODE_EXACT = 'exact'
+MODE_PREFIX = 'prefix'
+MODE_SUBSTRING = 'substring'
+
+
+def ngrams(value):
+    """字符串的小写三元组集合。"""
+    value = (value or '').lower()
+    return {value[i:i + NGRAM] for i in range(len(value) - NGRAM + 1)}
+
+
+def add_search_tokens(orders):
+    """为新订单写入三元组（只加入当前事务，由调用方提交）。
+
+    Args:
+        orders: 订单对象或带 id / jd_order_no / order_no / produce_account 属性的行
+
+    Returns:
+        int: 写入的行数
+    """
+    rows = [
+        {'token': token, 'order_id': order.id}
+        for order in orders
+        for token in set().union(*(ngrams(getattr(order, field)) for field in SEARCH_FIELDS))
+    ]
+    if rows:
+        db.session.execute(insert(OrderSearchToken), rows)
+    return len(rows)
+
+
+def rebuild_search_tokens(chunk_size=1000, log=None):
+    """按 id 分批重建全部订单的三元组，每批单独提交。
+
+    Returns:
+        int: 处理的订单数
+    """
+    last_id = 0
+    total = 0
+    while True:
+        orders = db.session.query(Order.id, Order.jd_order_no, Order.order_no, Order.produce_account) \
+            .filter(Order.id > last_id).order_by(Order.id).limit(chunk_size).all()
+        if not orders:
+            break
+        ids = [order.id for order in orders]
+        db.session.execute(delete(OrderSearchToken).where(OrderSearchToken.order_id.in_(ids)))
+        add_search_tokens(orders)
+        db.session.commit()
+        total += len(orders)
+        last_id = ids[-1]
+        if log:
+            log(f"  已处理 {total} 个订单")
+    return total
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def keyword_criterion(keyword, mode):
+    """精确、前缀搜索的筛选条件（三个字段的索引各自定位后合并）。
+
+    前缀写成范围条件 [前缀, 前缀末字符 + 1)，SQLite 的 LIKE 默认不区分大小写，用不上普通索引。
+    """
+    columns = [getattr(Order, field) for field in SEARCH_FIELDS]
+    if mode == MODE_EXACT:
+        return or_(*(column == keyword for column in columns))
+    prefix = keyword.rstrip('*')
+    if not prefix:
+        return true()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return or_(*(and_(column >= prefix, column < upper) for column in columns))
+
+
+def detect_mode(query, keyword):
+    """判断关键字的搜索方式：以 * 结尾为前缀；在 query 范围内精确命中为精确，否则为子串。"""
+    if keyword.endswith('*'):
+        return MODE_PREFIX
+    if query.filter(keyword_criterion(keyword, MODE_EXACT)).order_by(None).with_entities(Order.id).first():
+        return MODE_EXACT
+    return MODE_SUBSTRING
+
+
+def apply_keyword(query, keyword, mode=None):
+    """给订单查询加上关键字条件。
+
+    Args:
+        query: 订单查询（已带店铺范围等其他条件）
+        keyword: 搜索关键字
+        mode: 搜索方式，None 时按 detect_mode 自动判断
+
+    Returns:
+        Query
+    """
+    mode = mode or detect_mode(query, keyword)
+    if mode != MODE_SUBSTRING or len(keyword) < NGRAM:
+        return query.filter(keyword_criterion(keyword, mode if mode != MODE_SUBSTRING else MODE_PREFIX))
+
+    # 先在三元组表中求出包含全部三元组的订单，再按主键回表并用 LIKE 排除三元组不相邻的误命中
+    tokens = ngrams(keyword)
+    candidates = db.session.query(OrderSearchToken.order_id).filter(
+        OrderSearchToken.token.in_(tokens),
+    ).group_by(OrderSearchToken.order_id).having(func.count() == len(tokens)).subquery()
+    pattern = _like_escape(keyword)
+    columns = [getattr(Order, field) for field in SEARCH_FIELDS]
+    return query.join(candidates, candidates.c.order_id == Order.id) \
+        .filter(or_(*(column.like(f'%{pattern}%', escape='\\') for column in columns)))
@@ -0,0 +1,267 @@
+"""订单统计汇总表（order_stats_rollup）。
+
+统计页不再扫描 orders，而是读取按 (店铺, 小时, 状态, 类型) 汇总的订单数和金额：
+
+- ORM 方式新增订单、修改订单状态时，before_flush 中计算增量，
+  after_flush 中在同一事务内累加到汇总表（INSERT ... ON DUPLICATE KEY UPDATE）
+- 批量入库（ingest_orders_bulk）用 Core INSERT，不经过 ORM 事件，入库后调用 add_orders_to_rollup
+- 已有数据或绕过以上路径写入的数据（如 generate_test_data.py）用
+  python migrations/rebuild_stats_rollup.py 重建
+
+统计页（order_statistics）和统计接口（order_time_series）都只读取汇总表。
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, inspect, insert
+from sqlalchemy.dialects import mysql, sqlite
+
+from app.extensions import db
+from app.models.order import Order
+from app.models.order_stats_rollup import OrderStatsRollup
+
+_DELTAS_KEY = 'order_stats_deltas'
+
+
+def stat_hour(value):
+    """时间所在的整点。"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _add_delta(deltas, shop_id, create_time, order_status, order_type, sign, amount):
+    entry = deltas[(shop_id, stat_hour(create_time), order_status or 0, order_type)]
+    entry[0] += sign
+    entry[1] += sign * (amount or 0)
+
+
+def _previous_status(session, order):
+    history = inspect(order).attrs.order_status.history
+    if not history.has_changes():
+        return None, False
+    if history.deleted:
+        return history.deleted[0], True
+    # 修改前未加载该字段（如 load_only 查询），从数据库读取修改前的值
+    with session.no_autoflush:
+        return session.query(Order.order_status).filter(Order.id == order.id).scalar(), True
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0])
+    for obj in session.new:
+        if isinstance(obj, Order):
+            if obj.create_time is None:
+                obj.create_time = datetime.utcnow()
+            _add_delta(deltas, obj.shop_id, obj.create_time, obj.order_status, obj.order_type, 1, obj.amount)
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            previous, changed = _previous_status(session, obj)
+            if changed and previous != obj.order_status:
+                _add_delta(deltas, obj.shop_id, obj.create_time, previous, obj.order_type, -1, obj.amount)
+                _add_delta(deltas, obj.shop_id, obj.create_time, obj.order_status, obj.order_type, 1, obj.amount)
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            _add_delta(deltas, obj.shop_id, obj.create_time, obj.order_status, obj.order_type, -1, obj.amount)
+    session.info[_DELTAS_KEY] = deltas
+
+
+def _after_flush(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def _apply_deltas(connection, deltas):
+    # 按主键顺序写入，并发事务以相同顺序加锁
+    rows = [
+        dict(shop_id=key[0], stat_hour=key[1], order_status=key[2], order_type=key[3],
+             order_count=value[0], amount=value[1])
+        for key, value in sorted(deltas.items()) if value[0] or value[1]
+    ]
+    if not rows:
+        return
+    table = OrderStatsRollup.__table__
+    if connection.dialect.name == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(order_count=table.c.order_count + stmt.inserted.order_count,
+                                            amount=table.c.amount + stmt.inserted.amount)
+    else:
+        stmt = sqlite.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.shop_id, table.c.stat_hour, table.c.order_status, table.c.order_type],
+            set_={'order_count': table.c.order_count + stmt.excluded.order_count,
+                  'amount': table.c.amount + stmt.excluded.amount},
+        )
+    connection.execute(stmt)
+
+
+def register_rollup_listener(session=None):
+    """在会话上注册汇总表维护的事件（create_app 中调用，重复调用无副作用）。"""
+    session = session or db.session
+    if not event.contains(session, 'before_flush', _before_flush):
+        event.listen(session, 'before_flush', _before_flush)
+        event.listen(session, 'after_flush', _after_flush)
+
+
+def add_orders_to_rollup(orders):
+    """把 Core INSERT 写入的订单累加到汇总表（加入当前事务，由调用方提交）。
+
+    Args:
+        orders: 带 shop_id / create_time / order_status / order_type / amount 属性的行
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for order in orders:
+        _add_delta(deltas, order.shop_id, order.create_time, order.order_status, order.order_type, 1, order.amount)
+    _apply_deltas(db.session.connection(), deltas)
+
+
+def remove_shop_from_rollup(shop_id):
+    """删除店铺时同时删除其汇总行（加入当前事务；店铺的订单由外键级联删除）。"""
+    db.session.execute(delete(OrderStatsRollup).where(OrderStatsRollup.shop_id == shop_id))
+
+
+def _hour_expression():
+    if db.engine.dialect.name == 'mysql':
+        return func.date_format(Order.create_time, '%Y-%m-%d %H:00:00')
+    return func.strftime('%Y-%m-%d %H:00:00', Order.create_time)
+
+
+def rebuild_order_stats_rollup(log=None):
+    """按 orders 全量重建汇总表，在一个事务内删除并写入。
+
+    Returns:
+        int: 写入的汇总行数
+    """
+    hour = _hour_expression()
+    grouped = db.session.query(
+        Order.shop_id, hour, Order.order_status, Order.order_type,
+        func.count(Order.id), func.coalesce(func.sum(Order.amount), 0),
+    ).group_by(Order.shop_id, hour, Order.order_status, Order.order_type).all()
+    rows = [
+        dict(shop_id=shop_id, stat_hour=datetime.strptime(str(hour_value)[:19], '%Y-%m-%d %H:%M:%S'),
+             order_status=order_status or 0, order_type=order_type, order_count=count, amount=int(amount))
+        for shop_id, hour_value, order_status, order_type, count, amount in grouped
+    ]
+    db.session.execute(delete(OrderStatsRollup))
+    for start in range(0, len(rows), 1000):
+        db.session.execute(insert(OrderStatsRollup), rows[start:start + 1000])
+    db.session.commit()
+    if log:
+        log(f"✅ 已重建订单统计汇总 {len(rows)} 行")
+    return len(rows)
+
+
+def order_statistics(shop_ids, days=7, now=None):
+    """统计页数据，只读取汇总表。
+
+    Args:
+        shop_ids: 参与统计的店铺ID（已删除店铺的汇总行不计入）
+        days: 按天趋势的天数（含今天，UTC）
+        now: 当前时间，默认 datetime.utcnow()
+
+    Returns:
+        dict: {total_orders, total_amount, completed_orders, pending_orders,
+               shop_totals: {shop_id: (count, amount)}, daily: [(date, count, amount)]}
+    """
+    rollup = OrderStatsRollup
+    scope = rollup.shop_id.in_(shop_ids) if shop_ids else db.false()
+
+    by_shop_status = db.session.query(
+        rollup.shop_id, rollup.order_status, func.sum(rollup.order_count), func.sum(rollup.amount),
+    ).filter(scope).group_by(rollup.shop_id, rollup.order_status).all()
+
+    shop_totals = defaultdict(lambda: (0, 0))
+    status_counts = defaultdict(int)
+    for shop_id, order_status, count, amount in by_shop_status:
+        total_count, total_amount = shop_totals[shop_id]
+        shop_totals[shop_id] = (total_count + int(count or 0), total_amount + int(amount or 0))
+        status_counts[order_status] += int(count or 0)
+
+    today = (now or datetime.utcnow()).date()
+    first_day = today - timedelta(days=days - 1)
+    by_hour = db.session.query(
+        rollup.stat_hour, func.sum(rollup.order_count), func.sum(rollup.amount),
+    ).filter(scope, rollup.stat_hour >= datetime.combine(first_day, datetime.min.time())) \
+        .group_by(rollup.stat_hour).all()
+    daily = {first_day + timedelta(days=i): [0, 0] for i in range(days)}
+    for hour_value, count, amount in by_hour:
+        if hour_value.date() in daily:
+            daily[hour_value.date()][0] += int(count or 0)
+            daily[hour_value.date()][1] += int(amount or 0)
+
+    return {
+        'total_orders': sum(count for count, _ in shop_totals.values()),
+        'total_amount': sum(amount for _, amount in shop_totals.values()),
+        'completed_orders': status_counts[2],
+        'pending_orders': status_counts[0] + status_counts[1],
+        'shop_totals': dict(shop_totals),
+        'daily': [(day, count, amount) for day, (count, amount) in daily.items()],
+    }
+
+
+GRANULARITIES = ('hour', 'day', 'month')
+
+
+def order_time_series(shop_ids, start_date, end_date, granularity='day', tz=None):
+    """按时间粒度统计订单数和金额，空的时间段补 0。
+
+    汇总表按 UTC 整点保存，只做一次按小时的 GROUP BY，再在内存中
+    按本地时区归入各时间段（只支持与 UTC 相差整小时的时区）。
+
+    Args:
+        shop_ids: 店铺ID列表，None 表示全部店铺（不按店铺过滤，只按时间范围扫描）
+        start_date: 开始日期（本地时区，含）
+        end_date: 结束日期（本地时区，含）
+        granularity: hour / day / month
+        tz: ZoneInfo，默认 UTC
+
+    Returns:
+        dict: {buckets: [时间段], count: [...], amount: [...]}，三个列表一一对应，金额单位为分
+
+    Raises:
+        ValueError: 参数无效
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'不支持的粒度: {granularity}')
+    if end_date < start_date:
+        raise ValueError('结束日期不能早于开始日期')
+    tz = tz or timezone.utc
+    local_start = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=tz)
+    local_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()).replace(tzinfo=tz)
+    for moment in (local_start, local_end):
+        if moment.utcoffset().total_seconds() % 3600:
+            raise ValueError('该时区与 UTC 的时差不是整小时，无法按小时汇总统计')
+    utc_start = local_start.astimezone(timezone.utc).replace(tzinfo=None)
+    utc_end = local_end.astimezone(timezone.utc).replace(tzinfo=None)
+
+    if granularity == 'hour':
+        hours = int((utc_end - utc_start).total_seconds() // 3600)
+        buckets = [(utc_start + timedelta(hours=i)).replace(tzinfo=timezone.utc).astimezone(tz)
+                   .strftime('%Y-%m-%d %H:00') for i in range(hours)]
+    elif granularity == 'day':
+        buckets = [(start_date + timedelta(days=i)).isoformat() for i in range((end_date - start_date).days + 1)]
+    else:
+        first_month = start_date.year * 12 + start_date.month - 1
+        months = end_date.year * 12 + end_date.month - first_month
+        buckets = [f'{(first_month + i) // 12:04d}-{(first_month + i) % 12 + 1:02d}' for i in range(months)]
+
+    counts = [0] * len(buckets)
+    amounts = [0] * len(buckets)
+    if shop_ids is None or shop_ids:
+        rollup = OrderStatsRollup
+        query = db.session.query(rollup.stat_hour, func.sum(rollup.order_count), func.sum(rollup.amount)).filter(
+            rollup.stat_hour >= utc_start, rollup.stat_hour < utc_end)
+        if shop_ids is not None:
+            query = query.filter(rollup.shop_id.in_(shop_ids))
+        rows = query.group_by(rollup.stat_hour).all()
+        for hour_value, count, amount in rows:
+            if granularity == 'hour':
+                index = int((hour_value - utc_start).total_seconds() // 3600)
+            else:
+                local = hour_value.replace(tzinfo=timezone.utc).astimezone(tz)
+                if granularity == 'day':
+                    index = (local.date() - start_date).days
+                else:
+                    index = local.year * 12 + local.month - 1 - first_month
+            counts[index] += int(count or 0)
+            amounts[index] += int(amount or 0)
+    return {'buckets': buckets, 'count': counts, 'amount': amounts}
@@ -0,0 +1,77 @@
+"""本机进程间共享的小型状态库。
+
+熔断器等需要在同一台主机的 gunicorn worker 和后台进程之间共享、
+且每次对外调用都要读写的状态，放在本地 SQLite 文件中（WAL 模式），
+不占用 MySQL 连接，读写在亚毫秒级完成。
+
+- 文件路径通过 SHARED_STATE_PATH 配置；测试环境使用 ':memory:'（仅进程内）
+- 每个进程持有一个连接，fork 后在子进程中重新打开
+- 多机部署时各主机的状态互相独立
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+
+
+class SharedStateStore:
+    def __init__(self, path):
+        self.path = path
+        self._pid = None
+        self._conn = None
+        self._lock = threading.RLock()
+        self._schemas = []
+
+    def register_schema(self, ddl):
+        """登记建表语句；首次连接（包括 fork 后重新连接）时执行。"""
+        with self._lock:
+            self._schemas.append(ddl)
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.executescript(ddl)
+
+    @contextmanager
+    def transaction(self):
+        """写事务（BEGIN IMMEDIATE），同一时间只有一个进程持有写锁。"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            if self.path != ':memory:':
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+            for ddl in self._schemas:
+                conn.executescript(ddl)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+
+_store_lock = threading.Lock()
+
+
+def get_shared_state():
+    """当前应用的共享状态库（按应用实例缓存）。"""
+    store = current_app.extensions.get('shared_state')
+    if store is None:
+        with _store_lock:
+            store = current_app.extensions.get('shared_state')
+            if store is None:
+                store = SharedStateStore(current_app.config['SHARED_STATE_PATH'])
+                current_app.extensions['shared_state'] = store
+    return store
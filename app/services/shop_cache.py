@@ -0,0 +1,128 @@
+"""进程内店铺目录缓存。
+
+订单接收接口每次都要按 shop_code 解析店铺，订单列表、通知日志每次
+都要加载全部店铺作为筛选下拉框。店铺数量少、修改频率低，因此每个
+worker 在内存中保存一份全部店铺的只读快照，按 shop_code 和 id 索引。
+
+失效机制：
+- 本进程修改店铺后调用 invalidate_shops()，立即清空本地快照并递增
+  cache_versions 中的 'shop' 版本号
+- 其他 worker 每 SHOP_CACHE_VERSION_CHECK 秒比较一次版本号，
+  发现变化后重新加载，因此修改最迟在该间隔内对所有 worker 生效
+- 快照超过 SHOP_CACHE_TTL 秒无条件重新加载
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import inspect
+
+from app.models.shop import Shop
+from app.services.cache_version import bump_cache_version, get_cache_version
+
+CACHE_NAME = 'shop'
+
+_SHOP_FIELDS = [attr.key for attr in inspect(Shop).column_attrs]
+
+
+class CachedShop:
+    """Shop 的只读快照，不绑定数据库会话，可以跨请求复用。"""
+
+    def __init__(self, shop):
+        for key in _SHOP_FIELDS:
+            setattr(self, key, getattr(shop, key))
+
+    @property
+    def shop_type_label(self):
+        return '游戏点卡' if self.shop_type == 1 else '通用交易'
+
+    @property
+    def is_expired(self):
+        return self.expire_time is not None and self.expire_time < datetime.utcnow()
+
+
+class ShopDirectory:
+    def __init__(self, ttl=300, version_check_interval=5):
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._by_code = {}
+        self._by_id = {}
+        self._sorted = []
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def get_by_code(self, shop_code):
+        self._ensure_fresh()
+        return self._by_code.get(shop_code)
+
+    def get(self, shop_id):
+        self._ensure_fresh()
+        return self._by_id.get(shop_id)
+
+    def all(self):
+        """全部店铺，按店铺名称排序。"""
+        self._ensure_fresh()
+        return self._sorted
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._loaded_at < self.ttl:
+            if now - self._checked_at < self.version_check_interval:
+                return
+            self._checked_at = now
+            if get_cache_version(CACHE_NAME) == self._version:
+                return
+
+        with self._lock:
+            self._reload()
+
+    def _reload(self):
+        version = get_cache_version(CACHE_NAME)
+        shops = [CachedShop(s) for s in Shop.query.order_by(Shop.shop_name).all()]
+        self._by_code = {s.shop_code: s for s in shops}
+        self._by_id = {s.id: s for s in shops}
+        self._sorted = shops
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+
+
+def get_shop_directory():
+    directory = current_app.extensions.get('shop_directory')
+    if directory is None:
+        directory = ShopDirectory(
+            ttl=current_app.config.get('SHOP_CACHE_TTL', 300),
+            version_check_interval=current_app.config.get('SHOP_CACHE_VERSION_CHECK', 5),
+        )
+        current_app.extensions['shop_directory'] = directory
+    return directory
+
+
+def get_shop_by_code(shop_code):
+    """按 shop_code 查找店铺（含已禁用的店铺），不存在时返回 None。"""
+    return get_shop_directory().get_by_code(shop_code)
+
+
+def get_cached_shop(shop_id):
+    return get_shop_directory().get(shop_id)
+
+
+def list_shops(shop_ids=None):
+    """全部店铺（按名称排序）；传入 shop_ids 时只返回其中的店铺。"""
+    shops = get_shop_directory().all()
+    if shop_ids is None:
+        return shops
+    allowed = set(shop_ids)
+    return [s for s in shops if s.id in allowed]
+
+
+def invalidate_shops():
+    """店铺增删改后调用：清空本进程快照并通知其他 worker。"""
+    bump_cache_version(CACHE_NAME)
+    get_shop_directory().clear()
@@ -0,0 +1,201 @@
+"""统计页结果缓存。
+
+统计页的结果按 (查询参数, 可查看的店铺范围) 缓存在共享状态库中，
+同一台主机的 gunicorn worker 和后台进程共用：
+
+- 缓存不超过 STATS_CACHE_TTL 秒时直接返回
+- 超过后仍先返回旧数据，同时在后台线程中重新计算（stale-while-revalidate）；
+  没有缓存时在当前请求中计算
+- 同一个键同一时间只有一个进程在计算：计算前在 stats_cache.refreshing_until
+  上取得租约（STATS_REFRESH_LEASE 秒），取不到租约的请求返回旧数据或等待结果
+- 后台进程（worker.py）每 STATS_REFRESH_INTERVAL 秒重新计算最近
+  STATS_CACHE_MAX_IDLE 秒内被访问过的键，更久没有访问的键删除
+"""
+import json
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from app.services.order_stats import order_statistics
+from app.services.shared_state import get_shared_state
+from app.services.shop_cache import list_shops
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats_cache (
+    cache_key TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    payload TEXT,
+    computed_at REAL,
+    refreshing_until REAL NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL
+);
+"""
+
+
+def stats_params(days=7, shop_ids=None):
+    """统计参数；shop_ids 为 None 表示全部店铺。"""
+    return {'days': days, 'shop_ids': None if shop_ids is None else sorted(set(shop_ids))}
+
+
+def cache_key(params):
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+
+def compute_dashboard(params):
+    """计算统计页数据（读取汇总表），返回可 JSON 序列化的 dict。"""
+    shops = list_shops() if params['shop_ids'] is None else list_shops(params['shop_ids'])
+    stats = order_statistics([s.id for s in shops], days=params['days'])
+    return {
+        'total_orders': stats['total_orders'],
+        'total_amount': stats['total_amount'],
+        'completed_orders': stats['completed_orders'],
+        'pending_orders': stats['pending_orders'],
+        'shops': [[s.id, s.shop_name, *stats['shop_totals'].get(s.id, (0, 0))] for s in shops],
+        'daily': [[day.isoformat(), count, amount] for day, count, amount in stats['daily']],
+    }
+
+
+class StatsCache:
+    def __init__(self, store, ttl=60, lease=30, max_idle=3600):
+        """
+        Args:
+            store: SharedStateStore
+            ttl: 缓存视为最新的秒数
+            lease: 计算租约秒数，超过后其他进程可以重新计算
+            max_idle: 多久未访问的键不再由后台刷新
+        """
+        self.store = store
+        self.ttl = ttl
+        self.lease = lease
+        self.max_idle = max_idle
+        store.register_schema(SCHEMA)
+
+    def get(self, params, compute, refresh_in_background=None):
+        """读取缓存。
+
+        Args:
+            params: stats_params 的返回值
+            compute: compute(params) -> payload，在应用上下文中调用
+            refresh_in_background: refresh_in_background(params)，缓存过期时用于启动后台重算，
+                为 None 时在当前线程中重算
+
+        Returns:
+            (dict, float): (payload, 数据产生至今的秒数)
+        """
+        key = cache_key(params)
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute('INSERT INTO stats_cache (cache_key, params, accessed_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(cache_key) DO UPDATE SET accessed_at = excluded.accessed_at',
+                         (key, json.dumps(params), now))
+        row = self._row(key)
+        if row['payload'] is not None:
+            age = now - row['computed_at']
+            if age >= self.ttl and self.claim(key):
+                if refresh_in_background:
+                    refresh_in_background(params)
+                else:
+                    self.refresh(params, compute, claimed=True)
+            return json.loads(row['payload']), max(age, 0.0)
+
+        if self.claim(key):
+            return self.refresh(params, compute, claimed=True), 0.0
+        # 其他进程正在计算同一个键：等待其结果，超过租约时间仍没有结果则自行计算
+        deadline = now + self.lease
+        while time.time() < deadline:
+            time.sleep(0.1)
+            row = self._row(key)
+            if row['payload'] is not None:
+                return json.loads(row['payload']), max(time.time() - row['computed_at'], 0.0)
+        return self.refresh(params, compute), 0.0
+
+    def claim(self, key):
+        """取得计算租约；其他进程持有未过期的租约时返回 False。"""
+        now = time.time()
+        with self.store.transaction() as conn:
+            claimed = conn.execute('UPDATE stats_cache SET refreshing_until = ? '
+                                   'WHERE cache_key = ? AND refreshing_until < ?',
+                                   (now + self.lease, key, now)).rowcount
+        return claimed == 1
+
+    def refresh(self, params, compute, claimed=False):
+        """重新计算并写入缓存；claimed 为 False 时先取租约，取不到则不计算并返回 None。"""
+        key = cache_key(params)
+        if not claimed and not self.claim(key):
+            return None
+        try:
+            payload = compute(params)
+        except Exception:
+            with self.store.transaction() as conn:
+                conn.execute('UPDATE stats_cache SET refreshing_until = 0 WHERE cache_key = ?', (key,))
+            raise
+        with self.store.transaction() as conn:
+            conn.execute('UPDATE stats_cache SET payload = ?, computed_at = ?, refreshing_until = 0 '
+                         'WHERE cache_key = ?', (json.dumps(payload), time.time(), key))
+        return payload
+
+    def refresh_active(self, compute):
+        """重新计算最近被访问过的键，删除长期未访问的键（后台进程定时调用）。
+
+        Returns:
+            int: 重新计算的键数
+        """
+        cutoff = time.time() - self.max_idle
+        with self.store.transaction() as conn:
+            conn.execute('DELETE FROM stats_cache WHERE accessed_at < ?', (cutoff,))
+        refreshed = 0
+        for row in self.store.query('SELECT params FROM stats_cache'):
+            try:
+                if self.refresh(json.loads(row['params']), compute) is not None:
+                    refreshed += 1
+            except Exception:
+                logger.exception("统计缓存刷新失败: %s", row['params'])
+        return refreshed
+
+    def _row(self, key):
+        return self.store.query('SELECT payload, computed_at FROM stats_cache WHERE cache_key = ?', (key,))[0]
+
+
+def get_stats_cache():
+    cache = current_app.extensions.get('stats_cache')
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions['stats_cache'] = StatsCache(
+            get_shared_state(),
+            ttl=config['STATS_CACHE_TTL'],
+            lease=config['STATS_REFRESH_LEASE'],
+            max_idle=config['STATS_CACHE_MAX_IDLE'],
+        )
+    return cache
+
+
+def _refresh_in_thread(params):
+    app = current_app._get_current_object()
+
+    def work():
+        with app.app_context():
+            try:
+                get_stats_cache().refresh(params, compute_dashboard, claimed=True)
+            except Exception:
+                logger.exception("统计缓存后台刷新失败: %s", params)
+
+    threading.Thread(target=work, daemon=True).start()
+
+
+def get_dashboard(days=7, shop_ids=None):
+    """统计页数据（带缓存）。
+
+    Returns:
+        (dict, float): (compute_dashboard 的结果, 数据产生至今的秒数)
+    """
+    return get_stats_cache().get(stats_params(days, shop_ids), compute_dashboard,
+                                 refresh_in_background=_refresh_in_thread)
+
+
+def refresh_stats_cache():
+    """后台进程定时调用：刷新仍在被查看的统计缓存。"""
+    return get_stats_cache().refresh_active(compute_dashboard)
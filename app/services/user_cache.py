@@ -0,0 +1,119 @@
+"""进程内登录用户缓存。
+
+Flask-Login 每个请求都要按会话中的用户ID加载用户，订单列表、订单详情等页面
+还要查询用户可查看的店铺。用户及其店铺权限修改频率很低，因此每个 worker
+在内存中保存已登录用户的只读快照（含可查看的店铺ID集合），按用户ID索引。
+
+失效机制与店铺缓存（shop_cache）相同：
+- 修改、删除用户后调用 invalidate_users()，立即清空本地快照并递增
+  cache_versions 中的 'user' 版本号
+- 其他 worker 每 USER_CACHE_VERSION_CHECK 秒比较一次版本号，
+  发现变化后清空全部快照，因此修改最迟在该间隔内对所有 worker 生效
+- 单个用户的快照超过 USER_CACHE_TTL 秒重新加载
+"""
+import threading
+import time
+
+from flask import current_app
+from flask_login import UserMixin
+
+from app.extensions import db
+from app.models.user import User, UserShopPermission
+from app.services.cache_version import bump_cache_version, get_cache_version
+
+CACHE_NAME = 'user'
+
+_USER_FIELDS = ('id', 'username', 'name', 'role', 'can_view_order', 'can_deliver', 'can_refund',
+                'is_active_flag', 'last_login', 'create_time')
+
+
+class CachedUser(UserMixin):
+    """User 的只读快照，附带可查看的店铺ID集合，不绑定数据库会话。"""
+
+    def __init__(self, user, shop_ids):
+        for key in _USER_FIELDS:
+            setattr(self, key, getattr(user, key))
+        self.shop_ids = frozenset(shop_ids)
+
+    @property
+    def is_active(self):
+        return self.is_active_flag == 1
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def get_permitted_shop_ids(self):
+        if self.is_admin:
+            return None  # admin can see all
+        return sorted(self.shop_ids)
+
+    def has_shop_permission(self, shop_id):
+        return self.is_admin or shop_id in self.shop_ids
+
+
+class UserDirectory:
+    def __init__(self, ttl=300, version_check_interval=5):
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._users = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, user_id):
+        """按用户ID取快照，用户不存在时返回 None。"""
+        self._check_version()
+        now = time.monotonic()
+        entry = self._users.get(user_id)
+        if entry and now - entry[0] < self.ttl:
+            return entry[1]
+
+        user = db.session.get(User, user_id)
+        cached = None
+        if user:
+            shop_ids = [] if user.is_admin else [
+                row.shop_id for row in db.session.query(UserShopPermission.shop_id).filter_by(user_id=user_id)
+            ]
+            cached = CachedUser(user, shop_ids)
+        with self._lock:
+            self._users[user_id] = (now, cached)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._users = {}
+            self._version = None
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.version_check_interval:
+            return
+        version = get_cache_version(CACHE_NAME)
+        with self._lock:
+            if version != self._version:
+                self._users = {}
+                self._version = version
+            self._checked_at = now
+
+
+def get_user_directory():
+    directory = current_app.extensions.get('user_directory')
+    if directory is None:
+        directory = UserDirectory(
+            ttl=current_app.config.get('USER_CACHE_TTL', 300),
+            version_check_interval=current_app.config.get('USER_CACHE_VERSION_CHECK', 5),
+        )
+        current_app.extensions['user_directory'] = directory
+    return directory
+
+
+def load_cached_user(user_id):
+    """Flask-Login 的 user_loader：返回 CachedUser，不存在时返回 None。"""
+    return get_user_directory().get(user_id)
+
+
+def invalidate_users():
+    """用户或其店铺权限修改、删除后调用：清空本进程快照并通知其他 worker。"""
+    bump_cache_version(CACHE_NAME)
+    get_user_directory().clear()
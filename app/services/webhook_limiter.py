@@ -0,0 +1,140 @@
+"""按 Webhook 地址的令牌桶限流。
+
+钉钉、企业微信机器人每个 Webhook 每分钟最多约 20 条消息，超出后直接拒绝。
+发送前先从该 Webhook 的令牌桶中取令牌：
+
+- 令牌按 NOTIFY_RATE_DINGTALK / NOTIFY_RATE_WECOM（条/分钟）匀速补充，
+  桶容量为 NOTIFY_RATE_BURST；任意一分钟内最多发出 速率 + 容量 条
+- 取不到令牌时返回需等待的秒数：后台队列把任务的 next_run_time 推迟到
+  有令牌的时间（任务留在队列中，不丢弃、不计入重试次数），
+  手动重发、测试通知等同步调用最多等待 NOTIFY_RATE_MAX_WAIT 秒
+
+令牌桶保存在共享状态库中，同一台主机的所有 worker 和后台进程共用；
+多个店铺配置同一个机器人时共用一个桶。
+"""
+import logging
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from flask import current_app
+
+from app.services.shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_buckets (
+    webhook TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    refilled_at REAL NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    last_wait REAL NOT NULL DEFAULT 0,
+    last_throttled_at REAL
+);
+"""
+
+
+class WebhookLimiter:
+    def __init__(self, store, rates, burst=2, max_wait=10):
+        """
+        Args:
+            store: SharedStateStore
+            rates: {渠道: 每分钟条数}
+            burst: 桶容量
+            max_wait: 同步发送最长等待秒数
+        """
+        self.store = store
+        self.rates = rates
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        store.register_schema(SCHEMA)
+
+    def rate_per_second(self, channel):
+        return max(self.rates.get(channel, 20), 1) / 60.0
+
+    def try_acquire(self, webhook, channel):
+        """尝试取一个令牌。
+
+        Returns:
+            float: 0 表示已取得令牌，可以立即发送；否则为需等待的秒数
+        """
+        now = time.time()
+        rate = self.rate_per_second(channel)
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT tokens, refilled_at FROM webhook_buckets WHERE webhook = ?',
+                               (webhook,)).fetchone()
+            if row is None:
+                conn.execute('INSERT INTO webhook_buckets (webhook, channel, tokens, refilled_at, sent) '
+                             'VALUES (?, ?, ?, ?, 1)', (webhook, channel, self.burst - 1, now))
+                return 0
+            tokens = min(self.burst, row['tokens'] + max(0.0, now - row['refilled_at']) * rate)
+            if tokens >= 1:
+                conn.execute('UPDATE webhook_buckets SET tokens = ?, refilled_at = ?, sent = sent + 1 '
+                             'WHERE webhook = ?', (tokens - 1, now, webhook))
+                return 0
+            wait = (1 - tokens) / rate
+            conn.execute('UPDATE webhook_buckets SET tokens = ?, refilled_at = ?, throttled = throttled + 1, '
+                         'last_wait = ?, last_throttled_at = ? WHERE webhook = ?',
+                         (tokens, now, wait, now, webhook))
+        return wait
+
+    def release(self, webhook):
+        """归还 try_acquire 取得但最终没有使用的令牌。"""
+        with self.store.transaction() as conn:
+            conn.execute('UPDATE webhook_buckets SET tokens = MIN(tokens + 1, ?), sent = MAX(sent - 1, 0) '
+                         'WHERE webhook = ?', (self.burst, webhook))
+
+    def acquire(self, webhook, channel, max_wait=None):
+        """同步等待令牌，最多等待 max_wait 秒，返回是否取得。"""
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            wait = self.try_acquire(webhook, channel)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def states(self):
+        """各 Webhook 的令牌桶状态：{webhook: {...}}。"""
+        now = time.time()
+        result = {}
+        for row in self.store.query('SELECT * FROM webhook_buckets'):
+            rate = self.rate_per_second(row['channel'])
+            tokens = min(self.burst, row['tokens'] + max(0.0, now - row['refilled_at']) * rate)
+            result[row['webhook']] = {
+                'channel': row['channel'],
+                'rate_per_minute': round(rate * 60, 2),
+                'tokens': round(tokens, 2),
+                'next_token_in': round(max(0.0, (1 - tokens) / rate), 1),
+                'sent': row['sent'],
+                'throttled': row['throttled'],
+                'last_wait': round(row['last_wait'], 1),
+                'last_throttled_at': row['last_throttled_at'],
+            }
+        return result
+
+
+def mask_webhook(webhook):
+    """隐藏 Webhook 中的 access_token / key，只保留末 4 位，用于展示。"""
+    parts = urlsplit(webhook)
+    query = [(k, '***' + v[-4:] if len(v) > 4 else '***') for k, v in parse_qsl(parts.query)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe='*')))
+
+
+def get_webhook_limiter():
+    """当前应用的 Webhook 限流器；NOTIFY_RATE_LIMIT_ENABLED 关闭时返回 None。"""
+    config = current_app.config
+    if not config.get('NOTIFY_RATE_LIMIT_ENABLED', True):
+        return None
+    limiter = current_app.extensions.get('webhook_limiter')
+    if limiter is None:
+        limiter = current_app.extensions['webhook_limiter'] = WebhookLimiter(
+            get_shared_state(),
+            rates={'dingtalk': config['NOTIFY_RATE_DINGTALK'], 'wecom': config['NOTIFY_RATE_WECOM']},
+            burst=config['NOTIFY_RATE_BURST'],
+            max_wait=config['NOTIFY_RATE_MAX_WAIT'],
+        )
+    return limiter
@@ -129,3 +129,49 @@ function resendNotification(logId) {
         if (res.success) location.reload();
     });
 }
+
+// Bulk resend failed notifications (progress streamed as NDJSON lines)
+function bulkResendNotifications() {
+    var shopSelect = document.querySelector('select[name="shop_id"]');
+    var data = {
+        shop_id: shopSelect ? shopSelect.value : '',
+        start_date: document.getElementById('resend-start-date').value,
+        end_date: document.getElementById('resend-end-date').value
+    };
+    if (!confirm('确认重新发送所选范围内所有失败的通知？')) return;
+    var progress = document.getElementById('resend-progress');
+    progress.textContent = '正在查找失败的通知...';
+    fetch('/notification/bulk-resend', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data)
+    }).then(function(r) {
+        var reader = r.body.getReader();
+        var decoder = new TextDecoder();
+        var buffer = '';
+        function read() {
+            return reader.read().then(function(chunk) {
+                if (chunk.done) return;
+                buffer += decoder.decode(chunk.value, { stream: true });
+                var lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(function(line) {
+                    if (!line) return;
+                    var event = JSON.parse(line);
+                    if (event.message) {
+                        progress.textContent = event.message;
+                    } else if (event.error) {
+                        progress.textContent = '重发失败：' + event.error;
+                    } else if (event.finished) {
+                        progress.textContent = '完成：共 ' + event.total + ' 条，成功 ' + event.succeeded +
+                            ' 条，失败 ' + event.failed + ' 条';
+                    } else {
+                        progress.textContent = '发送中 ' + event.done + '/' + event.total + '，成功 ' + event.succeeded;
+                    }
+                });
+                return read();
+            });
+        }
+        return read();
+    });
+}
@@ -0,0 +1,94 @@
+"""订单接收性能对比：/api/order/create 逐条推送 vs /api/order/batch-create 批量推送。
+
+通过 Flask test client 在进程内调用接口，包含签名验证、去重查询、
+入库和通知任务写入，不包含网络开销。默认使用内存 SQLite，
+可通过 --database-url 指定 MySQL 测试库（会创建并清空表，勿用于生产库）。
+
+用法：python benchmarks/bench_order_ingest.py --sizes 100 1000 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.models.shop import Shop
+from app.services.jd_game import generate_game_sign
+from config import TestConfig
+
+SECRET = 'bench_secret'
+
+
+def build_orders(prefix, count):
+    orders = []
+    for i in range(count):
+        order = {
+            'shop_code': 'BENCH001',
+            'jd_order_no': f'{prefix}{i:08d}',
+            'order_type': 1,
+            'amount': 1000,
+            'quantity': 1,
+            'product_info': '压测商品',
+            'produce_account': '13800138000',
+        }
+        order['sign'] = generate_game_sign({k: str(v) for k, v in order.items()}, SECRET)
+        orders.append(order)
+    return orders
+
+
+def run_single(client, orders):
+    for order in orders:
+        resp = client.post('/api/order/create', data=json.dumps(order), content_type='application/json')
+        assert resp.status_code == 200, resp.data
+
+
+def run_batch(client, orders, batch_size):
+    for start in range(0, len(orders), batch_size):
+        chunk = orders[start:start + batch_size]
+        resp = client.post('/api/order/batch-create', data=json.dumps({'orders': chunk}),
+                           content_type='application/json')
+        assert resp.status_code == 200, resp.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = args.database_url or TestConfig.SQLALCHEMY_DATABASE_URI
+
+    app = create_app(BenchConfig)
+    batch_size = app.config['ORDER_BATCH_MAX_SIZE']
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Shop(shop_name='压测店铺', shop_code='BENCH001', shop_type=1, is_enabled=1,
+                            game_md5_secret=SECRET, notify_enabled=1,
+                            dingtalk_webhook='http://127.0.0.1:9/robot/send'))
+        db.session.commit()
+        client = app.test_client()
+
+        print(f"{'订单数':>8} {'逐条耗时(s)':>12} {'逐条(单/秒)':>12} {'批量耗时(s)':>12} {'批量(单/秒)':>12} {'加速比':>8}")
+        for size in args.sizes:
+            single_orders = build_orders(f'S{size}_', size)
+            batch_orders = build_orders(f'B{size}_', size)
+
+            start = time.perf_counter()
+            run_single(client, single_orders)
+            single_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            run_batch(client, batch_orders, batch_size)
+            batch_time = time.perf_counter() - start
+
+            print(f"{size:>8} {single_time:>12.3f} {size / single_time:>12.0f} "
+                  f"{batch_time:>12.3f} {size / batch_time:>12.0f} {single_time / batch_time:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""订单接收端到端压测：向运行中的服务推送带签名的订单，统计吞吐量和延迟分位数。
+
+- 使用 generate_game_sign / generate_general_sign 按店铺类型签名
+- --batch-size 0 时逐条调用 /api/order/create，否则按批调用 /api/order/batch-create
+- --with-mock 在本进程内启动 benchmarks/mock_endpoints.py 的模拟服务，
+  额外统计「订单推送 → 钉钉/企业微信收到通知」的端到端耗时（需 worker.py 在运行）
+- --setup-shop 直接写库创建/更新压测店铺（DATABASE_URL 指向测试库），
+  回调地址、阿奇索、机器人 Webhook 都指向模拟服务
+
+示例：
+    python benchmarks/load_test.py --setup-shop --with-mock 9000 --orders 2000 --concurrency 20
+    python benchmarks/load_test.py --target http://127.0.0.1:5000 --batch-size 100 --orders 10000
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from app.services.jd_game import generate_game_sign
+from app.services.jd_general import generate_general_sign
+from benchmarks.mock_endpoints import add_profile_arguments, build_mock
+
+
+def percentile(values, pct):
+    """最近秩法分位数。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def build_order(args, index):
+    order = {
+        'shop_code': args.shop_code,
+        'jd_order_no': f'{args.prefix}{index:08d}',
+        'order_type': 1,
+        'amount': 1000,
+        'quantity': 1,
+        'sku_id': 'LOAD-SKU',
+        'product_info': '压测商品',
+        'produce_account': '13800138000',
+    }
+    if args.secret:
+        sign = generate_game_sign if args.platform == 'game' else generate_general_sign
+        order['sign'] = sign({k: str(v) for k, v in order.items()}, args.secret)
+    return order
+
+
+def setup_shop(args, mock_url):
+    """创建或更新压测店铺，接口地址指向模拟服务。"""
+    from app import create_app
+    from app.extensions import db
+    from app.models.shop import Shop
+    from app.services.shop_cache import invalidate_shops
+
+    app = create_app()
+    with app.app_context():
+        shop = Shop.query.filter_by(shop_code=args.shop_code).first()
+        if not shop:
+            shop = Shop(shop_code=args.shop_code, shop_name='压测店铺')
+            db.session.add(shop)
+        shop.shop_type = 1 if args.platform == 'game' else 2
+        shop.is_enabled = 1
+        shop.game_md5_secret = args.secret if args.platform == 'game' else None
+        shop.general_md5_secret = args.secret if args.platform == 'general' else None
+        shop.game_direct_callback_url = f'{mock_url}/jd/game/direct'
+        shop.game_card_callback_url = f'{mock_url}/jd/game/card'
+        shop.general_callback_url = f'{mock_url}/jd/general/callback'
+        shop.agiso_enabled = 1
+        shop.agiso_host = mock_url
+        shop.agiso_app_id = 'load'
+        shop.agiso_app_secret = 'load_secret'
+        shop.agiso_access_token = 'load_token'
+        shop.notify_enabled = 1
+        shop.dingtalk_webhook = f'{mock_url}/robot/send?access_token=load'
+        shop.dingtalk_secret = None
+        shop.wecom_webhook = None
+        db.session.commit()
+        invalidate_shops()
+    print(f'已配置压测店铺 {args.shop_code}，接口指向 {mock_url}')
+
+
+class LoadRunner:
+    def __init__(self, args):
+        self.args = args
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=args.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.latencies = []
+        self.statuses = Counter()
+        self.pushed_at = {}
+        self._lock = threading.Lock()
+
+    def run(self):
+        args = self.args
+        orders = [build_order(args, i) for i in range(args.orders)]
+        if args.batch_size:
+            chunks = [orders[i:i + args.batch_size] for i in range(0, len(orders), args.batch_size)]
+            url, payload = f'{args.target}/api/order/batch-create', lambda chunk: {'orders': chunk}
+        else:
+            chunks = [[order] for order in orders]
+            url, payload = f'{args.target}/api/order/create', lambda chunk: chunk[0]
+
+        def send(chunk):
+            start = time.perf_counter()
+            sent_at = time.time()
+            try:
+                resp = self.session.post(url, json=payload(chunk), timeout=args.timeout)
+                body = resp.json()
+                ok = resp.status_code == 200 and body.get('success')
+                status = f'HTTP {resp.status_code}' if ok else f"HTTP {resp.status_code} {body.get('message')}"
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.append(elapsed)
+                self.statuses[status] += len(chunk)
+                for order in chunk:
+                    self.pushed_at[order['jd_order_no']] = sent_at
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(send, chunks))
+        return time.perf_counter() - start
+
+
+def report_latencies(title, seconds):
+    print(f'{title}: p50={percentile(seconds, 50) * 1000:.1f}ms  p95={percentile(seconds, 95) * 1000:.1f}ms  '
+          f'p99={percentile(seconds, 99) * 1000:.1f}ms  max={max(seconds) * 1000:.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help='被测服务地址')
+    parser.add_argument('--shop-code', default='LOAD001')
+    parser.add_argument('--platform', choices=['game', 'general'], default='game')
+    parser.add_argument('--secret', default='load_secret', help='店铺 MD5 密钥（留空则不签名）')
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=0, help='0=逐条 /api/order/create，>0 按批推送')
+    parser.add_argument('--prefix', default=f'LOAD{int(time.time())}', help='京东订单号前缀')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--with-mock', type=int, metavar='PORT', help='在本进程内启动模拟服务')
+    parser.add_argument('--setup-shop', action='store_true', help='写库配置压测店铺（需 --with-mock）')
+    parser.add_argument('--wait-notify', type=float, default=60, help='等待通知送达的最长秒数')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    mock = None
+    if args.with_mock is not None:
+        if args.setup_shop:
+            # 模拟服务按压测店铺的配置校验签名
+            args.jd_secret = args.jd_secret or args.secret
+            args.agiso_secret = args.agiso_secret or 'load_secret'
+            args.agiso_token = args.agiso_token or 'load_token'
+        mock = build_mock(args)
+        port = mock.start(port=args.with_mock)
+        mock_url = f'http://127.0.0.1:{port}'
+        print(f'模拟服务: {mock_url}')
+        if args.setup_shop:
+            setup_shop(args, mock_url)
+
+    runner = LoadRunner(args)
+    elapsed = runner.run()
+    accepted = sum(count for status, count in runner.statuses.items() if status == 'HTTP 200')
+
+    print(f'\n订单数: {args.orders}  并发: {args.concurrency}  '
+          f'模式: {"batch-create x" + str(args.batch_size) if args.batch_size else "create"}')
+    print(f'耗时: {elapsed:.2f}s  吞吐量: {args.orders / elapsed:.1f} 订单/秒  成功: {accepted}')
+    report_latencies('请求延迟', runner.latencies)
+    for status, count in runner.statuses.most_common():
+        print(f'  {status}: {count}')
+
+    if mock:
+        deadline = time.time() + args.wait_notify
+        while time.time() < deadline and len(set(runner.pushed_at) & set(mock.notified_at)) < accepted:
+            time.sleep(0.5)
+        delays = [mock.notified_at[no] - sent for no, sent in runner.pushed_at.items() if no in mock.notified_at]
+        print(f'\n收到通知: {len(delays)}/{accepted}')
+        if delays:
+            report_latencies('推送→通知', delays)
+        print(json.dumps(mock.stats(), ensure_ascii=False, indent=2))
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""京东 / 阿奇索 / 钉钉 / 企业微信接口的本地模拟服务，用于压测和联调。
+
+实现的接口：
+    POST /jd/game/<任意>            京东游戏点卡平台回调（直充成功、卡密、退款）
+    POST /jd/general/<任意>         京东通用交易平台回调（充值成功、卡密、退款）
+    POST /api/jd/order/deliver      阿奇索自动发货
+    POST /api/jd/order/query        阿奇索订单查询
+    POST /robot/send?access_token=  钉钉机器人
+    POST /cgi-bin/webhook/send?key= 企业微信机器人
+    GET  /stats                     各接口的请求数、失败数、限流数、签名错误数
+
+每类接口（jd / agiso / dingtalk / wecom）可分别配置延迟、随机抖动、错误率、
+每分钟限流次数；配置了密钥时校验签名。
+
+店铺配置示例（端口 9000）：
+    游戏直充/卡密回调地址  http://127.0.0.1:9000/jd/game/direct、.../jd/game/card
+    通用交易回调地址       http://127.0.0.1:9000/jd/general/callback
+    阿奇索主机地址         http://127.0.0.1:9000
+    钉钉 Webhook          http://127.0.0.1:9000/robot/send?access_token=load
+    企业微信 Webhook      http://127.0.0.1:9000/cgi-bin/webhook/send?key=load
+
+用法：python benchmarks/mock_endpoints.py --port 9000 --jd-latency-ms 80 --dingtalk-rate-limit 20
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.agiso import generate_agiso_sign
+from app.services.jd_game import generate_game_sign
+from app.services.jd_general import generate_general_sign
+
+GROUPS = ('jd', 'agiso', 'dingtalk', 'wecom')
+
+# 通知消息中的京东订单号，用于统计下单到收到通知的耗时
+ORDER_NO_PATTERN = re.compile(r'\*\*订单号：\*\* (\S+)')
+
+
+class Profile:
+    """一类接口的模拟行为。"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # 每分钟每个 key 的最大请求数，0 表示不限
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+
+class MockEndpoints:
+    def __init__(self, profiles=None, jd_secret=None, agiso_secret=None, agiso_token=None, dingtalk_secret=None):
+        self.profiles = {group: Profile() for group in GROUPS}
+        self.profiles.update(profiles or {})
+        self.jd_secret = jd_secret
+        self.agiso_secret = agiso_secret
+        self.agiso_token = agiso_token
+        self.dingtalk_secret = dingtalk_secret
+
+        self._lock = threading.Lock()
+        self._windows = defaultdict(deque)
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.notified_at = {}
+        self.callbacks = {}
+        self._server = None
+
+    # ---- 限流与统计 ----
+
+    def allow(self, group, key):
+        limit = self.profiles[group].rate_limit
+        if not limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows[(group, key)]
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= limit:
+                return False
+            window.append(now)
+            return True
+
+    def count(self, group, name):
+        with self._lock:
+            self.counters[group][name] += 1
+
+    def record_notification(self, text):
+        now = time.time()
+        with self._lock:
+            for jd_order_no in ORDER_NO_PATTERN.findall(text or ''):
+                self.notified_at.setdefault(jd_order_no, now)
+
+    def record_callback(self, params):
+        with self._lock:
+            self.callbacks.setdefault(params.get('jdOrderId'), time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'counters': {group: dict(values) for group, values in self.counters.items()},
+                'notified_orders': len(self.notified_at),
+                'callback_orders': len(self.callbacks),
+            }
+
+    # ---- 服务启动 ----
+
+    def start(self, host='127.0.0.1', port=9000):
+        """在后台线程启动服务，返回实际监听的端口。"""
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock = None
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/stats':
+            return self._reply(200, self.mock.stats())
+        self._reply(404, {'success': False, 'message': 'not found'})
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            return self._reply(400, {'success': False, 'message': 'invalid json'})
+
+        path = parts.path
+        if path.startswith('/jd/game/') or path.startswith('/jd/general/'):
+            self._jd(path, params)
+        elif path in ('/api/jd/order/deliver', '/api/jd/order/query'):
+            self._agiso(path, params)
+        elif path == '/robot/send':
+            self._dingtalk(query, params)
+        elif path == '/cgi-bin/webhook/send':
+            self._wecom(query, params)
+        else:
+            self._reply(404, {'success': False, 'message': 'not found'})
+
+    def log_message(self, *args):
+        pass
+
+    # ---- 京东回调 ----
+
+    def _jd(self, path, params):
+        if not self._begin('jd', path.split('/')[2], {'success': False, 'code': 429, 'message': '请求过于频繁'}):
+            return
+        if not params.get('jdOrderId') or not params.get('orderId'):
+            return self._fail('jd', {'success': False, 'code': 400, 'message': '缺少订单号'})
+        if self.mock.jd_secret and params.get('sign'):
+            # 卡密回调的签名不包含 cards 字段
+            sign_params = {k: v for k, v in params.items() if k not in ('sign', 'cards')}
+            generate = generate_game_sign if path.startswith('/jd/game/') else generate_general_sign
+            if generate(sign_params, self.mock.jd_secret) != params['sign']:
+                self.mock.count('jd', 'bad_sign')
+                return self._fail('jd', {'success': False, 'code': 401, 'message': '签名错误'})
+        self.mock.record_callback(params)
+        self._ok('jd', {'success': True, 'code': 0, 'message': 'ok'})
+
+    # ---- 阿奇索 ----
+
+    def _agiso(self, path, params):
+        if not self._begin('agiso', params.get('appId'), {'code': 429, 'msg': '请求过于频繁'}):
+            return
+        if self.mock.agiso_token and self.headers.get('Authorization') != f'Bearer {self.mock.agiso_token}':
+            return self._fail('agiso', {'code': 401, 'msg': 'access_token 无效'})
+        if self.mock.agiso_secret:
+            sign_params = {k: v for k, v in params.items() if k != 'sign'}
+            if generate_agiso_sign(sign_params, self.mock.agiso_secret) != params.get('sign'):
+                self.mock.count('agiso', 'bad_sign')
+                return self._fail('agiso', {'code': 402, 'msg': '签名错误'})
+        if path.endswith('/deliver'):
+            data = {'jdOrderId': params.get('jdOrderId'), 'status': 'DELIVERED'}
+        else:
+            data = {'jdOrderId': params.get('jdOrderId'), 'status': 'SUCCESS'}
+        self._ok('agiso', {'code': 0, 'success': True, 'data': data})
+
+    # ---- 钉钉 / 企业微信机器人 ----
+
+    def _dingtalk(self, query, params):
+        throttled = {'errcode': 130101, 'errmsg': 'send too fast, exceed 20 times per minute'}
+        if not self._begin('dingtalk', query.get('access_token'), throttled):
+            return
+        if self.mock.dingtalk_secret and query.get('sign'):
+            string_to_sign = f"{query.get('timestamp')}\n{self.mock.dingtalk_secret}"
+            expected = base64.b64encode(hmac.new(self.mock.dingtalk_secret.encode(), string_to_sign.encode(),
+                                                 digestmod=hashlib.sha256).digest()).decode()
+            if query['sign'] != expected:
+                self.mock.count('dingtalk', 'bad_sign')
+                return self._fail('dingtalk', {'errcode': 310000, 'errmsg': 'sign not match'})
+        self.mock.record_notification((params.get('markdown') or {}).get('text'))
+        self._ok('dingtalk', {'errcode': 0, 'errmsg': 'ok'})
+
+    def _wecom(self, query, params):
+        if not self._begin('wecom', query.get('key'), {'errcode': 45009, 'errmsg': 'api freq out of limit'}):
+            return
+        self.mock.record_notification((params.get('markdown') or {}).get('content'))
+        self._ok('wecom', {'errcode': 0, 'errmsg': 'ok'})
+
+    # ---- 公共处理 ----
+
+    def _begin(self, group, key, throttled_body):
+        """统计请求、模拟延迟，并按错误率和限流返回失败；返回 False 表示已应答。"""
+        mock = self.mock
+        mock.count(group, 'requests')
+        profile = mock.profiles[group]
+        profile.delay()
+        if not mock.allow(group, key):
+            mock.count(group, 'throttled')
+            self._reply(200, throttled_body)
+            return False
+        if profile.error_rate and random.random() < profile.error_rate:
+            mock.count(group, 'errors')
+            self._reply(500, {'success': False, 'code': 500, 'errcode': -1, 'message': '模拟服务异常'})
+            return False
+        return True
+
+    def _ok(self, group, body):
+        self.mock.count(group, 'ok')
+        self._reply(200, body)
+
+    def _fail(self, group, body):
+        self.mock.count(group, 'rejected')
+        self._reply(200, body)
+
+    def _reply(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def add_profile_arguments(parser):
+    for group in GROUPS:
+        parser.add_argument(f'--{group}-latency-ms', type=float, default=0, help=f'{group} 平均延迟（毫秒）')
+        parser.add_argument(f'--{group}-jitter-ms', type=float, default=0, help=f'{group} 延迟随机抖动（毫秒）')
+        parser.add_argument(f'--{group}-error-rate', type=float, default=0, help=f'{group} 返回 500 的比例')
+        parser.add_argument(f'--{group}-rate-limit', type=int,
+                            default=20 if group in ('dingtalk', 'wecom') else 0,
+                            help=f'{group} 每分钟每个 key 的请求上限（0 表示不限）')
+    parser.add_argument('--jd-secret', help='京东 MD5 密钥，配置后校验回调签名')
+    parser.add_argument('--agiso-secret', help='阿奇索 AppSecret，配置后校验签名')
+    parser.add_argument('--agiso-token', help='阿奇索 access_token，配置后校验 Authorization 头')
+    parser.add_argument('--dingtalk-secret', help='钉钉加签密钥，配置后校验签名')
+
+
+def build_mock(args):
+    profiles = {
+        group: Profile(
+            latency_ms=getattr(args, f'{group}_latency_ms'),
+            jitter_ms=getattr(args, f'{group}_jitter_ms'),
+            error_rate=getattr(args, f'{group}_error_rate'),
+            rate_limit=getattr(args, f'{group}_rate_limit'),
+        )
+        for group in GROUPS
+    }
+    return MockEndpoints(profiles, jd_secret=args.jd_secret, agiso_secret=args.agiso_secret,
+                         agiso_token=args.agiso_token, dingtalk_secret=args.dingtalk_secret)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    mock = build_mock(args)
+    port = mock.start(args.host, args.port)
+    print(f'模拟服务已启动: http://{args.host}:{port}  （GET /stats 查看统计，Ctrl+C 退出）')
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(mock.stats(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
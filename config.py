@@ -13,9 +13,108 @@ class Config:
         'pool_pre_ping': True,
     }
 
+    # 后台通知 worker（python worker.py）轮询间隔（秒）及每批读取任务数
+    NOTIFY_WORKER_INTERVAL = int(os.environ.get('NOTIFY_WORKER_INTERVAL', 1))
+    NOTIFY_JOB_BATCH_SIZE = int(os.environ.get('NOTIFY_JOB_BATCH_SIZE', 50))
+
+    # 京东回调发件箱：每批读取记录数、发送线程数、每个回调主机的最大并发数、
+    # 最大尝试次数（之后进入死信）、指数退避的初始间隔和上限（秒）
+    CALLBACK_BATCH_SIZE = int(os.environ.get('CALLBACK_BATCH_SIZE', 100))
+    CALLBACK_WORKER_THREADS = int(os.environ.get('CALLBACK_WORKER_THREADS', 8))
+    CALLBACK_PER_HOST_LIMIT = int(os.environ.get('CALLBACK_PER_HOST_LIMIT', 2))
+    CALLBACK_MAX_ATTEMPTS = int(os.environ.get('CALLBACK_MAX_ATTEMPTS', 8))
+    CALLBACK_BACKOFF_BASE = int(os.environ.get('CALLBACK_BACKOFF_BASE', 5))
+    CALLBACK_BACKOFF_MAX = int(os.environ.get('CALLBACK_BACKOFF_MAX', 600))
+
+    # 通知日志保留天数（超过的每天凌晨移入归档表，0=不归档）及每批搬移行数
+    NOTIFY_LOG_RETENTION_DAYS = int(os.environ.get('NOTIFY_LOG_RETENTION_DAYS', 90))
+    NOTIFY_LOG_ARCHIVE_CHUNK = int(os.environ.get('NOTIFY_LOG_ARCHIVE_CHUNK', 1000))
+
+    # 批量重发失败通知：单次最多重发条数、发送线程数（同一 Webhook 仍按限流顺序发送）
+    NOTIFY_RESEND_MAX_SIZE = int(os.environ.get('NOTIFY_RESEND_MAX_SIZE', 2000))
+    NOTIFY_RESEND_WORKERS = int(os.environ.get('NOTIFY_RESEND_WORKERS', 8))
+
+    # /api/order/batch-create 单次最多订单数
+    ORDER_BATCH_MAX_SIZE = int(os.environ.get('ORDER_BATCH_MAX_SIZE', 1000))
+
+    # 订单列表近似总数：最多统计的条数、按筛选条件缓存的秒数
+    ORDER_COUNT_LIMIT = int(os.environ.get('ORDER_COUNT_LIMIT', 10000))
+    ORDER_COUNT_CACHE_TTL = int(os.environ.get('ORDER_COUNT_CACHE_TTL', 60))
+
+    # 订单列表批量操作（通知成功/退款/阿奇索发货）单次最多订单数、当场发送时每个主机的并发数
+    # （不超过 HTTP_POOL_SIZE；京东回调通常都发往同一主机，后台重试用的 CALLBACK_PER_HOST_LIMIT 对批量操作太小）
+    ORDER_BULK_MAX_SIZE = int(os.environ.get('ORDER_BULK_MAX_SIZE', 200))
+    ORDER_BULK_CONCURRENCY = int(os.environ.get('ORDER_BULK_CONCURRENCY', 10))
+
+    # 对外 HTTP 调用（京东回调、阿奇索、钉钉/企业微信）：每个主机的连接池大小、
+    # 缓存连接池的主机数、默认超时（秒）
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 20))
+    HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))
+
+    # 本机进程间共享状态（熔断器等）使用的 SQLite 文件
+    SHARED_STATE_PATH = os.environ.get(
+        'SHARED_STATE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shared_state.db')
+    )
+
+    # 按目标主机的熔断器：统计窗口（秒）、最少请求数、失败率阈值、慢调用耗时（秒）
+    # 及慢调用率阈值、熔断持续时间（秒，之后放行一个探测请求）
+    BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', '1') == '1'
+    BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 60))
+    BREAKER_MIN_REQUESTS = int(os.environ.get('BREAKER_MIN_REQUESTS', 5))
+    BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 5))
+    BREAKER_SLOW_CALL_RATE = float(os.environ.get('BREAKER_SLOW_CALL_RATE', 0.5))
+    BREAKER_OPEN_SECONDS = int(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+
+    # 钉钉/企业微信 Webhook 令牌桶限流：每个 Webhook 每分钟条数、桶容量、
+    # 同步发送（手动重发、测试通知）最长等待秒数；两家机器人限制均为每分钟约 20 条
+    NOTIFY_RATE_LIMIT_ENABLED = os.environ.get('NOTIFY_RATE_LIMIT_ENABLED', '1') == '1'
+    NOTIFY_RATE_DINGTALK = int(os.environ.get('NOTIFY_RATE_DINGTALK', 18))
+    NOTIFY_RATE_WECOM = int(os.environ.get('NOTIFY_RATE_WECOM', 18))
+    NOTIFY_RATE_BURST = int(os.environ.get('NOTIFY_RATE_BURST', 2))
+    NOTIFY_RATE_MAX_WAIT = float(os.environ.get('NOTIFY_RATE_MAX_WAIT', 10))
+
+    # 进程内店铺缓存：快照有效期、检查跨进程版本号的间隔（秒）
+    SHOP_CACHE_TTL = int(os.environ.get('SHOP_CACHE_TTL', 300))
+    SHOP_CACHE_VERSION_CHECK = int(os.environ.get('SHOP_CACHE_VERSION_CHECK', 5))
+
+    # 统计页结果缓存：视为最新的秒数、计算租约秒数、后台刷新间隔、多久未访问后不再刷新（秒）
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+    STATS_REFRESH_LEASE = int(os.environ.get('STATS_REFRESH_LEASE', 30))
+    STATS_REFRESH_INTERVAL = int(os.environ.get('STATS_REFRESH_INTERVAL', 60))
+    STATS_CACHE_MAX_IDLE = int(os.environ.get('STATS_CACHE_MAX_IDLE', 3600))
+
+    # 统计接口：日期按该时区划分；单次请求最多返回的时间段数
+    STATS_TIMEZONE = os.environ.get('STATS_TIMEZONE', 'Asia/Shanghai')
+    STATS_SERIES_MAX_BUCKETS = int(os.environ.get('STATS_SERIES_MAX_BUCKETS', 5000))
+
+    # 进程内登录用户缓存：单个用户快照有效期、检查跨进程版本号的间隔（秒）
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    USER_CACHE_VERSION_CHECK = int(os.environ.get('USER_CACHE_VERSION_CHECK', 5))
+
+    # 订单实时推送（SSE）：轮询间隔、只推送多少秒前更新的订单、心跳间隔、单个连接最长秒数、每个 worker 最多连接数
+    ORDER_FEED_INTERVAL = float(os.environ.get('ORDER_FEED_INTERVAL', 1))
+    ORDER_FEED_SETTLE = float(os.environ.get('ORDER_FEED_SETTLE', 1))
+    ORDER_FEED_HEARTBEAT = int(os.environ.get('ORDER_FEED_HEARTBEAT', 15))
+    ORDER_FEED_MAX_SECONDS = int(os.environ.get('ORDER_FEED_MAX_SECONDS', 300))
+    ORDER_FEED_MAX_CLIENTS = int(os.environ.get('ORDER_FEED_MAX_CLIENTS', 20))
+
+    # 订单增量同步接口（/api/orders/changes）：访问令牌（逗号分隔，可同时配置新旧令牌轮换），
+    # 默认/最大每页条数，只返回多少秒前更新的订单（另外还要早于仍未提交的最早事务，见 order_feed.change_horizon）
+    ORDER_CHANGES_API_TOKENS = [t.strip() for t in os.environ.get('ORDER_CHANGES_API_TOKENS', '').split(',')
+                                if t.strip()]
+    ORDER_CHANGES_PAGE_SIZE = int(os.environ.get('ORDER_CHANGES_PAGE_SIZE', 5000))
+    ORDER_CHANGES_MAX_PAGE_SIZE = int(os.environ.get('ORDER_CHANGES_MAX_PAGE_SIZE', 50000))
+    ORDER_CHANGES_SETTLE = int(os.environ.get('ORDER_CHANGES_SETTLE', 5))
+
 
 class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SHARED_STATE_PATH = ':memory:'
+    # 测试中同一 Webhook 连续发送多次，放大桶容量避免被限流；限流测试单独调小
+    NOTIFY_RATE_BURST = 1000
     WTF_CSRF_ENABLED = False
     SERVER_NAME = 'localhost'
@@ -9,6 +9,8 @@ from app import create_app
 from app.extensions import db
 from app.models.shop import Shop
 from app.models.order import Order
+from app.services.order_search import rebuild_search_tokens
+from app.services.order_stats import rebuild_order_stats_rollup
 
 def generate_test_data():
     app = create_app()
@@ -100,6 +102,11 @@ def generate_test_data():
             print(f"  ✅ 已生成 {completed:,}/{total_orders:,} 个订单 ({progress:.1f}%)")
         
         print(f"\n✅ 成功生成 10万个订单！")
+
+        # bulk_save_objects 不经过订单入库流程，搜索三元组和统计汇总需要重建
+        print("\n🔎 正在生成订单搜索三元组...")
+        rebuild_search_tokens(chunk_size=5000)
+        rebuild_order_stats_rollup(log=print)
         print("\n" + "="*50)
         print("📊 测试数据统计")
         print("="*50)
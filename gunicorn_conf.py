@@ -5,13 +5,15 @@ chdir = '/www/wwwroot/dianshang'
 workers = 4
 
 # 指定每个进程开启的线程数
-threads = 2
+# 订单实时推送（/order/stream）每个连接占用一个线程，最多 ORDER_FEED_MAX_CLIENTS 个，需留出处理普通请求的线程
+threads = 32
 
 #启动用户
 user = 'www'
 
 # 启动模式
-worker_class = 'sync'
+# gthread：长连接只占用线程，不阻塞整个 worker（sync 模式下一个 SSE 连接会占满一个 worker）
+worker_class = 'gthread'
 
 # 绑定的ip与端口
 bind = '0.0.0.0:5000' 
@@ -34,4 +36,18 @@ loglevel = 'info'
 # 自定义设置项请写到该处
 # 最好以上面相同的格式 <注释 + 换行 + key = value> 进行书写， 
 # PS: gunicorn 的配置文件是python扩展形式，即".py"文件，需要注意遵从python语法，
-# 如：loglevel的等级是字符串作为配置的，需要用引号包裹起来
\ No newline at end of file
+# 如：loglevel的等级是字符串作为配置的，需要用引号包裹起来
+
+# 订单号生成器 worker 编号（0-99）= ORDER_NO_HOST_ID（0-9，多台主机部署时每台设置不同的值）* 10 + worker 槽位（0-9）
+# 每个 worker 在 fork 前分配一个未被占用的槽位，重启的 worker 复用退出 worker 的槽位
+import os
+
+
+def pre_fork(server, worker):
+    used = {getattr(w, 'order_no_slot', None) for w in server.WORKERS.values()}
+    worker.order_no_slot = min(slot for slot in range(10) if slot not in used)
+
+
+def post_fork(server, worker):
+    host_id = int(os.environ.get('ORDER_NO_HOST_ID', 0))
+    os.environ['ORDER_NO_WORKER_ID'] = str(host_id * 10 + worker.order_no_slot)
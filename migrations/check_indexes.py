@@ -0,0 +1,35 @@
+"""检查订单列表每种筛选组合的执行计划是否使用了索引。
+
+应在有代表性数据的库上运行（例如 generate_test_data.py 生成 10 万条订单后），
+有未使用索引的组合时以状态码 1 退出。
+用法：python migrations/check_indexes.py [--verbose]
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.order_query import explain_order_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订单列表索引检查')
+    parser.add_argument('--verbose', action='store_true', help='输出所有组合的执行计划')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        results = explain_order_list()
+    failures = [r for r in results if not r['uses_index']]
+    for r in results:
+        if args.verbose or not r['uses_index']:
+            scope = '店铺范围' if r['permitted'] else '全部店铺'
+            mark = '✅' if r['uses_index'] else '❌'
+            print(f"{mark} [{scope}] {'+'.join(r['filters']) or '无筛选'}: {r['plan']}")
+    print(f"共 {len(results)} 种组合，未使用索引 {len(failures)} 种")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,9 @@ CREATE TABLE IF NOT EXISTS shops (
     dingtalk_webhook VARCHAR(500) COMMENT '钉钉机器人Webhook地址',
     dingtalk_secret VARCHAR(500) COMMENT '钉钉机器人加签密钥',
     wecom_webhook VARCHAR(500) COMMENT '企业微信机器人Webhook地址',
+    notify_digest_enabled TINYINT DEFAULT 0 COMMENT '是否合并通知：0=逐单发送 1=合并发送',
+    notify_digest_window INT DEFAULT 60 COMMENT '合并通知等待时间（秒）',
+    notify_digest_max INT DEFAULT 20 COMMENT '合并通知每条消息最多订单数',
 
     is_enabled TINYINT DEFAULT 1 COMMENT '是否启用：0=禁用 1=启用',
     expire_time DATETIME COMMENT '到期时间',
@@ -81,10 +84,15 @@ CREATE TABLE IF NOT EXISTS orders (
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
     update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
+    UNIQUE KEY uk_shop_jd_order (shop_id, jd_order_no),
     INDEX idx_jd_order (jd_order_no, shop_type),
+    INDEX idx_produce_account (produce_account),
     INDEX idx_shop (shop_id, order_status),
+    INDEX idx_shop_create_time (shop_id, create_time),
+    INDEX idx_status_id (order_status, id),
     INDEX idx_create_time (create_time),
     INDEX idx_notified (notified, create_time),
+    INDEX idx_update_time_id (update_time, id),
 
     FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单表';
@@ -136,17 +144,117 @@ CREATE TABLE IF NOT EXISTS notification_logs (
     request_data TEXT COMMENT '请求数据',
     response_data TEXT COMMENT '响应数据',
     error_message TEXT COMMENT '错误信息',
+    digest_id VARCHAR(32) COMMENT '合并发送批次号，同一条合并消息中的订单相同',
 
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
 
     INDEX idx_order (order_id),
-    INDEX idx_shop (shop_id),
-    INDEX idx_create_time (create_time),
+    INDEX idx_log_create_time (create_time),
+    INDEX idx_digest_id (digest_id),
+    INDEX idx_log_shop_type_status (shop_id, notify_type, notify_status, id),
+    INDEX idx_log_shop_status (shop_id, notify_status, id),
+    INDEX idx_log_type_status (notify_type, notify_status, id),
+    INDEX idx_log_status (notify_status, id),
 
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通知日志表';
 
+-- 6. notification_jobs table
+CREATE TABLE IF NOT EXISTS notification_jobs (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    order_id BIGINT NOT NULL COMMENT '订单ID',
+    shop_id BIGINT NOT NULL COMMENT '店铺ID',
+
+    notify_type VARCHAR(20) NOT NULL COMMENT '通知类型：dingtalk/wecom',
+    job_status TINYINT DEFAULT 0 COMMENT '任务状态：0=待发送 1=发送中 2=已完成 3=失败',
+    digest TINYINT DEFAULT 0 COMMENT '是否合并发送：0=逐单 1=合并',
+    attempts TINYINT DEFAULT 0 COMMENT '已尝试次数',
+    next_run_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '下次执行时间',
+    last_error TEXT COMMENT '最近一次错误信息',
+
+    create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    INDEX idx_status_next_run (job_status, next_run_time),
+
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通知任务队列表';
+
+-- 7. cache_versions table
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY COMMENT '缓存名称',
+    version INT NOT NULL DEFAULT 0 COMMENT '版本号，数据变更时递增',
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='跨进程缓存版本表';
+
+-- 8. callback_outbox table
+CREATE TABLE IF NOT EXISTS callback_outbox (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    order_id BIGINT NOT NULL COMMENT '订单ID',
+    shop_id BIGINT NOT NULL COMMENT '店铺ID',
+
+    action VARCHAR(20) NOT NULL COMMENT '回调动作：success=充值成功 refund=退款',
+    host VARCHAR(255) COMMENT '回调目标主机，用于按主机限制并发',
+    outbox_status TINYINT DEFAULT 0 COMMENT '状态：0=待发送 1=发送中 2=成功 3=死信',
+    attempts TINYINT DEFAULT 0 COMMENT '已尝试次数',
+    next_run_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '下次执行时间',
+    last_error TEXT COMMENT '最近一次错误信息',
+
+    create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    INDEX idx_outbox_status_next_run (outbox_status, next_run_time),
+    INDEX idx_outbox_order (order_id),
+
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='京东回调发件箱';
+
+-- 9. notification_logs_archive table
+CREATE TABLE IF NOT EXISTS notification_logs_archive (
+    id BIGINT PRIMARY KEY COMMENT '原通知日志ID',
+    order_id BIGINT NOT NULL COMMENT '订单ID',
+    shop_id BIGINT NOT NULL COMMENT '店铺ID',
+
+    notify_type VARCHAR(20) NOT NULL COMMENT '通知类型：dingtalk/wecom',
+    notify_status TINYINT DEFAULT 0 COMMENT '通知状态：0=失败 1=成功',
+    digest_id VARCHAR(32) COMMENT '合并发送批次号',
+    payload MEDIUMBLOB COMMENT 'zlib 压缩的 JSON：request_data/response_data/error_message',
+
+    create_time DATETIME COMMENT '原日志创建时间',
+    archive_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+
+    INDEX idx_archive_order (order_id),
+    INDEX idx_archive_create_time (create_time)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='通知日志归档表';
+
+-- 10. order_search_tokens table
+CREATE TABLE IF NOT EXISTS order_search_tokens (
+    token VARCHAR(3) COLLATE utf8mb4_bin NOT NULL COMMENT '小写三元组',
+    order_id BIGINT NOT NULL COMMENT '订单ID',
+
+    PRIMARY KEY (token, order_id),
+    INDEX idx_search_order (order_id),
+
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单号/京东订单号/充值账号三元组倒排索引';
+
+-- 11. order_stats_rollup table
+CREATE TABLE IF NOT EXISTS order_stats_rollup (
+    shop_id BIGINT NOT NULL COMMENT '店铺ID',
+    stat_hour DATETIME NOT NULL COMMENT '订单创建时间所在整点（UTC）',
+    order_status TINYINT NOT NULL COMMENT '订单状态',
+    order_type TINYINT NOT NULL COMMENT '订单类型',
+
+    order_count INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    amount BIGINT NOT NULL DEFAULT 0 COMMENT '金额（分）',
+
+    PRIMARY KEY (shop_id, stat_hour, order_status, order_type),
+    INDEX idx_rollup_hour (stat_hour, shop_id, order_count, amount)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单统计汇总表（按小时）';
+
 -- Insert default admin user (password: admin123)
 INSERT INTO users (username, password_hash, name, role, can_view_order, can_deliver, can_refund, is_active)
 VALUES ('admin', 'scrypt:32768:8:1$placeholder$placeholder', '超级管理员', 'admin', 1, 1, 1, 1)
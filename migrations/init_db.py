@@ -1,13 +1,20 @@
 """Initialize database and create default admin user."""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from app import create_app
 from app.extensions import db
 from app.models.user import User
+from migrations.migrate import upgrade
 
 
 def init_db():
     app = create_app()
     with app.app_context():
         db.create_all()
+        # 新库的表已是最新结构，迁移版本只做登记；旧库补齐缺少的字段和索引
+        upgrade()
 
         # Create default admin user if not exists
         admin = User.query.filter_by(username='admin').first()
@@ -0,0 +1,164 @@
+"""数据库迁移。
+
+migrations/versions/ 下每个文件是一个版本（文件名即版本号，按名称排序执行），
+定义 DESCRIPTION 和 upgrade(schema)。已执行的版本记录在 schema_migrations 表中，
+只执行尚未执行的版本。
+
+每个版本都先检查字段/索引是否已存在，可以安全地用于：
+- 新库：init_db.py 或 init.sql 建表后执行，全部版本只做登记
+- 旧库：之前手动执行过 add_card_info_field.py 等单独脚本的，已存在的部分会跳过
+
+用法：
+    python migrations/migrate.py            执行未执行的版本
+    python migrations/migrate.py --status   查看各版本执行情况
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+
+from app.extensions import db
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'versions')
+
+
+class Schema:
+    """供各版本使用的建表/加字段/加索引操作，已存在时跳过。"""
+
+    def __init__(self, log=print):
+        self.log = log
+
+    @property
+    def is_mysql(self):
+        return db.engine.dialect.name == 'mysql'
+
+    def _inspector(self):
+        # 每次重新读取，保证看到本次迁移中刚做的修改
+        return inspect(db.engine)
+
+    def has_table(self, table):
+        return self._inspector().has_table(table)
+
+    def has_column(self, table, column):
+        return column in {c['name'] for c in self._inspector().get_columns(table)}
+
+    def index_names(self, table):
+        inspector = self._inspector()
+        names = {i['name'] for i in inspector.get_indexes(table)}
+        names |= {c['name'] for c in inspector.get_unique_constraints(table)}
+        return names
+
+    def execute(self, sql):
+        db.session.execute(db.text(sql))
+        db.session.commit()
+
+    def create_missing_tables(self):
+        """按模型创建不存在的表（已存在的表不做修改）。"""
+        before = set(self._inspector().get_table_names())
+        db.create_all()
+        for table in sorted(set(self._inspector().get_table_names()) - before):
+            self.log(f"✅ {table} 表创建成功")
+
+    def add_column(self, table, column, definition):
+        """添加字段；definition 为 MySQL 语法，其他数据库去掉 COMMENT。"""
+        if self.has_column(table, column):
+            self.log(f"✅ {table}.{column} 字段已存在")
+            return
+        if not self.is_mysql:
+            definition = re.sub(r"\s+COMMENT\s+'[^']*'", '', definition)
+        self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        self.log(f"✅ {table}.{column} 字段添加成功")
+
+    def add_index(self, table, name, columns, unique=False):
+        """添加索引；MySQL 在线添加，不阻塞写入。"""
+        if name in self.index_names(table):
+            self.log(f"✅ {table}.{name} 索引已存在")
+            return
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        if self.is_mysql:
+            self.execute(f'ALTER TABLE {table} ADD {kind} {name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE')
+        else:
+            self.execute(f'CREATE {kind} {name} ON {table} ({columns})')
+        self.log(f"✅ {table}.{name} 索引添加成功")
+
+
+def load_versions():
+    """读取 versions 目录下的全部版本：[(version, module)]，按版本号排序。"""
+    versions = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        if not filename.endswith('.py') or filename.startswith('_'):
+            continue
+        version = filename[:-3]
+        spec = importlib.util.spec_from_file_location(f'migration_{version}', os.path.join(VERSIONS_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        versions.append((version, module))
+    return versions
+
+
+def _ensure_migrations_table():
+    db.session.execute(db.text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version VARCHAR(128) PRIMARY KEY, description VARCHAR(255), applied_time DATETIME)'
+    ))
+    db.session.commit()
+
+
+def applied_versions():
+    """已执行的版本：{version: applied_time}。"""
+    _ensure_migrations_table()
+    rows = db.session.execute(db.text('SELECT version, applied_time FROM schema_migrations')).all()
+    return {version: applied_time for version, applied_time in rows}
+
+
+def upgrade(log=print):
+    """按顺序执行尚未执行的版本，返回本次执行的版本号列表。
+
+    某个版本失败时抛出异常，之后的版本不再执行；修复后重新运行即可继续。
+    """
+    applied = applied_versions()
+    schema = Schema(log=log)
+    done = []
+    for version, module in load_versions():
+        if version in applied:
+            continue
+        log(f"▶ {version}: {module.DESCRIPTION}")
+        module.upgrade(schema)
+        db.session.execute(db.text(
+            'INSERT INTO schema_migrations (version, description, applied_time) VALUES (:v, :d, :t)'
+        ), {'v': version, 'd': module.DESCRIPTION, 't': datetime.utcnow()})
+        db.session.commit()
+        done.append(version)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库迁移')
+    parser.add_argument('--status', action='store_true', help='查看各版本执行情况')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            applied = applied_versions()
+            for version, module in load_versions():
+                mark = f"已执行 {applied[version]}" if version in applied else '未执行'
+                print(f"{version}  {mark}  {module.DESCRIPTION}")
+            return
+        try:
+            done = upgrade()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ 迁移失败：{e}")
+            sys.exit(1)
+        print(f"完成，本次执行 {len(done)} 个版本" if done else '数据库已是最新版本')
+
+
+if __name__ == '__main__':
+    main()
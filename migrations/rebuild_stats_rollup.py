@@ -0,0 +1,25 @@
+"""按 orders 全量重建订单统计汇总表 order_stats_rollup。
+
+正常运行时汇总表随订单写入同步维护，以下情况需要重建：
+- 绕过应用直接写入或修改了 orders（手工 SQL、generate_test_data.py 等）
+- 怀疑汇总数据与订单不一致
+
+重建在一个事务内完成，期间的订单写入会等待该事务结束，建议在低峰期执行。
+用法：python migrations/rebuild_stats_rollup.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.order_stats import rebuild_order_stats_rollup
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        rebuild_order_stats_rollup(log=print)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""按模型创建缺少的表：notification_jobs、cache_versions、callback_outbox、notification_logs_archive 等。"""
+
+DESCRIPTION = '创建缺少的表'
+
+
+def upgrade(schema):
+    schema.create_missing_tables()
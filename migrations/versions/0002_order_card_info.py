@@ -0,0 +1,7 @@
+"""orders.card_info（原 add_card_info_field.py）。"""
+
+DESCRIPTION = '订单卡密信息字段'
+
+
+def upgrade(schema):
+    schema.add_column('orders', 'card_info', "TEXT COMMENT '卡密信息JSON'")
@@ -0,0 +1,22 @@
+"""orders (shop_id, jd_order_no) 唯一索引（原 migrations/add_order_unique_index.py）。
+
+存在重复订单时不会自动删除，列出重复记录后中止，请人工处理后重新执行。
+"""
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.order import Order
+
+DESCRIPTION = '订单 (shop_id, jd_order_no) 唯一索引'
+
+
+def upgrade(schema):
+    if 'uk_shop_jd_order' not in schema.index_names('orders'):
+        duplicates = db.session.query(
+            Order.shop_id, Order.jd_order_no, func.count(Order.id)
+        ).group_by(Order.shop_id, Order.jd_order_no).having(func.count(Order.id) > 1).all()
+        if duplicates:
+            for shop_id, jd_order_no, count in duplicates[:50]:
+                schema.log(f"  店铺ID={shop_id} 京东订单号={jd_order_no} 重复{count}条")
+            raise RuntimeError(f'存在 {len(duplicates)} 组重复订单，请处理后重新执行')
+    schema.add_index('orders', 'uk_shop_jd_order', 'shop_id, jd_order_no', unique=True)
@@ -0,0 +1,14 @@
+"""合并通知相关字段（原 migrations/add_notify_digest_fields.py）。"""
+
+DESCRIPTION = '合并通知字段'
+
+
+def upgrade(schema):
+    schema.add_column('shops', 'notify_digest_enabled',
+                      "TINYINT DEFAULT 0 COMMENT '是否合并通知：0=逐单发送 1=合并发送'")
+    schema.add_column('shops', 'notify_digest_window', "INT DEFAULT 60 COMMENT '合并通知等待时间（秒）'")
+    schema.add_column('shops', 'notify_digest_max', "INT DEFAULT 20 COMMENT '合并通知每条消息最多订单数'")
+    schema.add_column('notification_jobs', 'digest', "TINYINT DEFAULT 0 COMMENT '是否合并发送：0=逐单 1=合并'")
+    schema.add_column('notification_logs', 'digest_id',
+                      "VARCHAR(32) COMMENT '合并发送批次号，同一条合并消息中的订单相同'")
+    schema.add_index('notification_logs', 'idx_digest_id', 'digest_id')
@@ -0,0 +1,10 @@
+"""通知日志列表筛选用的复合索引（原 migrations/add_notification_log_indexes.py）。"""
+
+DESCRIPTION = '通知日志复合索引'
+
+
+def upgrade(schema):
+    schema.add_index('notification_logs', 'idx_log_shop_type_status', 'shop_id, notify_type, notify_status, id')
+    schema.add_index('notification_logs', 'idx_log_shop_status', 'shop_id, notify_status, id')
+    schema.add_index('notification_logs', 'idx_log_type_status', 'notify_type, notify_status, id')
+    schema.add_index('notification_logs', 'idx_log_status', 'notify_status, id')
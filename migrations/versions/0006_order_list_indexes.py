@@ -0,0 +1,15 @@
+"""订单列表筛选用的索引，对应 app/services/order_query.py 中的筛选组合。
+
+执行后可用 python migrations/check_indexes.py 检查每种筛选组合的执行计划。
+"""
+
+DESCRIPTION = '订单列表索引'
+
+
+def upgrade(schema):
+    schema.add_index('orders', 'idx_jd_order', 'jd_order_no, shop_type')
+    schema.add_index('orders', 'idx_shop', 'shop_id, order_status')
+    schema.add_index('orders', 'idx_shop_create_time', 'shop_id, create_time')
+    schema.add_index('orders', 'idx_status_id', 'order_status, id')
+    schema.add_index('orders', 'idx_create_time', 'create_time')
+    schema.add_index('orders', 'idx_notified', 'notified, create_time')
@@ -0,0 +1,15 @@
+"""订单关键字搜索：充值账号索引和三元组倒排表，并为已有订单回填三元组。"""
+from app.extensions import db
+from app.services.order_search import rebuild_search_tokens
+
+DESCRIPTION = '订单搜索三元组表'
+
+
+def upgrade(schema):
+    schema.add_index('orders', 'idx_produce_account', 'produce_account')
+    schema.create_missing_tables()
+    if db.session.execute(db.text('SELECT 1 FROM order_search_tokens LIMIT 1')).first():
+        schema.log("✅ order_search_tokens 已有数据，跳过回填")
+        return
+    total = rebuild_search_tokens(log=schema.log)
+    schema.log(f"✅ 已为 {total} 个订单生成搜索三元组")
@@ -0,0 +1,13 @@
+"""订单统计汇总表，并按已有订单生成汇总数据。"""
+from app.extensions import db
+from app.services.order_stats import rebuild_order_stats_rollup
+
+DESCRIPTION = '订单统计汇总表'
+
+
+def upgrade(schema):
+    schema.create_missing_tables()
+    if db.session.execute(db.text('SELECT 1 FROM order_stats_rollup LIMIT 1')).first():
+        schema.log("✅ order_stats_rollup 已有数据，跳过重建")
+        return
+    rebuild_order_stats_rollup(log=schema.log)
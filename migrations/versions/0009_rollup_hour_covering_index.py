@@ -0,0 +1,21 @@
+"""统计接口按时间范围汇总全部店铺：idx_rollup_hour 改为覆盖索引。"""
+from sqlalchemy import inspect
+
+from app.extensions import db
+
+DESCRIPTION = '汇总表时间覆盖索引'
+
+COLUMNS = ['stat_hour', 'shop_id', 'order_count', 'amount']
+
+
+def upgrade(schema):
+    indexes = {i['name']: i['column_names'] for i in inspect(db.engine).get_indexes('order_stats_rollup')}
+    if indexes.get('idx_rollup_hour') == COLUMNS:
+        schema.log("✅ order_stats_rollup.idx_rollup_hour 已是覆盖索引")
+        return
+    if 'idx_rollup_hour' in indexes:
+        if schema.is_mysql:
+            schema.execute('ALTER TABLE order_stats_rollup DROP INDEX idx_rollup_hour')
+        else:
+            schema.execute('DROP INDEX idx_rollup_hour')
+    schema.add_index('order_stats_rollup', 'idx_rollup_hour', ', '.join(COLUMNS))
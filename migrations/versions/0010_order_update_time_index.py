@@ -0,0 +1,7 @@
+"""订单实时推送按 (update_time, id) 游标读取变化的订单（见 app/services/order_feed.py）。"""
+
+DESCRIPTION = '订单更新时间索引'
+
+
+def upgrade(schema):
+    schema.add_index('orders', 'idx_update_time_id', 'update_time, id')
@@ -0,0 +1,11 @@
+"""通知日志归档按 create_time 查找过期日志的范围（见 app/services/notification_archive.py）。"""
+
+DESCRIPTION = '通知日志创建时间索引'
+
+
+def upgrade(schema):
+    # 按旧版 init.sql 建表的库已有 idx_create_time，不再重复添加
+    if 'idx_create_time' in schema.index_names('notification_logs'):
+        schema.log("✅ notification_logs.idx_create_time 索引已存在")
+        return
+    schema.add_index('notification_logs', 'idx_log_create_time', 'create_time')
@@ -1,3 +1,4 @@
 #!/bin/bash
 pkill -f "gunicorn.*run:app"
+pkill -f "python worker.py"
 echo "✅ 应用已停止"
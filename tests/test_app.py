@@ -1,5 +1,12 @@
 import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+from sqlalchemy import event
 from app import create_app
 from app.extensions import db as _db
 from app.models.user import User, UserShopPermission
@@ -89,11 +96,61 @@ def card_order(db, shop):
     return o
 
 
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.received.append((self.path, json.loads(body) if body else None))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        payload = json.dumps(self.server.response_body).encode()
+        self.send_response(self.server.status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Local keep-alive HTTP server standing in for JD / Agiso / IM endpoints."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.received = []
+    server.status_code = 200
+    server.delay = 0
+    server.response_body = {'success': True, 'code': 0, 'errcode': 0}
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
 def login(client, username, password):
     return client.post('/login', data={'username': username, 'password': password},
                        follow_redirects=True)
 
 
+@contextmanager
+def count_queries(db):
+    """Collect SQL statements executed inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
 # ---- Model Tests ----
 
 class TestUserModel:
@@ -395,6 +452,1605 @@ class TestNotificationService:
         assert NotificationLog.query.count() == 0
 
 
+# ---- 通知队列测试 ----
+
+class TestNotificationQueue:
+    def _create_order(self, client, jd_order_no='JD_QUEUE_001'):
+        return client.post('/api/order/create',
+                           content_type='application/json',
+                           data=json.dumps({
+                               'shop_code': 'NOTIFY001',
+                               'jd_order_no': jd_order_no,
+                               'amount': 1000,
+                           }))
+
+    def test_create_order_enqueues_without_sending(self, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+
+        def fail_send(*args, **kwargs):
+            raise AssertionError('create_order must not send inline')
+
+        monkeypatch.setattr('app.services.notification_queue._do_send', fail_send)
+        resp = self._create_order(client)
+        assert json.loads(resp.data)['success'] is True
+        jobs = NotificationJob.query.all()
+        assert [j.notify_type for j in jobs] == ['dingtalk']
+        assert jobs[0].job_status == 0
+        assert NotificationLog.query.count() == 0
+
+    def test_create_order_notify_disabled_no_job(self, client, db, shop):
+        from app.models.notification_job import NotificationJob
+        client.post('/api/order/create', content_type='application/json',
+                    data=json.dumps({'shop_code': 'TEST001', 'jd_order_no': 'JD_Q2', 'amount': 100}))
+        assert NotificationJob.query.count() == 0
+
+    def test_process_jobs_success(self, client, db, shop_with_notify, monkeypatch):
+        from app.services.notification_queue import process_notification_jobs
+        from app.models.notification_job import NotificationJob
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: (True, '{"errcode":0}', None))
+        self._create_order(client)
+        assert process_notification_jobs() == 1
+        job = NotificationJob.query.one()
+        assert job.job_status == 2
+        log = NotificationLog.query.one()
+        assert log.notify_status == 1
+        assert Order.query.filter_by(jd_order_no='JD_QUEUE_001').one().notified == 1
+
+    def test_process_jobs_retry_then_fail(self, client, db, shop_with_notify, monkeypatch):
+        from datetime import datetime, timedelta
+        from app.services.notification_queue import process_notification_jobs, MAX_ATTEMPTS
+        from app.models.notification_job import NotificationJob
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: (False, '', 'boom'))
+        self._create_order(client)
+
+        process_notification_jobs()
+        job = NotificationJob.query.one()
+        assert job.job_status == 0
+        assert job.attempts == 1
+        assert job.next_run_time > datetime.utcnow()
+        assert NotificationLog.query.count() == 0
+
+        # 未到重试时间不会再次执行
+        assert process_notification_jobs() == 0
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            job.next_run_time = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            process_notification_jobs()
+
+        job = NotificationJob.query.one()
+        assert job.job_status == 3
+        assert job.attempts == MAX_ATTEMPTS
+        log = NotificationLog.query.one()
+        assert log.notify_status == 0
+        assert log.error_message == 'boom'
+
+
+# ---- 合并通知测试 ----
+
+class TestNotificationDigest:
+    def _push(self, client, count, start=0):
+        for i in range(start, start + count):
+            client.post('/api/order/create', content_type='application/json',
+                        data=json.dumps({'shop_code': 'NOTIFY001', 'jd_order_no': f'JD_DIGEST_{i}', 'amount': 100}))
+
+    def _enable(self, db, shop, window=60, max_orders=3):
+        shop.notify_digest_enabled = 1
+        shop.notify_digest_window = window
+        shop.notify_digest_max = max_orders
+        db.session.commit()
+
+    def test_waits_then_sends_one_message(self, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs
+        sent = []
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '{"errcode":0}', None))
+        self._enable(db, shop_with_notify)
+        self._push(client, 2)
+        assert {job.digest for job in NotificationJob.query.all()} == {1}
+
+        assert process_notification_jobs() == 0  # 未到等待时间也未攒够订单数
+        assert sent == []
+
+        self._push(client, 1, start=2)
+        assert process_notification_jobs() == 3
+        assert len(sent) == 1
+        assert '共3单' in sent[0]
+        assert all(f'JD_DIGEST_{i}' in sent[0] for i in range(3))
+
+        logs = NotificationLog.query.all()
+        assert len(logs) == 3
+        assert len({log.digest_id for log in logs}) == 1
+        assert logs[0].digest_id is not None
+        assert {log.notify_status for log in logs} == {1}
+        assert Order.query.filter_by(notified=1).count() == 3
+
+    def test_window_elapsed_sends_partial(self, client, db, shop_with_notify, monkeypatch):
+        from datetime import timedelta
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs
+        sent = []
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '', None))
+        self._enable(db, shop_with_notify, window=30, max_orders=20)
+        self._push(client, 2)
+        for job in NotificationJob.query.all():
+            job.create_time = datetime.utcnow() - timedelta(seconds=31)
+        db.session.commit()
+        assert process_notification_jobs() == 2
+        assert len(sent) == 1
+
+    def test_failed_digest_retries(self, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: (False, '', 'send too fast'))
+        self._enable(db, shop_with_notify, max_orders=2)
+        self._push(client, 2)
+        assert process_notification_jobs() == 2
+        jobs = NotificationJob.query.all()
+        assert {(job.job_status, job.attempts) for job in jobs} == {(0, 1)}
+        assert NotificationLog.query.count() == 0
+
+    def test_wecom_digest_split_by_bytes(self, client, db, shop_with_notify, monkeypatch):
+        from app.services.notification import MESSAGE_BYTE_LIMITS
+        from app.services.notification_queue import process_notification_jobs
+        sent = []
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '{"errcode":0}', None))
+        shop_with_notify.dingtalk_webhook = None
+        shop_with_notify.wecom_webhook = 'https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=test'
+        self._enable(db, shop_with_notify, max_orders=50)
+        for i in range(50):
+            client.post('/api/order/create', content_type='application/json',
+                        data=json.dumps({'shop_code': 'NOTIFY001', 'jd_order_no': f'JD_WECOM_{i:02d}', 'amount': 100,
+                                         'product_info': '王者荣耀点券充值'}))
+
+        assert process_notification_jobs() == 50
+        assert len(sent) > 1
+        assert all(len(message.encode('utf-8')) <= MESSAGE_BYTE_LIMITS['wecom'] for message in sent)
+        assert sorted(n for message in sent for n in range(50) if f'JD_WECOM_{n:02d}' in message) == list(range(50))
+        # 每个订单的日志记录实际发送的合并消息
+        logs = NotificationLog.query.all()
+        assert len(logs) == 50 and len({log.digest_id for log in logs}) == len(sent)
+        assert all('新订单通知（共' in json.loads(log.request_data)['message'] for log in logs)
+
+    def test_single_message_format_unchanged(self, app, db, shop_with_notify, order):
+        from app.services.notification import build_order_message
+        message = build_order_message(order, shop_with_notify)
+        assert message.startswith('### 📦 新订单通知\n\n**订单号：** JD001\n\n**店铺：** 通知店铺\n\n')
+        assert message.endswith('> 请及时处理订单')
+
+
+# ---- Webhook 限流测试 ----
+
+class TestWebhookLimiter:
+    WEBHOOK = 'https://oapi.dingtalk.com/robot/send?access_token=test'
+
+    def _push(self, client, count):
+        for i in range(count):
+            client.post('/api/order/create', content_type='application/json',
+                        data=json.dumps({'shop_code': 'NOTIFY001', 'jd_order_no': f'JD_RATE_{i}', 'amount': 100}))
+
+    def test_token_bucket(self):
+        from app.services.shared_state import SharedStateStore
+        from app.services.webhook_limiter import WebhookLimiter
+        limiter = WebhookLimiter(SharedStateStore(':memory:'), {'dingtalk': 60}, burst=2)
+        assert limiter.try_acquire(self.WEBHOOK, 'dingtalk') == 0
+        assert limiter.try_acquire(self.WEBHOOK, 'dingtalk') == 0
+        wait = limiter.try_acquire(self.WEBHOOK, 'dingtalk')
+        assert 0 < wait <= 1
+        # 不同 Webhook 各自一个桶
+        assert limiter.try_acquire(self.WEBHOOK + '2', 'dingtalk') == 0
+        state = limiter.states()[self.WEBHOOK]
+        assert (state['sent'], state['throttled']) == (2, 1)
+        assert limiter.acquire(self.WEBHOOK, 'dingtalk', max_wait=0) is False
+
+    def test_queue_defers_instead_of_dropping(self, app, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs, webhook_queue_stats
+        app.config['NOTIFY_RATE_BURST'] = 1
+        sent = []
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '', None))
+        self._push(client, 3)
+        assert process_notification_jobs() == 1
+        assert len(sent) == 1
+        waiting = NotificationJob.query.filter_by(job_status=0).all()
+        assert len(waiting) == 2
+        assert all(job.attempts == 0 and job.next_run_time > datetime.utcnow() for job in waiting)
+        assert NotificationLog.query.count() == 1
+
+        stats = webhook_queue_stats()
+        assert stats[0]['queued'] == 2
+        assert stats[0]['shops'] == ['NOTIFY001']
+        assert stats[0]['bucket']['throttled'] >= 1
+        assert stats[0]['webhook'] == 'https://oapi.dingtalk.com/robot/send?access_token=***'
+
+    def test_digest_deferred_when_throttled(self, app, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs
+        from app.services.webhook_limiter import get_webhook_limiter
+        app.config['NOTIFY_RATE_BURST'] = 1
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: (True, '', None))
+        shop_with_notify.notify_digest_enabled = 1
+        shop_with_notify.notify_digest_max = 2
+        db.session.commit()
+        get_webhook_limiter().try_acquire(shop_with_notify.dingtalk_webhook, 'dingtalk')
+        self._push(client, 2)
+        assert process_notification_jobs() == 0
+        assert all(job.job_status == 0 and job.next_run_time > datetime.utcnow()
+                   for job in NotificationJob.query.all())
+
+    def test_digest_flushed_after_disable_still_throttled(self, app, client, db, shop_with_notify, monkeypatch):
+        from app.models.notification_job import NotificationJob
+        from app.services.notification_queue import process_notification_jobs
+        from app.services.webhook_limiter import get_webhook_limiter
+        app.config['NOTIFY_RATE_BURST'] = 1
+        sent = []
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '', None))
+        shop_with_notify.notify_digest_enabled = 1
+        db.session.commit()
+        self._push(client, 2)
+        # 关闭合并通知后，已排队的合并任务立即发出，但仍要取令牌
+        shop_with_notify.notify_digest_enabled = 0
+        db.session.commit()
+        get_webhook_limiter().try_acquire(shop_with_notify.dingtalk_webhook, 'dingtalk')
+        assert process_notification_jobs() == 0
+        assert sent == []
+        assert all(job.job_status == 0 and job.next_run_time > datetime.utcnow()
+                   for job in NotificationJob.query.all())
+
+    def test_unclaimed_digest_returns_token(self, app, client, db, shop_with_notify, monkeypatch):
+        from app.services.notification_queue import process_notification_jobs
+        from app.services.webhook_limiter import get_webhook_limiter
+        app.config['NOTIFY_RATE_BURST'] = 1
+        shop_with_notify.notify_digest_enabled = 1
+        shop_with_notify.notify_digest_max = 2
+        db.session.commit()
+        self._push(client, 2)
+        # 任务都被其他 worker 抢先取走
+        monkeypatch.setattr('app.services.notification_queue._claim_job', lambda job_id: False)
+        assert process_notification_jobs() == 0
+        assert get_webhook_limiter().try_acquire(shop_with_notify.dingtalk_webhook, 'dingtalk') == 0
+
+    def test_admin_view(self, app, client, admin_user, shop_with_notify, monkeypatch):
+        monkeypatch.setattr('app.services.notification_queue._do_send',
+                            lambda notify_type, shop, message: (True, '', None))
+        self._push(client, 1)
+        login(client, 'admin', 'admin123')
+        data = json.loads(client.get('/system/webhook-limits').data)
+        assert data['webhooks'][0]['channel'] == 'dingtalk'
+        assert data['webhooks'][0]['queued'] == 1
+
+
+# ---- 通知日志归档测试 ----
+
+class TestNotificationLogArchive:
+    def _add_logs(self, db, order, shop, count, days_ago=0):
+        from datetime import timedelta
+        for i in range(count):
+            db.session.add(NotificationLog(order_id=order.id, shop_id=shop.id, notify_type='dingtalk',
+                                           notify_status=i % 2, request_data='{"message": "msg"}',
+                                           response_data='{"errcode":0}', error_message=None if i % 2 else 'boom',
+                                           create_time=datetime.utcnow() - timedelta(days=days_ago)))
+        db.session.commit()
+
+    def test_archive_moves_old_logs_in_chunks(self, app, db, order, shop):
+        from app.models.notification_log_archive import NotificationLogArchive
+        from app.services.notification_archive import archive_notification_logs
+        self._add_logs(db, order, shop, 5, days_ago=100)
+        self._add_logs(db, order, shop, 2)
+        assert archive_notification_logs(90, chunk_size=2, max_chunks=1) == 2
+        assert archive_notification_logs(90, chunk_size=2) == 3
+        assert NotificationLog.query.count() == 2
+        archived = NotificationLogArchive.query.order_by(NotificationLogArchive.id).all()
+        assert len(archived) == 5
+        assert archived[0].unpack() == {'request_data': '{"message": "msg"}', 'response_data': '{"errcode":0}',
+                                        'error_message': 'boom'}
+        assert archive_notification_logs(0) == 0
+
+    def test_archive_bounded_by_last_expired_id(self, app, db, order, shop):
+        from app.services.notification_archive import archive_notification_logs
+        self._add_logs(db, order, shop, 3, days_ago=100)
+        self._add_logs(db, order, shop, 2)
+        expired_ids = [log.id for log in NotificationLog.query.order_by(NotificationLog.id).limit(3)]
+        with count_queries(db) as statements:
+            assert archive_notification_logs(90, chunk_size=3) == 3
+        # 每批只读取过期日志的主键范围
+        selects = [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'notification_logs.id <=' in s]
+        assert selects
+        assert 'idx_log_create_time' in {i['name'] for i in db.inspect(db.engine).get_indexes('notification_logs')}
+        assert NotificationLog.query.filter(NotificationLog.id.in_(expired_ids)).count() == 0
+        assert NotificationLog.query.count() == 2
+        assert archive_notification_logs(90) == 0
+
+    def test_list_pages_by_id(self, app, client, db, admin_user, order, shop):
+        self._add_logs(db, order, shop, 25)
+        ids = [log.id for log in NotificationLog.query.order_by(NotificationLog.id.desc())]
+        login(client, 'admin', 'admin123')
+        html = client.get('/notification/').data.decode()
+        assert f'before_id={ids[19]}' in html
+        assert '上一页' not in html
+        html = client.get(f'/notification/?before_id={ids[19]}').data.decode()
+        assert '下一页' not in html
+        assert f'after_id={ids[20]}' in html
+        html = client.get(f'/notification/?after_id={ids[20]}&notify_status=1').data.decode()
+        assert '下一页' in html
+
+    def test_detail_falls_back_to_archive(self, app, client, db, admin_user, order, shop):
+        from app.services.notification_archive import archive_notification_logs
+        self._add_logs(db, order, shop, 1, days_ago=100)
+        log_id = NotificationLog.query.one().id
+        archive_notification_logs(90)
+        login(client, 'admin', 'admin123')
+        data = json.loads(client.get(f'/notification/detail/{log_id}').data)
+        assert data['id'] == log_id
+        assert data['response_data'] == '{"errcode":0}'
+
+
+# ---- 批量重发通知测试 ----
+
+class TestNotificationBulkResend:
+    def _orders_with_logs(self, db, shop, count):
+        orders = []
+        for i in range(count):
+            order = Order(order_no=f'ORD_RS_{i}', jd_order_no=f'JD_RS_{i}', shop_id=shop.id, shop_type=1,
+                          order_type=1, amount=100, quantity=1)
+            db.session.add(order)
+            orders.append(order)
+        db.session.flush()
+        for order in orders:
+            db.session.add(NotificationLog(order_id=order.id, shop_id=shop.id, notify_type='dingtalk',
+                                           notify_status=0, error_message='send too fast'))
+        db.session.commit()
+        return orders
+
+    def test_select_latest_unresolved_failures(self, app, db, shop_with_notify):
+        from app.services.notification_resend import select_failed_logs
+        orders = self._orders_with_logs(db, shop_with_notify, 3)
+        # 第一个订单再失败一次，只重发最近一次；第二个订单之后已发送成功
+        db.session.add(NotificationLog(order_id=orders[0].id, shop_id=shop_with_notify.id,
+                                       notify_type='dingtalk', notify_status=0))
+        db.session.add(NotificationLog(order_id=orders[1].id, shop_id=shop_with_notify.id,
+                                       notify_type='dingtalk', notify_status=1))
+        db.session.commit()
+        logs = select_failed_logs()
+        assert sorted(log.order_id for log in logs) == [orders[0].id, orders[2].id]
+        assert select_failed_logs(shop_ids=[shop_with_notify.id + 1]) == []
+        assert len(select_failed_logs(limit=1)) == 1
+
+    def test_bulk_resend_streams_progress(self, app, client, db, admin_user, shop_with_notify, monkeypatch):
+        from app.services.notification_resend import select_failed_logs
+        sent = []
+        monkeypatch.setattr('app.services.notification._do_send',
+                            lambda notify_type, shop, message: sent.append(message) or (True, '{"errcode":0}', None))
+        self._orders_with_logs(db, shop_with_notify, 5)
+        login(client, 'admin', 'admin123')
+        resp = client.post('/notification/bulk-resend', json={'shop_id': shop_with_notify.id})
+        events = [json.loads(line) for line in resp.data.decode().splitlines()]
+        assert events[0] == {'done': 0, 'total': 5, 'succeeded': 0}
+        assert [e['done'] for e in events[1:-1]] == [1, 2, 3, 4, 5]
+        assert events[-1] == {'finished': True, 'total': 5, 'succeeded': 5, 'failed': 0, 'skipped': 0}
+        assert len(sent) == 5
+        assert NotificationLog.query.filter_by(notify_status=1).count() == 5
+        assert select_failed_logs() == []
+
+    def test_bulk_resend_rejects_bad_date(self, app, client, admin_user):
+        login(client, 'admin', 'admin123')
+        resp = client.post('/notification/bulk-resend', json={'start_date': '2024/01/01'})
+        assert json.loads(resp.data)['success'] is False
+
+
+# ---- 订单幂等入库测试 ----
+
+class TestIdempotentIngest:
+    def _push(self, client, shop_code='NOTIFY001', jd_order_no='JD_DUP_001'):
+        resp = client.post('/api/order/create', content_type='application/json',
+                           data=json.dumps({'shop_code': shop_code, 'jd_order_no': jd_order_no,
+                                            'amount': 1000}))
+        return json.loads(resp.data)
+
+    def test_duplicate_push_returns_original(self, client, db, shop_with_notify):
+        from app.models.notification_job import NotificationJob
+        first = self._push(client)
+        second = self._push(client)
+        assert first['success'] is True and second['success'] is True
+        assert second['order_no'] == first['order_no']
+        assert second['duplicate'] is True
+        assert Order.query.filter_by(jd_order_no='JD_DUP_001').count() == 1
+        assert NotificationJob.query.count() == 1
+
+    def test_same_jd_order_no_other_shop(self, client, db, shop, shop_with_notify):
+        first = self._push(client, 'TEST001')
+        second = self._push(client, 'NOTIFY001')
+        assert first['order_no'] != second['order_no']
+        assert Order.query.filter_by(jd_order_no='JD_DUP_001').count() == 2
+
+    def test_missing_jd_order_no(self, client, shop):
+        resp = client.post('/api/order/create', content_type='application/json',
+                           data=json.dumps({'shop_code': 'TEST001', 'amount': 1000}))
+        assert resp.status_code == 400
+
+    def test_concurrent_duplicate_insert(self, app, db, shop, monkeypatch):
+        from app.services import order_ingest
+        existing = Order(order_no='ORD_EXISTING', jd_order_no='JD_RACE', shop_id=shop.id,
+                         shop_type=1, order_type=1, amount=100)
+        db.session.add(existing)
+        db.session.commit()
+
+        real_find = order_ingest.find_order_no
+        calls = []
+
+        def find_after_race(shop_id, jd_order_no):
+            calls.append(jd_order_no)
+            return None if len(calls) == 1 else real_find(shop_id, jd_order_no)
+
+        monkeypatch.setattr(order_ingest, 'find_order_no', find_after_race)
+        order_no, created = order_ingest.ingest_order(shop, {'jd_order_no': 'JD_RACE', 'amount': 100})
+        assert (order_no, created) == ('ORD_EXISTING', False)
+        assert Order.query.filter_by(jd_order_no='JD_RACE').count() == 1
+
+
+# ---- 批量订单接收测试 ----
+
+class TestBatchCreate:
+    def _batch(self, client, orders):
+        resp = client.post('/api/order/batch-create', content_type='application/json',
+                           data=json.dumps({'orders': orders}))
+        return resp, json.loads(resp.data)
+
+    def test_batch_create_mixed(self, client, db, shop, shop_with_notify):
+        from app.models.notification_job import NotificationJob
+        existing = Order(order_no='ORD_OLD', jd_order_no='JD_B_OLD', shop_id=shop.id,
+                         shop_type=1, order_type=1, amount=100)
+        db.session.add(existing)
+        db.session.commit()
+
+        resp, data = self._batch(client, [
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_B1', 'amount': 100},
+            {'shop_code': 'NOTIFY001', 'jd_order_no': 'JD_B2', 'amount': 200},
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_B_OLD', 'amount': 100},
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_B1', 'amount': 100},
+            {'shop_code': 'INVALID', 'jd_order_no': 'JD_B3', 'amount': 100},
+            {'shop_code': 'TEST001', 'amount': 100},
+        ])
+        assert resp.status_code == 200
+        results = data['results']
+        assert [r['success'] for r in results] == [True, True, True, True, False, False]
+        assert results[0]['duplicate'] is False
+        assert results[2]['order_no'] == 'ORD_OLD'
+        assert results[3]['order_no'] == results[0]['order_no']
+        assert results[3]['duplicate'] is True
+        assert Order.query.count() == 3
+        job = NotificationJob.query.one()
+        assert job.order_id == Order.query.filter_by(jd_order_no='JD_B2').one().id
+
+    def test_batch_create_verifies_each_sign(self, client, db):
+        from app.services.jd_game import generate_game_sign
+        db.session.add(Shop(shop_name='签名店', shop_code='SIGNB', shop_type=1,
+                            is_enabled=1, game_md5_secret='k'))
+        db.session.commit()
+        good = {'shop_code': 'SIGNB', 'jd_order_no': 'JD_S1', 'amount': 100}
+        good['sign'] = generate_game_sign({k: str(v) for k, v in good.items()}, 'k')
+        bad = {'shop_code': 'SIGNB', 'jd_order_no': 'JD_S2', 'amount': 100, 'sign': 'bad'}
+        _, data = self._batch(client, [good, bad])
+        assert data['results'][0]['success'] is True
+        assert data['results'][1]['message'] == '签名验证失败'
+        assert Order.query.count() == 1
+
+    def test_batch_create_malformed_item(self, client, shop):
+        resp, data = self._batch(client, [
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_M1', 'amount': 100},
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_M2', 'amount': 'abc'},
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_M3', 'amount': 100, 'quantity': None},
+            {'shop_code': 'TEST001', 'jd_order_no': 'JD_M4', 'amount': 300},
+        ])
+        assert resp.status_code == 200
+        results = data['results']
+        assert [r['success'] for r in results] == [True, False, False, True]
+        assert results[1] == {'index': 1, 'success': False, 'message': 'amount 必须为整数'}
+        assert results[2]['message'] == 'quantity 必须为整数'
+        assert {o.jd_order_no for o in Order.query.all()} == {'JD_M1', 'JD_M4'}
+
+    def test_batch_create_too_large(self, app, client, shop):
+        app.config['ORDER_BATCH_MAX_SIZE'] = 2
+        resp, _ = self._batch(client, [{'shop_code': 'TEST001', 'jd_order_no': f'JD{i}'} for i in range(3)])
+        assert resp.status_code == 400
+
+    def test_batch_create_invalid_body(self, client):
+        resp, _ = self._batch(client, [])
+        assert resp.status_code == 400
+
+
+# ---- 订单号生成器测试 ----
+
+def _generate_order_nos(worker_id, count):
+    from app.services.order_no import OrderNoGenerator
+    generator = OrderNoGenerator(worker_id)
+    return [generator.next() for _ in range(count)]
+
+
+class TestOrderNoGenerator:
+    def test_format(self):
+        from app.services.order_no import OrderNoGenerator
+        order_no = OrderNoGenerator(7).next()
+        assert order_no.startswith('ORD')
+        assert len(order_no) == 25
+        assert order_no[-5:-3] == '07'
+
+    def test_strictly_increasing(self):
+        numbers = _generate_order_nos(1, 20000)
+        assert all(a < b for a, b in zip(numbers, numbers[1:]))
+
+    def test_clock_rollback(self, monkeypatch):
+        from app.services import order_no
+        generator = order_no.OrderNoGenerator(1)
+        monkeypatch.setattr(order_no.time, 'time', lambda: 1700000000.5)
+        first = generator.next()
+        monkeypatch.setattr(order_no.time, 'time', lambda: 1700000000.0)
+        second = generator.next()
+        assert second > first
+
+    def test_sequence_overflow_borrows_next_ms(self, monkeypatch):
+        from app.services import order_no
+        generator = order_no.OrderNoGenerator(1)
+        monkeypatch.setattr(order_no.time, 'time', lambda: 1700000000.0)
+        numbers = [generator.next() for _ in range(order_no.MAX_SEQUENCE + 2)]
+        assert len(set(numbers)) == len(numbers)
+        assert numbers[-1][17:20] == '001'
+
+    def test_invalid_worker_id(self):
+        from app.services.order_no import OrderNoGenerator
+        with pytest.raises(ValueError):
+            OrderNoGenerator(100)
+
+    def test_unique_across_processes(self):
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            batches = list(pool.map(_generate_order_nos, range(4), [20000] * 4))
+        numbers = [n for batch in batches for n in batch]
+        assert len(set(numbers)) == len(numbers)
+
+    def test_module_generator_uses_env_worker_id(self, monkeypatch):
+        from app.services import order_no
+        monkeypatch.setenv('ORDER_NO_WORKER_ID', '42')
+        monkeypatch.setattr(order_no, '_generator_pid', None)
+        assert order_no.generate_order_no()[-5:-3] == '42'
+
+
+# ---- 对外 HTTP 客户端测试 ----
+
+class TestHttpClient:
+    def test_connection_reused(self, stub_server):
+        from app.services.http_client import HttpClient, host_of
+        client = HttpClient(pool_size=2)
+        for _ in range(3):
+            assert client.post(stub_server.url + '/callback', json={'a': 1}).status_code == 200
+        stats = client.stats()[host_of(stub_server.url)]
+        assert stats['requests'] == 3
+        assert stats['new_connections'] == 1
+        assert stats['reused_connections'] == 2
+        client.close()
+
+    def test_failure_counted(self):
+        import requests
+        from app.services.http_client import HttpClient
+        client = HttpClient(timeout=1)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.post('http://127.0.0.1:9/unreachable')
+        assert client.stats()['127.0.0.1:9']['errors'] == 1
+
+    def test_recreated_after_fork(self, app):
+        from app.services import http_client
+        first = http_client.get_http_client()
+        first.pid = -1  # 模拟 fork 后子进程中的继承对象
+        second = http_client.get_http_client()
+        assert second is not first
+        assert second.timeout == app.config['HTTP_TIMEOUT']
+
+    def test_callbacks_use_shared_client(self, app, shop, order, stub_server):
+        from app.services.http_client import get_http_stats, host_of
+        from app.services.jd_game import callback_game_direct_success
+        shop.game_direct_callback_url = stub_server.url + '/game/direct'
+        ok, _ = callback_game_direct_success(shop, order)
+        assert ok is True
+        assert stub_server.received[0][0] == '/game/direct'
+        assert get_http_stats()[host_of(stub_server.url)]['requests'] >= 1
+
+    def test_http_stats_endpoint(self, client, admin_user):
+        login(client, 'admin', 'admin123')
+        data = json.loads(client.get('/system/http-stats').data)
+        assert data['success'] is True
+        assert 'hosts' in data
+
+
+# ---- 京东回调发件箱测试 ----
+
+class TestCallbackOutbox:
+    def _use_stub(self, db, shop, stub_server):
+        shop.game_direct_callback_url = stub_server.url + '/jd/direct'
+        shop.game_card_callback_url = stub_server.url + '/jd/card'
+        db.session.commit()
+
+    def test_notify_success_enqueues_without_calling(self, client, db, admin_user, shop, order, stub_server):
+        from app.models.callback_outbox import CallbackOutbox
+        self._use_stub(db, shop, stub_server)
+        login(client, 'admin', 'admin123')
+        resp = client.post(f'/order/{order.id}/notify-success')
+        assert json.loads(resp.data)['success'] is True
+        assert stub_server.received == []
+        entry = CallbackOutbox.query.one()
+        assert entry.action == 'success'
+        assert entry.outbox_status == 0
+        assert entry.host == f'127.0.0.1:{stub_server.server_address[1]}'
+        order = db.session.get(Order, order.id)
+        assert order.order_status == 2
+        assert order.notify_status == 0
+
+        # 处理中的回调不能重复提交
+        resp = client.post(f'/order/{order.id}/notify-success')
+        assert json.loads(resp.data)['message'] == '回调已在处理中'
+
+    def test_notify_refund_enqueues(self, client, db, admin_user, shop, order):
+        from app.models.callback_outbox import CallbackOutbox
+        login(client, 'admin', 'admin123')
+        resp = client.post(f'/order/{order.id}/notify-refund')
+        assert json.loads(resp.data)['success'] is True
+        assert CallbackOutbox.query.one().action == 'refund'
+        assert db.session.get(Order, order.id).order_status == 4
+
+    def test_process_success(self, app, db, shop, order, stub_server):
+        from app.services.callback_outbox import enqueue_callback, process_callback_outbox
+        self._use_stub(db, shop, stub_server)
+        entry = enqueue_callback(order, shop, 'success')
+        db.session.commit()
+        assert process_callback_outbox() == 1
+        assert [path for path, _ in stub_server.received] == ['/jd/direct']
+        assert entry.outbox_status == 2
+        assert entry.attempts == 1
+        assert order.notify_status == 1
+        assert order.notify_time is not None
+
+    def test_failure_backoff_then_dead_letter(self, app, db, shop, order, stub_server):
+        from app.services.callback_outbox import enqueue_callback, process_callback_outbox
+        self._use_stub(db, shop, stub_server)
+        stub_server.response_body = {'success': False, 'message': '系统繁忙'}
+        app.config['CALLBACK_MAX_ATTEMPTS'] = 2
+        entry = enqueue_callback(order, shop, 'success')
+        db.session.commit()
+
+        assert process_callback_outbox() == 1
+        assert entry.outbox_status == 0
+        assert entry.attempts == 1
+        assert entry.last_error == '系统繁忙'
+        assert entry.next_run_time > datetime.utcnow()
+        assert process_callback_outbox() == 0  # 未到重试时间
+
+        entry.next_run_time = datetime.utcnow()
+        db.session.commit()
+        assert process_callback_outbox() == 1
+        assert entry.outbox_status == 3
+        assert order.notify_status == 2
+
+    def test_requeue_dead_letter(self, client, db, admin_user, shop, order):
+        from app.services.callback_outbox import enqueue_callback
+        entry = enqueue_callback(order, shop, 'refund')
+        entry.outbox_status = 3
+        entry.attempts = 8
+        db.session.commit()
+        login(client, 'admin', 'admin123')
+        items = json.loads(client.get('/system/callback-outbox').data)['items']
+        assert [item['id'] for item in items] == [entry.id]
+        resp = client.post(f'/system/callback-outbox/{entry.id}/retry')
+        assert json.loads(resp.data)['success'] is True
+        assert entry.outbox_status == 0
+        assert entry.attempts == 0
+
+    def test_backoff_delay_bounds(self):
+        from app.services.callback_outbox import backoff_delay
+        for attempts, expected in [(1, 5), (3, 20), (20, 600)]:
+            for _ in range(20):
+                assert expected / 2 <= backoff_delay(attempts, 5, 600) <= expected
+
+    def test_build_lanes_limits_per_host(self):
+        from types import SimpleNamespace
+        from app.services.callback_outbox import build_lanes
+        entries = [SimpleNamespace(id=i, host='slow:443') for i in range(5)]
+        entries += [SimpleNamespace(id=10, host='fast:443')]
+        lanes = build_lanes(entries, per_host_limit=2)
+        assert len(lanes) == 3
+        assert sorted(len(lane) for lane in lanes) == [1, 2, 3]
+        assert sorted(e.id for lane in lanes for e in lane) == [0, 1, 2, 3, 4, 10]
+
+
+# ---- 订单批量操作测试 ----
+
+class TestOrderBulkAction:
+    def _make_orders(self, db, shop, count):
+        orders = [Order(order_no=f'ORDB{i:03d}', jd_order_no=f'JDB{i:03d}', shop_id=shop.id,
+                        shop_type=1, order_type=1, amount=100, quantity=1) for i in range(count)]
+        db.session.add_all(orders)
+        db.session.commit()
+        return [o.id for o in orders]
+
+    def _bulk(self, client, action, order_ids):
+        return json.loads(client.post('/order/bulk-action', content_type='application/json',
+                                      data=json.dumps({'action': action, 'order_ids': order_ids})).data)
+
+    def test_bulk_success_concurrent(self, app, client, db, admin_user, shop, stub_server):
+        from app.models.callback_outbox import CallbackOutbox
+        shop.game_direct_callback_url = stub_server.url + '/jd/direct'
+        db.session.commit()
+        stub_server.delay = 0.3
+        order_ids = self._make_orders(db, shop, 8)
+        login(client, 'admin', 'admin123')
+
+        start = time.perf_counter()
+        data = self._bulk(client, 'success', order_ids)
+        elapsed = time.perf_counter() - start
+
+        # 默认配置下同一回调主机的 8 个调用并发执行
+        assert elapsed < 8 * 0.3 / 2
+        assert [r['order_id'] for r in data['results']] == order_ids
+        assert all(r['success'] for r in data['results'])
+        assert len(stub_server.received) == 8
+        assert {e.outbox_status for e in CallbackOutbox.query.all()} == {2}
+        assert {(o.order_status, o.notify_status) for o in Order.query.all()} == {(2, 1)}
+
+    def test_bulk_failure_left_for_retry(self, client, db, admin_user, shop, order, stub_server):
+        from app.models.callback_outbox import CallbackOutbox
+        shop.game_direct_callback_url = stub_server.url + '/jd/direct'
+        db.session.commit()
+        stub_server.response_body = {'success': False, 'message': '系统繁忙'}
+        login(client, 'admin', 'admin123')
+        data = self._bulk(client, 'refund', [order.id, 99999])
+        assert data['results'][0] == {'order_id': order.id, 'success': False, 'message': '系统繁忙（稍后自动重试）'}
+        assert data['results'][1]['message'] == '订单不存在'
+        entry = CallbackOutbox.query.one()
+        assert (entry.outbox_status, entry.attempts) == (0, 1)
+
+    def test_bulk_checks_permission(self, client, db, operator_user, shop, order):
+        login(client, 'operator', 'op123')
+        data = self._bulk(client, 'success', [order.id])
+        assert data['results'][0]['message'] == '无权限操作该订单'
+
+    def test_bulk_agiso_deliver(self, client, db, admin_user, shop, order):
+        login(client, 'admin', 'admin123')
+        data = self._bulk(client, 'agiso-deliver', [order.id])
+        assert data['results'][0] == {'order_id': order.id, 'success': False, 'message': '未启用阿奇索自动发货'}
+
+    def test_bulk_rejects_invalid_request(self, app, client, admin_user):
+        login(client, 'admin', 'admin123')
+        assert self._bulk(client, 'delete', [1])['message'] == '不支持的操作'
+        app.config['ORDER_BULK_MAX_SIZE'] = 2
+        assert self._bulk(client, 'success', [1, 2, 3])['success'] is False
+
+
+# ---- 熔断器测试 ----
+
+class TestCircuitBreaker:
+    def test_opens_after_failures_and_fails_fast(self, app, stub_server):
+        from app.services import http_client
+        from app.services.circuit_breaker import CircuitOpenError
+        app.config['BREAKER_MIN_REQUESTS'] = 2
+        stub_server.status_code = 500
+        for _ in range(2):
+            assert http_client.post(stub_server.url + '/cb', json={}).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            http_client.post(stub_server.url + '/cb', json={})
+        assert len(stub_server.received) == 2
+        host = http_client.host_of(stub_server.url)
+        assert http_client.get_http_stats()[host]['skipped'] >= 1
+
+    def test_half_open_probe_closes(self, app, stub_server):
+        from app.services import http_client
+        from app.services.circuit_breaker import get_circuit_breaker
+        app.config['BREAKER_MIN_REQUESTS'] = 1
+        app.config['BREAKER_OPEN_SECONDS'] = 0
+        stub_server.status_code = 500
+        http_client.post(stub_server.url + '/cb', json={})
+        assert get_circuit_breaker().states()[0]['state'] == 'open'
+        stub_server.status_code = 200
+        http_client.post(stub_server.url + '/cb', json={})  # 探测请求
+        assert get_circuit_breaker().states()[0]['state'] == 'closed'
+        assert len(stub_server.received) == 2
+
+    def test_slow_calls_open(self, app, stub_server):
+        from app.services import http_client
+        from app.services.circuit_breaker import get_circuit_breaker
+        app.config['BREAKER_MIN_REQUESTS'] = 1
+        app.config['BREAKER_SLOW_CALL_SECONDS'] = 0.05
+        stub_server.delay = 0.1
+        http_client.post(stub_server.url + '/cb', json={})
+        assert get_circuit_breaker().states()[0]['state'] == 'open'
+
+    def test_state_shared_between_processes(self, tmp_path):
+        from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+        from app.services.shared_state import SharedStateStore
+        path = str(tmp_path / 'state.db')
+        first = CircuitBreaker(SharedStateStore(path), min_requests=1)
+        second = CircuitBreaker(SharedStateStore(path), min_requests=1)
+        first.after_call('jd.example.com:443', False, 0.1, error='ConnectTimeout')
+        with pytest.raises(CircuitOpenError):
+            second.before_call('jd.example.com:443')
+        assert first.states()[0]['skipped'] == 1
+
+    def test_admin_view_and_reset(self, app, client, admin_user):
+        from app.services.circuit_breaker import get_circuit_breaker
+        get_circuit_breaker().after_call('jd.example.com:443', False, 0.1, error='HTTP 502')
+        login(client, 'admin', 'admin123')
+        hosts = json.loads(client.get('/system/circuit-breakers').data)['hosts']
+        assert hosts[0]['host'] == 'jd.example.com:443'
+        assert hosts[0]['failures'] == 1
+        resp = client.post('/system/circuit-breakers/jd.example.com:443/reset')
+        assert json.loads(resp.data)['success'] is True
+        assert json.loads(client.get('/system/circuit-breakers').data)['hosts'] == []
+
+    def test_outbox_defers_blocked_host(self, app, db, shop, order, stub_server):
+        from app.services.callback_outbox import enqueue_callback, process_callback_outbox
+        from app.services.circuit_breaker import get_circuit_breaker
+        shop.game_direct_callback_url = stub_server.url + '/jd/direct'
+        entry = enqueue_callback(order, shop, 'success')
+        db.session.commit()
+        breaker = get_circuit_breaker()
+        breaker.min_requests = 1
+        breaker.after_call(entry.host, False, 0.1)
+        assert process_callback_outbox() == 0
+        assert stub_server.received == []
+        assert entry.attempts == 0
+        assert entry.next_run_time > datetime.utcnow()
+
+
+# ---- 数据库迁移与索引检查测试 ----
+
+class TestMigrations:
+    def test_upgrade_registers_and_is_idempotent(self, app, db):
+        from migrations.migrate import applied_versions, load_versions, upgrade
+        db.session.execute(db.text('DROP INDEX idx_status_id'))
+        db.session.commit()
+        logs = []
+        done = upgrade(log=logs.append)
+        assert done == [version for version, _ in load_versions()]
+        assert '✅ orders.idx_status_id 索引添加成功' in logs
+        assert set(applied_versions()) == set(done)
+        assert upgrade(log=logs.append) == []
+
+    def test_add_column_strips_mysql_comment(self, app, db):
+        from migrations.migrate import Schema
+        db.session.execute(db.text('CREATE TABLE scratch (id INTEGER PRIMARY KEY)'))
+        schema = Schema(log=lambda message: None)
+        schema.add_column('scratch', 'flag', "TINYINT DEFAULT 0 COMMENT '标记'")
+        schema.add_column('scratch', 'flag', "TINYINT DEFAULT 0 COMMENT '标记'")
+        assert schema.has_column('scratch', 'flag')
+
+    def test_order_list_filters_use_indexes(self, app, db):
+        from app.services.order_query import explain_order_list
+        results = explain_order_list()
+        assert len(results) == 2 ** 7 + 6
+        assert [r for r in results if not r['uses_index']] == []
+
+    def test_check_detects_missing_index(self, app, db):
+        from app.services.order_query import explain_order_list
+        db.session.execute(db.text('DROP INDEX idx_status_id'))
+        db.session.commit()
+        failed = [r for r in explain_order_list() if not r['uses_index']]
+        assert failed
+        assert all('order_status' in r['filters'] for r in failed)
+
+    def test_order_list_still_filters(self, client, db, admin_user, order, card_order):
+        login(client, 'admin', 'admin123')
+        html = client.get('/order/?order_type=2').data.decode()
+        assert 'JD002' in html and 'JD001' not in html
+
+
+# ---- 订单列表游标翻页测试 ----
+
+class TestOrderKeysetPagination:
+    def _orders(self, db, shop, count):
+        db.session.add_all([Order(order_no=f'ORD_KS_{i}', jd_order_no=f'JD_KS_{i:03d}', shop_id=shop.id, shop_type=1,
+                                  order_type=1, amount=100, quantity=1) for i in range(count)])
+        db.session.commit()
+        return [o.id for o in Order.query.order_by(Order.id.desc())]
+
+    def test_keyset_page(self, app, db, shop):
+        from app.services.order_query import build_order_list_query, keyset_page
+        ids = self._orders(db, shop, 45)
+        query = build_order_list_query({})
+        first = keyset_page(query)
+        assert [o.id for o in first.items] == ids[:20]
+        assert (first.has_prev, first.has_next) == (False, True)
+        last = keyset_page(query, before_id=ids[39])
+        assert [o.id for o in last.items] == ids[40:]
+        assert (last.has_prev, last.has_next) == (True, False)
+        back = keyset_page(query, after_id=ids[20])
+        assert [o.id for o in back.items] == ids[:20]
+        assert (back.has_prev, back.has_next) == (False, True)
+
+    def test_approximate_count_capped_and_cached(self, app, db, shop):
+        from app.services.order_query import approximate_order_count
+        self._orders(db, shop, 15)
+        assert approximate_order_count({}) == (15, False)
+        app.config['ORDER_COUNT_LIMIT'] = 10
+        assert approximate_order_count({'shop_id': shop.id}) == (10, True)
+        with count_queries(db) as statements:
+            assert approximate_order_count({}) == (15, False)
+        assert statements == []
+
+    def test_list_links(self, client, db, admin_user, shop):
+        ids = self._orders(db, shop, 25)
+        login(client, 'admin', 'admin123')
+        html = client.get(f'/order/?shop_id={shop.id}').data.decode()
+        assert '约 25 条订单' in html
+        assert f'before_id={ids[19]}' in html
+        assert '第 1 页 / 约 2 页' in html
+        html = client.get(f'/order/?shop_id={shop.id}&before_id={ids[19]}&page=2').data.decode()
+        assert 'JD_KS_000' in html and 'JD_KS_024' not in html
+        assert f'after_id={ids[20]}' in html
+        assert '第 2 页' in html and '下一页' not in html
+
+
+# ---- 订单列表查询次数测试 ----
+
+class TestOrderListQueries:
+    def _orders(self, db, shops, count, start=0):
+        db.session.add_all([Order(order_no=f'ORD_NQ_{i}', jd_order_no=f'JD_NQ_{i:03d}', shop_id=shops[i % len(shops)].id,
+                                  shop_type=1, order_type=2, amount=100, quantity=1, product_info='商品' * 200,
+                                  card_info='[{"card_no": "SECRET"}]') for i in range(start, start + count)])
+        db.session.commit()
+
+    def _page_statements(self, client, db):
+        from flask import g
+        # 测试中整个用例共用一个应用上下文，清掉上一个请求留下的用户，每次都经过 user_loader
+        g.pop('_login_user', None)
+        client.get('/order/')
+        g.pop('_login_user', None)
+        with count_queries(db) as statements:
+            html = client.get('/order/').data.decode()
+        return html, statements
+
+    def test_constant_queries_admin(self, client, db, admin_user, shop, shop_with_notify):
+        login(client, 'admin', 'admin123')
+        self._orders(db, [shop, shop_with_notify], 2)
+        html, few = self._page_statements(client, db)
+        assert '通知店铺' in html and '测试店铺' in html
+        self._orders(db, [shop, shop_with_notify], 30, start=2)
+        html, many = self._page_statements(client, db)
+        assert 'JD_NQ_031' in html and 'JD_NQ_011' not in html
+        assert len(many) == len(few)
+        assert not any('card_info' in statement or 'FROM shops' in statement for statement in many)
+
+    def test_constant_queries_operator(self, client, db, operator_user, shop, shop_with_notify):
+        from app.models.user import UserShopPermission
+        db.session.add_all([UserShopPermission(user_id=operator_user.id, shop_id=shop.id)])
+        db.session.commit()
+        login(client, 'operator', 'op123')
+        self._orders(db, [shop, shop_with_notify], 2)
+        html, few = self._page_statements(client, db)
+        self._orders(db, [shop, shop_with_notify], 30, start=2)
+        html, many = self._page_statements(client, db)
+        assert 'JD_NQ_030' in html and 'JD_NQ_031' not in html
+        assert len(many) == len(few)
+        assert not any('user_shop_permissions' in statement or 'FROM users' in statement for statement in many)
+
+    def test_product_summary_truncated(self, client, db, admin_user, shop):
+        from app.services.order_query import PRODUCT_SUMMARY_LENGTH
+        login(client, 'admin', 'admin123')
+        self._orders(db, [shop], 1)
+        html = client.get('/order/').data.decode()
+        assert f'title="{"商品" * (PRODUCT_SUMMARY_LENGTH // 2)}"' in html
+
+
+# ---- 订单关键字搜索测试 ----
+
+class TestOrderSearch:
+    def _orders(self, db, shop):
+        from app.services.order_search import add_search_tokens
+        orders = [Order(order_no=f'ORD_S_{i}', jd_order_no=f'JD2024{i:04d}', shop_id=shop.id, shop_type=1,
+                        order_type=1, amount=100, quantity=1, produce_account=account)
+                  for i, account in enumerate(['13800001111', 'player_abc', 'Player_XYZ'])]
+        db.session.add_all(orders)
+        db.session.flush()
+        add_search_tokens(orders)
+        db.session.commit()
+        return orders
+
+    def _search(self, keyword, mode=None):
+        from app.services.order_query import build_order_list_query
+        filters = {'keyword': keyword, 'keyword_mode': mode} if mode else {'keyword': keyword}
+        return sorted(o.order_no for o in build_order_list_query(filters))
+
+    def test_ngrams(self):
+        from app.services.order_search import ngrams
+        assert ngrams('AbCd') == {'abc', 'bcd'}
+        assert ngrams('ab') == set() and ngrams(None) == set()
+
+    def test_modes(self, app, db, shop):
+        self._orders(db, shop)
+        assert self._search('JD20240001') == ['ORD_S_1']
+        assert self._search('ORD_S_2') == ['ORD_S_2']
+        assert self._search('JD2024*') == ['ORD_S_0', 'ORD_S_1', 'ORD_S_2']
+        assert self._search('0001111') == ['ORD_S_0']
+        assert self._search('player') == ['ORD_S_1', 'ORD_S_2']
+        assert self._search('er_x') == ['ORD_S_2']
+        # 三元组都命中但不相邻
+        assert self._search('abc_player') == []
+        assert self._search('JD') == ['ORD_S_0', 'ORD_S_1', 'ORD_S_2']
+        assert self._search('%', 'substring') == []
+
+    def test_tokens_written_on_ingest(self, client, db, shop):
+        from app.models.order_search_token import OrderSearchToken
+        client.post('/api/order/create', content_type='application/json',
+                    data=json.dumps({'shop_code': 'TEST001', 'jd_order_no': 'JD_ONE_77', 'amount': 100,
+                                     'produce_account': 'acct_single'}))
+        client.post('/api/order/batch-create', content_type='application/json',
+                    data=json.dumps({'orders': [
+                        {'shop_code': 'TEST001', 'jd_order_no': 'JD_BATCH_88', 'amount': 100,
+                         'produce_account': 'acct_batch'},
+                    ]}))
+        assert OrderSearchToken.query.filter_by(token='_77').count() == 1
+        assert self._search('ch_88') and self._search('single')
+        assert self._search('cct_') == sorted(o.order_no for o in Order.query)
+
+    def test_rebuild(self, app, db, shop):
+        from app.models.order_search_token import OrderSearchToken
+        from app.services.order_search import rebuild_search_tokens
+        self._orders(db, shop)
+        before = OrderSearchToken.query.count()
+        OrderSearchToken.query.filter(OrderSearchToken.order_id != Order.query.first().id).delete()
+        db.session.commit()
+        assert rebuild_search_tokens(chunk_size=2) == 3
+        assert OrderSearchToken.query.count() == before
+
+    def test_list_keyword_param(self, client, db, admin_user, shop):
+        self._orders(db, shop)
+        login(client, 'admin', 'admin123')
+        html = client.get('/order/?keyword=XYZ').data.decode()
+        assert 'JD20240002' in html and 'JD20240001' not in html
+        html = client.get('/order/?jd_order_no=JD20240001').data.decode()
+        assert 'JD20240001' in html and 'JD20240002' not in html
+
+    def test_keyword_searches_use_indexes(self, app, db):
+        from app.services.order_query import explain_order_list
+        results = [r for r in explain_order_list() if r['filters'][:1] and r['filters'][0].startswith('keyword:')]
+        assert len(results) == 6
+        assert [r for r in results if not r['uses_index']] == []
+
+
+# ---- 店铺缓存测试 ----
+
+class TestShopCache:
+    def test_lookup_by_code_warm_no_queries(self, app, db, shop):
+        from app.services.shop_cache import get_shop_by_code
+        assert get_shop_by_code('TEST001').id == shop.id
+        with count_queries(db) as statements:
+            cached = get_shop_by_code('TEST001')
+        assert cached.shop_name == '测试店铺'
+        assert statements == []
+
+    def test_create_order_uses_cache(self, client, db, shop):
+        from app.services.shop_cache import get_shop_by_code
+        get_shop_by_code('TEST001')
+        with count_queries(db) as statements:
+            client.post('/api/order/create', content_type='application/json',
+                        data=json.dumps({'shop_code': 'TEST001', 'jd_order_no': 'JD_CACHE', 'amount': 100}))
+        assert not [sql for sql in statements if 'FROM shops' in sql]
+
+    def test_disabled_shop_rejected(self, client, db, shop):
+        shop.is_enabled = 0
+        db.session.commit()
+        resp = client.post('/api/order/create', content_type='application/json',
+                           data=json.dumps({'shop_code': 'TEST001', 'jd_order_no': 'JD_OFF', 'amount': 100}))
+        assert json.loads(resp.data)['success'] is False
+
+    def test_shop_edit_invalidates(self, client, admin_user, shop):
+        from app.services.shop_cache import get_shop_by_code
+        assert get_shop_by_code('TEST001').shop_type == 1
+        login(client, 'admin', 'admin123')
+        client.post(f'/shop/edit/{shop.id}', data={
+            'shop_name': '修改后店铺', 'shop_type': '2', 'is_enabled': '1',
+            'general_md5_secret': 'new_secret',
+        })
+        cached = get_shop_by_code('TEST001')
+        assert cached.shop_type == 2
+        assert cached.general_md5_secret == 'new_secret'
+
+    def test_other_worker_sees_version_bump(self, app, db, shop):
+        from app.services.shop_cache import ShopDirectory, invalidate_shops
+        other_worker = ShopDirectory(ttl=300, version_check_interval=0)
+        assert other_worker.get_by_code('TEST001').shop_name == '测试店铺'
+
+        shop.shop_name = '新名称'
+        db.session.commit()
+        assert other_worker.get_by_code('TEST001').shop_name == '测试店铺'
+
+        invalidate_shops()
+        assert other_worker.get_by_code('TEST001').shop_name == '新名称'
+
+
+# ---- 登录用户缓存测试 ----
+
+class TestUserCache:
+    def _operator(self, db, operator_user, shop):
+        db.session.add(UserShopPermission(user_id=operator_user.id, shop_id=shop.id))
+        db.session.commit()
+        return operator_user.id
+
+    def test_warm_load_no_queries(self, app, db, operator_user, shop):
+        from app.services.user_cache import load_cached_user
+        user_id = self._operator(db, operator_user, shop)
+        assert load_cached_user(user_id).get_permitted_shop_ids() == [shop.id]
+        with count_queries(db) as statements:
+            user = load_cached_user(user_id)
+            assert user.has_shop_permission(shop.id) and not user.has_shop_permission(shop.id + 1)
+            assert (user.username, user.is_admin, user.is_active) == ('operator', False, True)
+        assert statements == []
+        assert load_cached_user(99999) is None
+
+    def test_edit_and_delete_invalidate(self, client, db, admin_user, operator_user, shop, shop_with_notify):
+        from app.services.user_cache import load_cached_user
+        user_id = self._operator(db, operator_user, shop)
+        assert load_cached_user(user_id).get_permitted_shop_ids() == [shop.id]
+        login(client, 'admin', 'admin123')
+        client.post(f'/user/edit/{user_id}', data={'name': '改名', 'role': 'operator',
+                                                   'shop_ids': [str(shop_with_notify.id)]})
+        user = load_cached_user(user_id)
+        assert user.name == '改名' and user.get_permitted_shop_ids() == [shop_with_notify.id]
+        client.post(f'/user/delete/{user_id}')
+        assert load_cached_user(user_id) is None
+
+    def test_other_worker_change_seen_after_version_check(self, app, db, operator_user, shop):
+        from app.services.cache_version import bump_cache_version
+        from app.services.user_cache import get_user_directory, load_cached_user
+        user_id = self._operator(db, operator_user, shop)
+        get_user_directory().version_check_interval = 0
+        load_cached_user(user_id)
+        UserShopPermission.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        assert load_cached_user(user_id).get_permitted_shop_ids() == [shop.id]
+        bump_cache_version('user')
+        assert load_cached_user(user_id).get_permitted_shop_ids() == []
+
+
+# ---- 订单统计汇总表测试 ----
+
+class TestOrderStatsRollup:
+    def _rollup(self):
+        from app.models.order_stats_rollup import OrderStatsRollup
+        return sorted((r.shop_id, r.stat_hour, r.order_status, r.order_type, r.order_count, r.amount)
+                      for r in OrderStatsRollup.query if r.order_count or r.amount)
+
+    def test_incremental_matches_rebuild(self, client, db, shop, shop_with_notify):
+        from sqlalchemy.orm import load_only
+        from app.services.order_stats import rebuild_order_stats_rollup
+        client.post('/api/order/create', content_type='application/json',
+                    data=json.dumps({'shop_code': 'TEST001', 'jd_order_no': 'JD_RU_1', 'amount': 100}))
+        client.post('/api/order/batch-create', content_type='application/json',
+                    data=json.dumps({'orders': [
+                        {'shop_code': 'TEST001', 'jd_order_no': 'JD_RU_2', 'amount': 200},
+                        {'shop_code': 'NOTIFY001', 'jd_order_no': 'JD_RU_3', 'amount': 300, 'order_type': 2},
+                    ]}))
+        db.session.add(Order(order_no='ORD_RU_4', jd_order_no='JD_RU_4', shop_id=shop.id, shop_type=1, order_type=1,
+                             order_status=1, amount=400, create_time=datetime(2024, 1, 1, 8, 30)))
+        db.session.commit()
+
+        Order.query.filter_by(jd_order_no='JD_RU_1').one().order_status = 2
+        Order.query.options(load_only(Order.id)).filter_by(jd_order_no='JD_RU_3').one().order_status = 4
+        db.session.commit()
+        db.session.delete(Order.query.filter_by(jd_order_no='JD_RU_2').one())
+        db.session.commit()
+
+        incremental = self._rollup()
+        assert (shop.id, datetime(2024, 1, 1, 8), 1, 1, 1, 400) in incremental
+        assert sum(row[4] for row in incremental) == 3
+        rebuild_order_stats_rollup()
+        assert self._rollup() == incremental
+
+    def test_statistics_page_reads_rollup_only(self, client, db, admin_user, shop, shop_with_notify):
+        now = datetime.utcnow()
+        db.session.add_all([
+            Order(order_no='ORD_ST_1', jd_order_no='JD_ST_1', shop_id=shop.id, shop_type=1, order_type=1,
+                  order_status=2, amount=1000, create_time=now),
+            Order(order_no='ORD_ST_2', jd_order_no='JD_ST_2', shop_id=shop.id, shop_type=1, order_type=1,
+                  order_status=0, amount=500, create_time=now),
+            Order(order_no='ORD_ST_3', jd_order_no='JD_ST_3', shop_id=shop_with_notify.id, shop_type=1,
+                  order_type=2, order_status=1, amount=250, create_time=now - timedelta(days=30)),
+        ])
+        db.session.commit()
+        login(client, 'admin', 'admin123')
+        client.get('/statistics/')
+        with count_queries(db) as statements:
+            html = client.get('/statistics/').data.decode()
+        assert not any('FROM orders' in statement for statement in statements)
+        assert '¥17.50' in html and '¥15.00' in html and '¥2.50' in html
+        assert f"<td>{now.strftime('%m-%d')}</td>" in html
+
+
+# ---- 统计页缓存测试 ----
+
+class TestStatsCache:
+    def _cache(self, **kwargs):
+        from app.services.shared_state import SharedStateStore
+        from app.services.stats_cache import StatsCache
+        return StatsCache(SharedStateStore(':memory:'), **kwargs)
+
+    def test_fresh_then_stale_while_revalidate(self):
+        from app.services.stats_cache import stats_params
+        cache = self._cache(ttl=60)
+        calls, background = [], []
+
+        def compute(params):
+            calls.append(params)
+            return {'n': len(calls)}
+
+        params = stats_params(7)
+        assert cache.get(params, compute, background.append) == ({'n': 1}, 0.0)
+        payload, age = cache.get(params, compute, background.append)
+        assert payload == {'n': 1} and age < 60 and background == []
+
+        cache.ttl = 0
+        assert cache.get(params, compute, background.append)[0] == {'n': 1}
+        # 后台重算尚未完成时，其他请求不再重复启动
+        assert cache.get(params, compute, background.append)[0] == {'n': 1}
+        assert background == [params] and len(calls) == 1
+        assert cache.refresh(params, compute, claimed=True) == {'n': 2}
+        assert cache.get(stats_params(7), compute, background.append)[0] == {'n': 2}
+
+    def test_keys_by_params_and_scope(self):
+        from app.services.stats_cache import stats_params
+        cache = self._cache()
+        compute = lambda params: {'params': params}
+        assert cache.get(stats_params(7, [2, 1]), compute)[0]['params']['shop_ids'] == [1, 2]
+        assert cache.get(stats_params(7, [1, 2]), lambda params: {'other': True})[0]['params']['days'] == 7
+        assert cache.get(stats_params(14), compute)[0]['params'] == {'days': 14, 'shop_ids': None}
+
+    def test_refresh_active_drops_idle_keys(self):
+        from app.services.stats_cache import stats_params
+        cache = self._cache(max_idle=3600)
+        compute = lambda params: {'days': params['days']}
+        cache.get(stats_params(7), compute)
+        cache.get(stats_params(14), compute)
+        with cache.store.transaction() as conn:
+            conn.execute('UPDATE stats_cache SET accessed_at = 0 WHERE params LIKE ?', ('%14%',))
+        assert cache.refresh_active(compute) == 1
+        assert [row['params'] for row in cache.store.query('SELECT params FROM stats_cache')] == \
+            ['{"days": 7, "shop_ids": null}']
+
+    def test_page_served_from_cache(self, client, db, admin_user, shop):
+        login(client, 'admin', 'admin123')
+        assert '数据更新于 0 秒前' in client.get('/statistics/').data.decode()
+        db.session.add(Order(order_no='ORD_SC_1', jd_order_no='JD_SC_1', shop_id=shop.id, shop_type=1,
+                             order_type=1, amount=100))
+        db.session.commit()
+        html = client.get('/statistics/?days=14').data.decode()
+        assert '近14天订单趋势' in html and '<div class="stat-value">1</div>' in html
+        with count_queries(db) as statements:
+            client.get('/statistics/?days=14')
+        assert statements == []
+
+
+# ---- 统计时间序列接口测试 ----
+
+class TestStatsSeries:
+    def _orders(self, db, shop, shop_with_notify):
+        # 2024-01-31 16:30 UTC 为上海时间 2024-02-01 00:30
+        db.session.add_all([
+            Order(order_no='ORD_TS_1', jd_order_no='JD_TS_1', shop_id=shop.id, shop_type=1, order_type=1,
+                  amount=100, create_time=datetime(2024, 1, 31, 15, 59)),
+            Order(order_no='ORD_TS_2', jd_order_no='JD_TS_2', shop_id=shop.id, shop_type=1, order_type=1,
+                  amount=200, create_time=datetime(2024, 1, 31, 16, 30)),
+            Order(order_no='ORD_TS_3', jd_order_no='JD_TS_3', shop_id=shop_with_notify.id, shop_type=1,
+                  order_type=1, amount=400, create_time=datetime(2024, 3, 2, 1, 0)),
+        ])
+        db.session.commit()
+
+    def test_series_buckets_in_timezone(self, app, db, shop, shop_with_notify):
+        from datetime import date
+        from zoneinfo import ZoneInfo
+        from app.services.order_stats import order_time_series
+        self._orders(db, shop, shop_with_notify)
+        shanghai = ZoneInfo('Asia/Shanghai')
+        ids = [shop.id, shop_with_notify.id]
+        daily = order_time_series(ids, date(2024, 1, 31), date(2024, 2, 1), 'day', shanghai)
+        assert daily == {'buckets': ['2024-01-31', '2024-02-01'], 'count': [1, 1], 'amount': [100, 200]}
+        hourly = order_time_series(ids, date(2024, 2, 1), date(2024, 2, 1), 'hour', shanghai)
+        assert len(hourly['buckets']) == 24 and hourly['buckets'][0] == '2024-02-01 00:00'
+        assert hourly['count'][0] == 1 and sum(hourly['count']) == 1
+        monthly = order_time_series(ids, date(2024, 1, 1), date(2024, 4, 30), 'month', shanghai)
+        assert monthly == {'buckets': ['2024-01', '2024-02', '2024-03', '2024-04'],
+                           'count': [1, 1, 1, 0], 'amount': [100, 200, 400, 0]}
+        utc_daily = order_time_series(ids, date(2024, 1, 31), date(2024, 2, 1), 'day')
+        assert utc_daily['count'] == [2, 0]
+        with pytest.raises(ValueError):
+            order_time_series(ids, date(2024, 1, 1), date(2024, 1, 2), 'day', ZoneInfo('Asia/Kolkata'))
+
+    def test_series_api(self, client, db, admin_user, shop, shop_with_notify):
+        self._orders(db, shop, shop_with_notify)
+        login(client, 'admin', 'admin123')
+        data = json.loads(client.get(f'/statistics/api/series?shop_ids={shop_with_notify.id}'
+                                     '&start=2024-03-01&end=2024-03-31&granularity=month').data)
+        assert data['success'] and data['timezone'] == 'Asia/Shanghai'
+        assert (data['buckets'], data['count'], data['total_amount']) == (['2024-03'], [1], 400)
+        resp = client.get('/statistics/api/series?start=2024-01-01&end=2024-12-31&granularity=hour')
+        assert resp.status_code == 400
+        assert client.get('/statistics/api/series?tz=Mars/Base').status_code == 400
+        assert client.get('/statistics/api/series?granularity=week').status_code == 400
+        assert len(json.loads(client.get('/statistics/api/series').data)['buckets']) == 7
+        everything = json.loads(client.get('/statistics/api/series?start=2024-01-01&end=2024-03-31'
+                                           '&granularity=month').data)
+        assert everything['count'] == [1, 1, 1]
+        from app.services.order_stats import remove_shop_from_rollup
+        remove_shop_from_rollup(shop_with_notify.id)
+        db.session.commit()
+        remaining = json.loads(client.get('/statistics/api/series?start=2024-01-01&end=2024-03-31'
+                                          '&granularity=month').data)
+        assert remaining['count'] == [1, 1, 0]
+
+
+# ---- 操作员统计测试 ----
+
+class TestOperatorStatistics:
+    def _setup(self, db, shop, shop_with_notify):
+        operators = []
+        for username in ('op_a', 'op_b'):
+            user = User(username=username, name=username, role='operator', can_view_order=1)
+            user.set_password('op123')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(UserShopPermission(user_id=user.id, shop_id=shop.id))
+            operators.append(user)
+        db.session.add_all([
+            Order(order_no='ORD_OS_1', jd_order_no='JD_OS_1', shop_id=shop.id, shop_type=1, order_type=1, amount=100),
+            Order(order_no='ORD_OS_2', jd_order_no='JD_OS_2', shop_id=shop_with_notify.id, shop_type=1,
+                  order_type=1, amount=900),
+        ])
+        db.session.commit()
+        return operators
+
+    def _view(self, app, username, password, path='/statistics/'):
+        from flask import g
+        g.pop('_login_user', None)
+        client = app.test_client()
+        login(client, username, password)
+        return client.get(path).data.decode()
+
+    def test_operators_share_cache_per_shop_set(self, app, db, admin_user, shop, shop_with_notify):
+        from app.services.stats_cache import get_stats_cache
+        self._setup(db, shop, shop_with_notify)
+        html = self._view(app, 'op_a', 'op123')
+        assert '¥1.00' in html and '¥9.00' not in html and '通知店铺' not in html
+        assert '¥1.00' in self._view(app, 'op_b', 'op123')
+        assert '¥10.00' in self._view(app, 'admin', 'admin123')
+        keys = [row['params'] for row in get_stats_cache().store.query('SELECT params FROM stats_cache')]
+        assert sorted(keys) == sorted([f'{{"days": 7, "shop_ids": [{shop.id}]}}', '{"days": 7, "shop_ids": null}'])
+
+    def test_series_restricted_to_permitted_shops(self, app, db, shop, shop_with_notify):
+        self._setup(db, shop, shop_with_notify)
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        data = json.loads(self._view(app, 'op_a', 'op123', f'/statistics/api/series?start={today}&end={today}'
+                                     '&tz=UTC'))
+        assert data['shop_ids'] == [shop.id] and data['total_amount'] == 100
+        data = json.loads(self._view(app, 'op_a', 'op123',
+                                     f'/statistics/api/series?shop_ids={shop_with_notify.id}'))
+        assert data['success'] is False
+
+
+# ---- 订单实时推送测试 ----
+
+class TestOrderFeed:
+    def _orders(self, db, shop, shop_with_notify):
+        base = datetime.utcnow() - timedelta(hours=1)
+        orders = [
+            Order(order_no='ORD_FEED_1', jd_order_no='JD_FEED_1', shop_id=shop.id, shop_type=1, order_type=1,
+                  amount=100, update_time=base),
+            Order(order_no='ORD_FEED_2', jd_order_no='JD_FEED_2', shop_id=shop_with_notify.id, shop_type=1,
+                  order_type=1, amount=100, update_time=base),
+            Order(order_no='ORD_FEED_3', jd_order_no='JD_FEED_3', shop_id=shop.id, shop_type=1, order_type=1,
+                  amount=100, update_time=datetime.utcnow()),
+        ]
+        db.session.add_all(orders)
+        db.session.commit()
+        return [o.id for o in orders]
+
+    def test_order_changes_cursor(self, app, db, shop, shop_with_notify):
+        from app.services.order_feed import decode_cursor, encode_cursor, order_changes
+        ids = self._orders(db, shop, shop_with_notify)
+        orders, cursor = order_changes((datetime.min, 0))
+        assert [o.id for o in orders] == ids
+        # 同一 update_time 的订单按 id 继续读取
+        orders, cursor = order_changes(decode_cursor(encode_cursor((orders[0].update_time, orders[0].id))))
+        assert [o.id for o in orders] == ids[1:]
+        assert order_changes(cursor) == ([], cursor)
+        # 只读取 settle 秒之前更新的订单；按店铺过滤
+        assert [o.id for o in order_changes((datetime.min, 0), settle=60)[0]] == ids[:2]
+        assert [o.id for o in order_changes((datetime.min, 0), shop_ids=[shop.id])[0]] == [ids[0], ids[2]]
+        assert order_changes((datetime.min, 0), shop_ids=[])[0] == []
+
+    def _skip_horizon(self, monkeypatch):
+        """change_horizon 至少留 1 秒余量，测试中把数据库时钟拨快，刚写入的订单即可读取。"""
+        monkeypatch.setattr('app.services.order_feed.database_utcnow',
+                            lambda: datetime.utcnow() + timedelta(seconds=2))
+
+    def test_hub_fans_out_by_shop(self, app, db, shop, shop_with_notify, monkeypatch):
+        from app.services.order_feed import OrderFeedHub
+        monkeypatch.setattr(OrderFeedHub, '_start', lambda self: None)
+        self._skip_horizon(monkeypatch)
+        hub = OrderFeedHub(app, settle=0)
+        everyone = hub.subscribe(None)
+        limited = hub.subscribe([shop.id])
+        ids = self._orders(db, shop, shop_with_notify)
+        with count_queries(db) as statements:
+            assert hub.poll_once() == 3
+        # 一次轮询读取全部订阅者的订单（另加店铺缓存的查询）
+        assert len([s for s in statements if 'FROM orders' in s]) == 1
+        assert [everyone.queue.get_nowait().order_id for _ in range(3)] == ids
+        events = [limited.queue.get_nowait(), limited.queue.get_nowait()]
+        assert [e.order_id for e in events] == [ids[0], ids[2]] and limited.queue.empty()
+        assert 'data-order-id="%d"' % ids[0] in events[0].html and 'JD_FEED_1' in events[0].html
+        hub.unsubscribe(everyone)
+        assert hub.subscriber_count == 1
+
+    def test_hub_waits_for_late_commit(self, app, db, shop, monkeypatch):
+        """事务在 settle 时间之后才提交，其订单仍会推送，不被 hub 的游标越过。"""
+        from app.services.order_feed import OrderFeedHub
+        monkeypatch.setattr(OrderFeedHub, '_start', lambda self: None)
+        now = datetime.utcnow()
+
+        def add(name, seconds_ago):
+            order = Order(order_no=f'ORD_HUB_{name}', jd_order_no=f'JD_HUB_{name}', shop_id=shop.id, shop_type=1,
+                          order_type=1, amount=100, update_time=now - timedelta(seconds=seconds_ago))
+            db.session.add(order)
+            db.session.commit()
+            return order.id
+
+        first = add('A', 120)
+        hub = OrderFeedHub(app, settle=1)
+        subscription = hub.subscribe(None)
+        assert hub.cursor[1] == first
+        second = add('B', 20)
+        # 另一个连接上 30 秒前开始的事务仍未提交
+        monkeypatch.setattr('app.services.order_feed._oldest_open_transaction',
+                            lambda: now - timedelta(seconds=30))
+        assert hub.poll_once() == 0
+        late = add('L', 30)
+        monkeypatch.setattr('app.services.order_feed._oldest_open_transaction', lambda: None)
+        assert hub.poll_once() == 2
+        assert [subscription.queue.get_nowait().order_id for _ in range(2)] == [late, second]
+
+    def test_stream_catches_up_then_pushes(self, app, db, admin_user, shop, shop_with_notify, monkeypatch):
+        from app.services.order_feed import OrderFeedHub, encode_cursor, get_order_feed_hub
+        monkeypatch.setattr(OrderFeedHub, '_start', lambda self: None)
+        app.config['ORDER_FEED_SETTLE'] = 0
+        self._skip_horizon(monkeypatch)
+        ids = self._orders(db, shop, shop_with_notify)
+        first = db.session.get(Order, ids[0])
+        last_event_id = encode_cursor((first.update_time, first.id))
+        client = app.test_client()
+        login(client, 'admin', 'admin123')
+
+        response = client.get('/order/stream', headers={'Last-Event-ID': last_event_id})
+        assert response.mimetype == 'text/event-stream'
+        chunks = (chunk.decode() for chunk in response.response)
+        assert next(chunks) == 'retry: 3000\n\n'
+        catch_up = [next(chunks), next(chunks)]
+        assert [json.loads(c.split('data: ')[1])['id'] for c in catch_up] == ids[1:]
+
+        hub = get_order_feed_hub()
+        db.session.add(Order(order_no='ORD_FEED_4', jd_order_no='JD_FEED_4', shop_id=shop.id, shop_type=1,
+                             order_type=1, amount=100))
+        db.session.commit()
+        assert hub.poll_once() == 1
+        pushed = next(chunks)
+        assert pushed.startswith('id: ') and 'event: order' in pushed and 'JD_FEED_4' in pushed
+        response.close()
+        assert hub.subscriber_count == 0
+
+    def test_operator_stream_filters_shops(self, app, db, operator_user, shop, monkeypatch):
+        from app.services.order_feed import OrderFeedHub, get_order_feed_hub
+        monkeypatch.setattr(OrderFeedHub, '_start', lambda self: None)
+        db.session.add(UserShopPermission(user_id=operator_user.id, shop_id=shop.id))
+        db.session.commit()
+        shop_id = shop.id
+        client = app.test_client()
+        login(client, 'operator', 'op123')
+        response = client.get('/order/stream')
+        hub = get_order_feed_hub()
+        assert [s.shop_ids for s in hub._subscribers] == [frozenset([shop_id])]
+        response.close()
+        assert hub.subscriber_count == 0
+
+
+# ---- 订单增量同步接口测试 ----
+
+class TestOrderChangesApi:
+    TOKEN = 'sync-token'
+
+    def _get(self, client, **params):
+        response = client.get('/api/orders/changes', query_string=params,
+                              headers={'Authorization': f'Bearer {self.TOKEN}'})
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        return lines[:-1], lines[-1]
+
+    def test_token_required(self, app, client):
+        assert client.get('/api/orders/changes').status_code == 403
+        app.config['ORDER_CHANGES_API_TOKENS'] = [self.TOKEN]
+        assert client.get('/api/orders/changes').status_code == 401
+        assert client.get('/api/orders/changes', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        response = client.get('/api/orders/changes', query_string={'cursor': 'bad'},
+                              headers={'Authorization': f'Bearer {self.TOKEN}'})
+        assert response.status_code == 400
+
+    def test_pages_through_changes(self, app, db, client, shop, monkeypatch):
+        app.config['ORDER_CHANGES_API_TOKENS'] = ['old-token', self.TOKEN]
+        base = datetime.utcnow() - timedelta(hours=1)
+        orders = [
+            Order(order_no=f'ORD_CHG_{i}', jd_order_no=f'JD_CHG_{i}', shop_id=shop.id, shop_type=1, order_type=2,
+                  amount=100 * i, card_info='[{"card_no": "SECRET"}]', update_time=base + timedelta(seconds=i // 2))
+            for i in range(5)
+        ]
+        # 刚更新的订单在 ORDER_CHANGES_SETTLE 秒内不返回
+        recent = Order(order_no='ORD_CHG_NEW', jd_order_no='JD_CHG_NEW', shop_id=shop.id, shop_type=1, order_type=1,
+                       amount=1)
+        db.session.add_all(orders + [recent])
+        db.session.commit()
+        ids = [o.id for o in orders]
+
+        received, cursor, pages = [], None, 0
+        with count_queries(db) as statements:
+            while True:
+                records, end = self._get(client, limit=2, **({'cursor': cursor} if cursor else {}))
+                received += records
+                cursor, pages = end['next_cursor'], pages + 1
+                assert end['count'] == len(records)
+                if not end['has_more']:
+                    break
+        assert [r['id'] for r in received] == ids and pages == 3
+        assert received[-1]['cursor'] == cursor and received[1]['amount'] == 100
+        assert all('card_info' not in r for r in received)
+        assert not any('card_info' in s for s in statements if 'FROM orders' in s)
+        assert self._get(client, cursor=cursor) == ([], {'next_cursor': cursor, 'has_more': False, 'count': 0})
+
+        # 修改过的订单按新的（数据库生成的）update_time 再次返回
+        order = db.session.get(Order, ids[0])
+        order.order_status = 2
+        db.session.commit()
+        later = datetime.utcnow() + timedelta(minutes=1)
+        monkeypatch.setattr('app.services.order_feed.database_utcnow', lambda: later)
+        records, end = self._get(client, cursor=cursor)
+        assert [r['id'] for r in records] == [recent.id, ids[0]] and records[1]['order_status'] == 2
+
+    def test_late_commit_not_skipped(self, app, db, client, shop, monkeypatch):
+        """事务在 settle 时间之后才提交，其订单仍在下游游标之后返回。"""
+        app.config['ORDER_CHANGES_API_TOKENS'] = [self.TOKEN]
+        now = datetime.utcnow()
+
+        def add(name, seconds_ago):
+            order = Order(order_no=f'ORD_LATE_{name}', jd_order_no=f'JD_LATE_{name}', shop_id=shop.id, shop_type=1,
+                          order_type=1, amount=100, update_time=now - timedelta(seconds=seconds_ago))
+            db.session.add(order)
+            db.session.commit()
+            return order.id
+
+        first, second = add('A', 60), add('B', 20)
+        # 另一个连接上 30 秒前开始的事务仍未提交
+        monkeypatch.setattr('app.services.order_feed._oldest_open_transaction',
+                            lambda: now - timedelta(seconds=30))
+        records, end = self._get(client)
+        assert [r['id'] for r in records] == [first]
+
+        # 该事务提交，其订单的 update_time 早于已提交的 B，但晚于下游的游标
+        late = add('L', 30)
+        monkeypatch.setattr('app.services.order_feed._oldest_open_transaction', lambda: None)
+        records, _ = self._get(client, cursor=end['next_cursor'])
+        assert [r['id'] for r in records] == [late, second]
+
+
 # ---- 京东游戏点卡平台接口测试 ----
 
 class TestJdGameService:
@@ -500,6 +2156,15 @@ class TestAgisoService:
         params2 = {'orderId': 'ORD001', 'appId': 'APP001', 'jdOrderId': 'JD001'}
         assert generate_agiso_sign(params1, 'secret') == generate_agiso_sign(params2, 'secret')
 
+    def test_agiso_host_with_scheme(self, app, db, shop):
+        """测试阿奇索主机地址带协议时原样使用"""
+        from app.services.agiso import _build_agiso_url
+        shop.agiso_host = 'http://127.0.0.1:9000/'
+        shop.agiso_port = 443
+        assert _build_agiso_url(shop) == 'http://127.0.0.1:9000'
+        shop.agiso_host = 'open.agiso.com'
+        assert _build_agiso_url(shop) == 'https://open.agiso.com'
+
     def test_agiso_deliver_not_enabled(self, app, db, shop, order):
         """测试阿奇索未启用时返回错误"""
         from app.services.agiso import agiso_auto_deliver
@@ -0,0 +1,57 @@
+"""后台任务进程。
+
+与 gunicorn 分开运行：python worker.py
+负责发送 /api/order/create 写入队列的订单通知、回调发件箱中的京东回调、
+定时刷新统计页缓存，以及每天归档过期的通知日志。
+"""
+import logging
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from app import create_app
+from app.services.callback_outbox import process_callback_outbox
+from app.services.notification_archive import archive_notification_logs
+from app.services.notification_queue import process_notification_jobs
+from app.services.stats_cache import refresh_stats_cache
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+app = create_app()
+
+
+def run_notification_jobs():
+    with app.app_context():
+        process_notification_jobs(batch_size=app.config['NOTIFY_JOB_BATCH_SIZE'])
+
+
+def run_callback_outbox():
+    with app.app_context():
+        process_callback_outbox(batch_size=app.config['CALLBACK_BATCH_SIZE'])
+
+
+def run_notification_log_archive():
+    with app.app_context():
+        archive_notification_logs(app.config['NOTIFY_LOG_RETENTION_DAYS'],
+                                  chunk_size=app.config['NOTIFY_LOG_ARCHIVE_CHUNK'])
+
+
+def run_stats_refresh():
+    with app.app_context():
+        refresh_stats_cache()
+
+
+def main():
+    scheduler = BlockingScheduler()
+    scheduler.add_job(run_notification_jobs, 'interval', seconds=app.config['NOTIFY_WORKER_INTERVAL'],
+                      id='notification_jobs', max_instances=1, coalesce=True)
+    scheduler.add_job(run_callback_outbox, 'interval', seconds=app.config['NOTIFY_WORKER_INTERVAL'],
+                      id='callback_outbox', max_instances=1, coalesce=True)
+    scheduler.add_job(run_stats_refresh, 'interval', seconds=app.config['STATS_REFRESH_INTERVAL'],
+                      id='stats_refresh', max_instances=1, coalesce=True)
+    scheduler.add_job(run_notification_log_archive, 'cron', hour=3, minute=30,
+                      id='notification_log_archive', max_instances=1, coalesce=True)
+    scheduler.start()
+
+
+if __name__ == '__main__':
+    main()